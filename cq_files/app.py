@@ -6,7 +6,11 @@ from dotenv import load_dotenv
 # Load .env early
 load_dotenv()
 
+import threading  # noqa: E402
+
 from cq_files.cq_manager import chatbot_bp  # noqa: E402
+from cq_files.cq_manager.chat.resources import warm_up  # noqa: E402
+from cq_files.cq_manager.config import Config  # noqa: E402
 
 def create_app():
     app = Flask(__name__)
@@ -15,6 +19,12 @@ def create_app():
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
     app.register_blueprint(chatbot_bp, url_prefix="/")  # exposes /chatbot-dashboard and /chat
+
+    # /healthz answers straight away; /readyz turns 200 once the pipeline is built
+    if Config.WARM_START == "eager":
+        warm_up()
+    elif Config.WARM_START == "background":
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
     return app
 
 app = create_app()
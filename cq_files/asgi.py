@@ -0,0 +1,161 @@
+# asgi.py (project root)
+#
+# Async entry point: POST /chat is served on the event loop by
+# AsyncChatProcessor so one worker can hold many turns in flight while they
+# wait on OpenRouter; every other route is the regular Flask app.
+#
+#   uvicorn cq_files.asgi:application --workers 2
+import asyncio
+import json
+import threading
+import uuid
+from typing import Tuple
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import dump_cookie
+
+from cq_files.app import app as flask_app
+from cq_files.cq_manager.chat.async_processor import AsyncChatProcessor, AsyncLLMHandler
+from cq_files.cq_manager.chat.resources import get_registry
+from cq_files.cq_manager.routes import (QUICK_ACTIONS, RATE_LIMITED_RESPONSE, UNAVAILABLE_RESPONSE,
+                                        UNKNOWN_ACTION_RESPONSE, get_chat_processor, get_suggestions_generator,
+                                        quick_action_answer, rate_limit)
+
+flask_asgi = WsgiToAsgi(flask_app)
+_async_processor = None
+_async_lock = threading.Lock()
+
+
+def get_async_processor() -> AsyncChatProcessor:
+    """Built with the chat pipeline on first use (blocking: call it off the event loop)."""
+    global _async_processor
+    if _async_processor is None:
+        with _async_lock:
+            if _async_processor is None:
+                registry = get_registry()
+                async_llm = AsyncLLMHandler(registry.get("llm_handler"), registry.get("http_client"),
+                                            registry.get("upstream_limiter"))
+                get_suggestions_generator()  # so the handler's lookup below is a cache hit
+                _async_processor = AsyncChatProcessor(get_chat_processor(), async_llm)
+    return _async_processor
+
+
+def _session_id(headers: dict) -> Tuple[str, tuple]:
+    """
+    (session_id, response headers) from Flask's signed session cookie. Like
+    routes._session_id, a session without an id gets one, and the cookie is
+    (re)issued so the client keeps it for rate limiting and memory.
+    """
+    interface = flask_app.session_interface
+    cookie_name = interface.get_cookie_name(flask_app)
+    serializer = interface.get_signing_serializer(flask_app)
+    data = {}
+    for part in headers.get(b"cookie", b"").decode("latin-1").split(";"):
+        name, _, value = part.strip().partition("=")
+        if name == cookie_name and serializer is not None:
+            try:
+                data = dict(serializer.loads(
+                    value, max_age=int(flask_app.permanent_session_lifetime.total_seconds())))
+            except Exception:
+                pass
+            break
+    if data.get("session_id"):
+        return data["session_id"], ()
+    data["session_id"] = str(uuid.uuid4())
+    if serializer is None:  # no secret key: Flask could not sign a session either
+        return data["session_id"], ()
+    cookie = dump_cookie(
+        cookie_name, serializer.dumps(data),
+        domain=interface.get_cookie_domain(flask_app),
+        path=interface.get_cookie_path(flask_app),
+        httponly=interface.get_cookie_httponly(flask_app),
+        secure=interface.get_cookie_secure(flask_app),
+        samesite=interface.get_cookie_samesite(flask_app),
+    )
+    return data["session_id"], ((b"set-cookie", cookie.encode("latin-1")),)
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_json(send, status: int, payload: dict, headers: tuple = ()):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def chat(scope, receive, send):
+    """Same contract as routes.process_chat."""
+    try:
+        data = json.loads(await _read_body(receive) or b"{}")
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    user_message = data.get("message")
+    action = data.get("action")
+    session_id, cookie = _session_id(dict(scope.get("headers", [])))
+
+    if not user_message and not action:
+        return await _send_json(send, 400, {"error": "No message or action provided"}, cookie)
+
+    retry_after = rate_limit(session_id, "chat")
+    if retry_after is not None:
+        return await _send_json(send, 429, {"error": RATE_LIMITED_RESPONSE, "retry_after": retry_after},
+                                ((b"retry-after", str(retry_after).encode()), *cookie))
+
+    try:
+        async_processor = _async_processor or await asyncio.to_thread(get_async_processor)
+        suggestions_generator = get_suggestions_generator()
+    except Exception as e:
+        print(f"/chat (async) unavailable: {e}")
+        return await _send_json(send, 503, {"error": UNAVAILABLE_RESPONSE}, cookie)
+
+    try:
+        if action:
+            if action in QUICK_ACTIONS:
+                cached = quick_action_answer(async_processor.cp, action, session_id)
+                if cached is not None:
+                    return await _send_json(send, 200, {"response": cached["response"],
+                                                        "suggestions": cached["suggestions"],
+                                                        "suggestions_id": None}, cookie)
+                bot_text = await async_processor.process_message(QUICK_ACTIONS[action], session_id)
+            else:
+                bot_text = UNKNOWN_ACTION_RESPONSE
+        else:
+            bot_text = await async_processor.process_message(user_message, session_id)
+
+        suggestions_id = suggestions_generator.submit(user_message or action, bot_text)
+        await _send_json(send, 200, {"response": bot_text, "suggestions": [], "suggestions_id": suggestions_id},
+                         cookie)
+    except Exception as e:
+        print(f"/chat (async) error: {e}")
+        await _send_json(send, 500, {"error": "An error occurred processing your request"}, cookie)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if _async_processor is not None:
+                    await _async_processor.llm.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"].rstrip("/") == "/chat":
+        return await chat(scope, receive, send)
+    return await flask_asgi(scope, receive, send)
@@ -0,0 +1,258 @@
+# cq_manager/chat/admission.py
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional, Tuple
+
+from cq_files.cq_manager.chat import metrics
+
+
+class UpstreamBusy(Exception):
+    """
+    No upstream slot: the wait queue was full (`reason` "queue_full"), the
+    wait ran out ("timeout"), or this turn was already refused ("same_turn").
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ("event", "loop", "future", "granted")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class UpstreamLimiter:
+    """
+    Caps concurrent OpenRouter requests for the whole process; request
+    threads and the event loop (asgi.py) share the one budget.
+
+    At most `max_concurrent` requests hold a slot. Up to `max_queue`
+    callers wait for one, first come first served, for at most `max_wait`
+    seconds; a freed slot is handed straight to the oldest waiter. A caller
+    that finds the queue full, or whose wait runs out, gets UpstreamBusy
+    at once instead of tying up a worker thread.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_queue: int = 16, max_wait: float = 5.0):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters: "deque[_Waiter]" = deque()
+        self._admitted = 0
+        self._queued = 0
+        self._rejected = {"queue_full": 0, "timeout": 0}
+        self._waited = 0  # admitted after queueing
+        self._wait_seconds = 0.0
+        self._max_depth = 0
+
+    def busy(self) -> bool:
+        """True when a new caller would have to queue (used to skip optional work such as hedges)."""
+        return self._in_flight >= self.max_concurrent or bool(self._waiters)
+
+    # ------------------------
+    # Blocking callers
+    # ------------------------
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self):
+        t0 = time.perf_counter()
+        self._check_turn()
+        with self._lock:
+            waiter = self._enter(None)
+        if waiter is None:
+            return
+        if not waiter.event.wait(self.max_wait):
+            with self._lock:
+                if not waiter.granted:
+                    self._give_up(waiter, "timeout")
+        self._record_wait(time.perf_counter() - t0)
+
+    def release(self):
+        with self._lock:
+            # hand the slot to the oldest waiter; in-flight count is unchanged
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self._in_flight -= 1
+            self._update_gauges()
+
+    # ------------------------
+    # Async callers
+    # ------------------------
+    @asynccontextmanager
+    async def aslot(self):
+        await self.aacquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def aacquire(self):
+        t0 = time.perf_counter()
+        self._check_turn()
+        with self._lock:
+            waiter = self._enter(asyncio.get_running_loop())
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if not waiter.granted:
+                    self._give_up(waiter, "timeout")
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+                    self._update_gauges()
+            if granted:
+                self.release()
+            raise
+        self._record_wait(time.perf_counter() - t0)
+
+    # ------------------------
+    # Bookkeeping (under self._lock)
+    # ------------------------
+    @staticmethod
+    def _check_turn():
+        # a turn makes several LLM calls; once one is refused the rest fail fast
+        turn = metrics.current_turn()
+        if turn is not None and turn.upstream_busy:
+            metrics.UPSTREAM_REJECTED.inc("same_turn")
+            raise UpstreamBusy("same_turn")
+
+    @staticmethod
+    def _refuse(reason: str):
+        metrics.UPSTREAM_REJECTED.inc(reason)
+        turn = metrics.current_turn()
+        if turn is not None:
+            turn.upstream_busy = True
+        raise UpstreamBusy(reason)
+
+    def _enter(self, loop) -> Optional[_Waiter]:
+        """Takes a free slot (returns None) or queues a waiter; raises UpstreamBusy when the queue is full."""
+        if self._in_flight < self.max_concurrent and not self._waiters:
+            self._in_flight += 1
+            self._admitted += 1
+            self._update_gauges()
+            metrics.UPSTREAM_WAIT_SECONDS.observe(0.0)
+            return None
+        if len(self._waiters) >= self.max_queue:
+            self._rejected["queue_full"] += 1
+            self._refuse("queue_full")
+        waiter = _Waiter(loop)
+        self._waiters.append(waiter)
+        self._queued += 1
+        self._max_depth = max(self._max_depth, len(self._waiters))
+        self._update_gauges()
+        return waiter
+
+    def _give_up(self, waiter: _Waiter, reason: str):
+        self._waiters.remove(waiter)
+        self._rejected[reason] += 1
+        self._update_gauges()
+        self._refuse(reason)
+
+    def _record_wait(self, seconds: float):
+        metrics.UPSTREAM_WAIT_SECONDS.observe(seconds)
+        with self._lock:
+            self._admitted += 1
+            self._waited += 1
+            self._wait_seconds += seconds
+
+    def _update_gauges(self):
+        metrics.UPSTREAM_IN_FLIGHT.set(self._in_flight)
+        metrics.UPSTREAM_QUEUE_DEPTH.set(len(self._waiters))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "max_wait": self.max_wait,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "max_queue_depth": self._max_depth,
+                "admitted": self._admitted,
+                "queued": self._queued,
+                "rejected": dict(self._rejected),
+                "mean_queued_wait_ms": round(self._wait_seconds / self._waited * 1e3, 1) if self._waited else 0.0,
+            }
+
+
+class SessionRateLimiter:
+    """
+    Token bucket per session_id: `burst` requests at once, refilled at
+    `rate` per second. Buckets live in an LRU of `max_sessions`; a session
+    evicted from it starts again with a full bucket.
+    """
+
+    def __init__(self, rate: float = 0.5, burst: int = 5, max_sessions: int = 10000):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()  # session -> [tokens, updated]
+        self._allowed = 0
+        self._limited = 0
+
+    def allow(self, session_id: str) -> Tuple[bool, float]:
+        """(allowed, seconds until the next request would be)."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(session_id, None)
+            if bucket is None:
+                bucket = [float(self.burst), now]
+            tokens = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+                self._allowed += 1
+            else:
+                self._limited += 1
+            self._buckets[session_id] = [tokens, now]
+            while len(self._buckets) > self.max_sessions:
+                self._buckets.popitem(last=False)
+        retry_after = 0.0 if allowed or self.rate <= 0 else (1.0 - tokens) / self.rate
+        return allowed, retry_after
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "sessions": len(self._buckets),
+                "allowed": self._allowed,
+                "limited": self._limited,
+            }
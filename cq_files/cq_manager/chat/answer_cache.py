@@ -0,0 +1,161 @@
+# cq_manager/chat/answer_cache.py
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class _Entry:
+    __slots__ = ("scope", "vector", "query", "answer", "created")
+
+    def __init__(self, scope: str, vector: np.ndarray, query: str, answer: str, created: float):
+        self.scope = scope
+        self.vector = vector
+        self.query = query
+        self.answer = answer
+        self.created = created
+
+
+def _normalize(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    n = float(np.linalg.norm(v))
+    return v / n if n > 0 else v
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed on the query embedding. A lookup is a hit when the cosine
+    similarity to a cached query in the same scope (intent) reaches
+    `threshold`. Lookups landing within `near_miss_margin` below the threshold
+    are counted (with samples) so the threshold can be tuned from real traffic.
+    Eviction is LRU once `max_entries` is reached, plus a TTL per entry.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        near_miss_margin: float = 0.05,
+        max_entries: int = 512,
+        ttl_seconds: int = 6 * 60 * 60,
+        enabled: bool = True,
+    ):
+        self.threshold = threshold
+        self.near_miss_margin = near_miss_margin
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._next_id = 0
+        # scope -> (entry ids, stacked unit vectors); rebuilt when the scope changes
+        self._matrices: Dict[str, Tuple[List[int], np.ndarray]] = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._near_misses = 0
+        self._evictions = 0
+        self._expired = 0
+        self._invalidations = 0
+        self._hit_scores = deque(maxlen=200)
+        self._near_miss_samples = deque(maxlen=20)
+
+    # ------------------------
+    # Public API
+    # ------------------------
+    def lookup(self, scope: str, vector, query: str = "") -> Optional[str]:
+        if not self.enabled:
+            return None
+        q = _normalize(vector)
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            ids, matrix = self._scope_matrix(scope)
+            if not ids:
+                self._misses += 1
+                return None
+
+            sims = matrix @ q
+            best = int(np.argmax(sims))
+            score = float(sims[best])
+            entry = self._entries[ids[best]]
+
+            if score >= self.threshold:
+                self._entries.move_to_end(ids[best])
+                self._hits += 1
+                self._hit_scores.append(round(score, 4))
+                return entry.answer
+
+            self._misses += 1
+            if score >= self.threshold - self.near_miss_margin:
+                self._near_misses += 1
+                # scores only: /chat/cache-stats is public, user text stays in the server log
+                self._near_miss_samples.append({"scope": scope, "score": round(score, 4)})
+                print(f"[AnswerCache] near miss {score:.3f} ({scope}): {query!r} ~ {entry.query!r}")
+            return None
+
+    def store(self, scope: str, vector, query: str, answer: str):
+        if not self.enabled or not answer:
+            return
+        entry = _Entry(scope, _normalize(vector), query, answer, time.monotonic())
+        with self._lock:
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            self._matrices.pop(scope, None)
+            while len(self._entries) > self.max_entries:
+                _, old = self._entries.popitem(last=False)
+                self._matrices.pop(old.scope, None)
+                self._evictions += 1
+
+    def clear(self, reason: str = ""):
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+            self._invalidations += 1
+        if reason:
+            print(f"[AnswerCache] cleared: {reason}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "near_miss_margin": self.near_miss_margin,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "lookups": lookups,
+                "hits": self._hits,
+                "misses": self._misses,
+                "near_misses": self._near_misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expired": self._expired,
+                "invalidations": self._invalidations,
+                "recent_hit_scores": list(self._hit_scores),
+                "recent_near_misses": list(self._near_miss_samples),
+            }
+
+    # ------------------------
+    # Internals (call with lock held)
+    # ------------------------
+    def _purge_expired(self, now: float):
+        if self.ttl_seconds <= 0:
+            return
+        stale = [k for k, e in self._entries.items() if now - e.created > self.ttl_seconds]
+        for k in stale:
+            e = self._entries.pop(k)
+            self._matrices.pop(e.scope, None)
+            self._expired += 1
+
+    def _scope_matrix(self, scope: str) -> Tuple[List[int], np.ndarray]:
+        cached = self._matrices.get(scope)
+        if cached is None:
+            ids = [k for k, e in self._entries.items() if e.scope == scope]
+            matrix = (np.stack([self._entries[k].vector for k in ids])
+                      if ids else np.empty((0, 0), dtype=np.float32))
+            cached = (ids, matrix)
+            self._matrices[scope] = cached
+        return cached
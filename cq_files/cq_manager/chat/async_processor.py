@@ -0,0 +1,333 @@
+# cq_manager/chat/async_processor.py
+import asyncio
+import contextlib
+import time
+import uuid
+from typing import Optional, Tuple
+
+import httpx
+
+from cq_files.cq_manager.chat import metrics
+from cq_files.cq_manager.chat.admission import UpstreamBusy, UpstreamLimiter
+from cq_files.cq_manager.chat.http_client import RETRY_STATUSES, CircuitOpenError, PooledHTTPClient
+from cq_files.cq_manager.chat.llm_handler import (
+    API_ERROR_RESPONSE,
+    BUSY_RESPONSE,
+    CONNECTION_ERROR_RESPONSE,
+    TIMEOUT_RESPONSE,
+    UNAVAILABLE_RESPONSE,
+    UNEXPECTED_ERROR_RESPONSE,
+    LLMHandler,
+)
+from cq_files.cq_manager.chat.model_router import AttemptFailed
+from cq_files.cq_manager.chat.processor import (
+    COMPLAINT_FALLBACK_RESPONSE,
+    ERROR_RESPONSE,
+    FEEDBACK_RESPONSE,
+    GREETING_RESPONSE,
+    OFF_TOPIC_RESPONSE,
+    THANKS_RESPONSE,
+    ChatProcessor,
+    ResponsePlan,
+)
+from cq_files.cq_manager.config import Config
+
+
+class AsyncLLMHandler:
+    """
+    httpx.AsyncClient counterpart of LLMHandler.generate_response: same model
+    settings and canned fallbacks, and the retry policy and circuit breaker of
+    the blocking PooledHTTPClient, so both paths agree on upstream health.
+    With a model router the models are raced as tasks, and the losers'
+    requests cancelled.
+    """
+
+    def __init__(self, llm_handler: LLMHandler, http_client: PooledHTTPClient,
+                 limiter: Optional[UpstreamLimiter] = None):
+        self.llm_handler = llm_handler
+        self.limiter = limiter
+        self.policy = http_client
+        self.breaker = http_client.breaker
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # created lazily so it binds to the serving event loop
+        if self._client is None:
+            connect, read = self.policy.timeout
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=self.policy.pool_size,
+                                    max_keepalive_connections=self.policy.pool_size),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def generate_response(self, prompt: str) -> str:
+        router = self.llm_handler.router
+        if router is not None:
+            return await router.acomplete(lambda model: self._attempt(model, prompt), TIMEOUT_RESPONSE)
+        try:
+            return await self._attempt(self.llm_handler.llm.model, prompt)
+        except AttemptFailed as e:
+            return e.response
+
+    async def _attempt(self, model: str, prompt: str) -> str:
+        """One completion from `model`; raises AttemptFailed with the canned reply on failure."""
+        llm = self.llm_handler.llm
+        headers = {
+            "Authorization": f"Bearer {llm.api_key}",
+            "Content-Type": "application/json",
+        }
+        payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": llm.max_tokens,
+            "temperature": llm.temperature,
+            "top_p": llm.top_p,
+        }
+        t0 = time.perf_counter()
+        try:
+            async with (self.limiter.aslot() if self.limiter else contextlib.nullcontext()):
+                r = await self._post(llm.base_url, headers, payload)
+        except UpstreamBusy:
+            metrics.record_llm_call("completion", "busy", time.perf_counter() - t0)
+            raise AttemptFailed(BUSY_RESPONSE, "busy")
+        except CircuitOpenError:
+            metrics.record_llm_call("completion", "circuit_open", time.perf_counter() - t0)
+            raise AttemptFailed(UNAVAILABLE_RESPONSE, "circuit_open")
+        except httpx.TimeoutException:
+            metrics.record_llm_call("completion", "timeout", time.perf_counter() - t0)
+            raise AttemptFailed(TIMEOUT_RESPONSE, "timeout")
+        except httpx.HTTPError as e:
+            metrics.record_llm_call("completion", "error", time.perf_counter() - t0)
+            print(f"OpenRouter request error: {e}")
+            raise AttemptFailed(CONNECTION_ERROR_RESPONSE, "error")
+
+        if r.status_code != 200:
+            metrics.record_llm_call("completion", str(r.status_code), time.perf_counter() - t0)
+            print(f"OpenRouter API Error: {r.status_code} - {r.text}")
+            raise AttemptFailed(API_ERROR_RESPONSE, str(r.status_code))
+        try:
+            j = r.json()
+            metrics.record_llm_call("completion", "200", time.perf_counter() - t0, j.get("usage"))
+            return j["choices"][0]["message"]["content"].strip()
+        except Exception as e:
+            print(f"Unexpected LLM error: {e}")
+            raise AttemptFailed(UNEXPECTED_ERROR_RESPONSE, "error")
+
+    async def _post(self, url: str, headers: dict, payload: dict) -> httpx.Response:
+        """Async mirror of PooledHTTPClient.post."""
+        policy = self.policy
+        if not self.breaker.allow():
+            raise CircuitOpenError("upstream circuit is open")
+
+        attempt = 0
+        try:
+            while True:
+                try:
+                    r = await self.client.post(url, headers=headers, json=payload)
+                except (httpx.TransportError, httpx.TimeoutException):
+                    if attempt >= policy.max_retries:
+                        self.breaker.record_failure()
+                        raise
+                    await asyncio.sleep(policy._backoff(attempt))
+                    attempt += 1
+                    continue
+
+                if r.status_code in RETRY_STATUSES:
+                    delay = policy._retry_after(r)
+                    if attempt >= policy.max_retries or (delay is not None and delay > policy.retry_after_max):
+                        self.breaker.record_failure()
+                        return r
+                    await asyncio.sleep(delay if delay is not None else policy._backoff(attempt))
+                    attempt += 1
+                    continue
+
+                self.breaker.record_success()
+                return r
+        except asyncio.CancelledError:
+            # a cancelled speculative call says nothing about upstream health
+            self.breaker.release()
+            raise
+
+
+class AsyncChatProcessor:
+    """
+    Asyncio version of ChatProcessor.process_message. Routing, prompts and
+    heuristics come from the wrapped ChatProcessor; what changes is that the
+    independent stages (contact lookup, intent, relevance check, schedule
+    retrieval) start together, and whatever is still running is cancelled as
+    soon as a branch is decided. Blocking work (embeddings, vector search)
+    runs in the default thread pool; LLM calls go through AsyncLLMHandler.
+    """
+
+    def __init__(self, chat_processor: ChatProcessor, llm: AsyncLLMHandler):
+        self.cp = chat_processor
+        self.llm = llm
+
+    async def process_message(self, message: str, session_id: str = None) -> str:
+        cp = self.cp
+        trace = metrics.start_turn()
+        try:
+            # a cold session is read from SQLite; keep that off the event loop
+            query, history = await asyncio.to_thread(cp._with_history, message, session_id)
+            response = await self._respond(query, session_id, history)
+            cp._remember(session_id, message, response)
+            return response
+        finally:
+            metrics.finish_turn(trace, Config.SLOW_TURN_SECONDS)
+
+    async def _respond(self, message: str, session_id: str = None, history: str = "") -> str:
+        cp = self.cp
+        plan = None if history else cp._table_plan(message)
+        if plan is not None:
+            return plan.text
+
+        vector = await asyncio.to_thread(cp._turn_vector, message)
+        plan = None if history else cp._faq_plan(message, vector)
+        if plan is not None:
+            return plan.text
+        scope, cached = (None, None) if history else cp._cache_lookup(message, vector)
+        if cached is not None:
+            return cached
+
+        try:
+            plan = await self._plan_response(message, session_id, vector)
+            metrics.set_branch(plan.branch)
+            response = await self._execute_plan(plan, message, history)
+        except Exception as e:
+            metrics.set_branch("error")
+            print(f"async process_message error: {e}")
+            return ERROR_RESPONSE
+
+        if scope and cp._is_cacheable(response):
+            cp.answer_cache.store(scope, vector, message, response)
+        return response
+
+    # ------------------------
+    # Routing
+    # ------------------------
+    async def _plan_response(self, message: str, session_id: str = None, vector=None) -> ResponsePlan:
+        cp = self.cp
+        session_id = session_id or str(uuid.uuid4())
+        is_contact = cp._is_contact_request(message)
+        is_greeting = cp._is_greeting(message)
+        is_thanks = cp._is_thanks(message)
+        is_complaint = cp._is_complaint(message)
+        is_schedule = cp._is_schedule_query(message)
+
+        tasks = {}
+        if is_contact:
+            tasks["contact"] = asyncio.create_task(
+                asyncio.to_thread(cp.get_contact_details_from_knowledge_base))
+        tasks["intent"] = asyncio.create_task(self._classify_intent(message, vector))
+        if not (is_greeting or is_thanks or is_complaint):
+            # speculative: only needed if no earlier branch wins
+            tasks["on_topic"] = asyncio.create_task(self._is_waste_management_related(message, vector))
+            if is_schedule:
+                tasks["schedule"] = asyncio.create_task(asyncio.to_thread(
+                    cp.get_schedule_from_knowledge_base, cp._waste_type(message)))
+
+        try:
+            if is_contact:
+                info = await tasks["contact"]
+                if info:
+                    return ResponsePlan("contact", prompt=cp._contact_prompt(message, info))
+
+            if is_greeting and len(message.split()) < 5:
+                return ResponsePlan("greeting", text=GREETING_RESPONSE)
+
+            if is_thanks:
+                return ResponsePlan("thanks", text=THANKS_RESPONSE)
+
+            if cp._is_feedback(message):
+                intent, _ = await tasks["intent"]
+                if intent == "Feedback":
+                    return ResponsePlan("feedback", text=FEEDBACK_RESPONSE)
+
+            if is_complaint or (await tasks["intent"])[0] == "Complaints":
+                if cp._is_missed_collection(message):
+                    return ResponsePlan("complaint_missed", prompt=cp._missed_collection_prompt(message))
+                solution = await asyncio.to_thread(cp._find_complaint_solution, message)
+                if solution:
+                    return ResponsePlan("complaint_kb", prompt=cp._complaint_solution_prompt(message, solution))
+                return ResponsePlan("complaint_fallback", text=COMPLAINT_FALLBACK_RESPONSE)
+
+            on_topic = await tasks["on_topic"] if "on_topic" in tasks else \
+                await self._is_waste_management_related(message, vector)
+            if not on_topic:
+                return ResponsePlan("off_topic", text=OFF_TOPIC_RESPONSE)
+
+            intent, _ = await tasks["intent"]
+            if intent == "Waste Collection Schedules" or is_schedule:
+                if "schedule" in tasks:
+                    info = await tasks["schedule"]
+                else:
+                    info = await asyncio.to_thread(
+                        cp.get_schedule_from_knowledge_base, cp._waste_type(message))
+                if info:
+                    return ResponsePlan("schedule", prompt=cp._schedule_prompt(message, info))
+
+            return ResponsePlan("rag", rag=True)
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+
+    async def _classify_intent(self, message: str, vector=None) -> Tuple[str, float]:
+        intent = self.cp._local_intent(message, vector) or await self._classify_intent_llm(message)
+        metrics.set_intent(*intent)
+        return intent
+
+    async def _classify_intent_llm(self, message: str) -> Tuple[str, float]:
+        try:
+            with metrics.timed("chat", "intent"):
+                return self.cp._parse_intent(await self.llm.generate_response(self.cp._intent_prompt(message)))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            return "Unknown", 0.5
+
+    async def _is_waste_management_related(self, message: str, vector=None) -> bool:
+        local = self.cp._local_relevance(message, vector)
+        if local is not None:
+            return local
+        try:
+            with metrics.timed("chat", "relevance"):
+                resp = await self.llm.generate_response(self.cp._relevance_prompt(message))
+            return "YES" in resp.strip().upper()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            return True
+
+    # ------------------------
+    # Execution
+    # ------------------------
+    async def _execute_plan(self, plan: ResponsePlan, message: str, history: str = "") -> str:
+        cp = self.cp
+        if plan.text is not None:
+            return plan.text
+        if plan.prompt is not None:
+            with metrics.timed("chat", "llm_prompt"):
+                response = await self.llm.generate_response(history + plan.prompt)
+            return cp._clean_response(response)
+
+        prompt = await asyncio.to_thread(cp._rag_prompt, message, history)
+        with metrics.timed("chat", "qa_chain"):
+            response = await self.llm.generate_response(prompt)
+        if len(response.split()) < 10:
+            with metrics.timed("chat", "enhance"):
+                response = await self.llm.generate_response(cp._enhance_prompt(response, message))
+
+        response = cp._clean_response(response)
+        if not response.strip().endswith((".", "!", "?")):
+            with metrics.timed("chat", "completion"):
+                completion = await self.llm.generate_response(cp._completion_prompt(response, message))
+            response = cp._clean_response(f"{response} {completion}")
+        return response
@@ -0,0 +1,154 @@
+# cq_manager/chat/background.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class BackgroundJobs:
+    """
+    Small job table on top of a thread pool: submit work, get back an id the
+    client can poll. Finished results are kept for `ttl_seconds` and the
+    table is capped at `max_jobs` (oldest dropped first).
+
+    The pool is created on first submit and re-created if the process has
+    forked since, so it is safe to construct before workers fork.
+
+    The table itself is per process. With several workers a poll can land on
+    a worker that did not run the job, so with `db_path` (SQLite) every job
+    is also written to a `background_jobs` table, and ids unknown here are
+    looked up there. Results must be JSON-serialisable.
+    """
+
+    def __init__(self, max_workers: int = 2, max_jobs: int = 1000, ttl_seconds: int = 300,
+                 name: str = "jobs", db_path: Optional[str] = None):
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Tuple[float, Future]] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+        self._local = threading.local()
+        if self.db_path:
+            self._init_db()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix=self.name
+            )
+            self._pid = os.getpid()
+            self._jobs.clear()
+        return self._executor
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> str:
+        job_id = uuid.uuid4().hex
+        # the row goes in before the job can finish and record its result
+        self._store(job_id, "pending", None, insert=True)
+        with self._lock:
+            future = self._pool().submit(fn, *args, **kwargs)
+            self._prune(time.monotonic())
+            self._jobs[job_id] = (time.monotonic(), future)
+        future.add_done_callback(lambda f: self._record(job_id, f))
+        return job_id
+
+    def status(self, job_id: str) -> Tuple[str, Any]:
+        """Returns ("unknown"|"pending"|"ready"|"error", result_or_None)."""
+        with self._lock:
+            item = self._jobs.get(job_id)
+        if item is None:
+            return self._lookup(job_id)
+        future = item[1]
+        if not future.done():
+            return "pending", None
+        try:
+            return "ready", future.result()
+        except Exception as e:
+            print(f"[{self.name}] job {job_id} failed: {e}")
+            return "error", None
+
+    def _prune(self, now: float):
+        stale = [k for k, (t, f) in self._jobs.items()
+                 if f.done() and now - t > self.ttl_seconds]
+        for k in stale:
+            del self._jobs[k]
+        while len(self._jobs) >= self.max_jobs:
+            oldest = next(iter(self._jobs))
+            del self._jobs[oldest]
+
+    # ------------------------
+    # Shared table (SQLite)
+    # ------------------------
+    def _record(self, job_id: str, future: Future):
+        try:
+            self._store(job_id, "ready", future.result())
+        except Exception:
+            self._store(job_id, "error", None)
+
+    def _store(self, job_id: str, status: str, result: Any, insert: bool = False):
+        if not self.db_path:
+            return
+        try:
+            conn = self._connection()
+            with conn:
+                if insert:
+                    # pending rows of a worker that died expire with the rest
+                    conn.execute("DELETE FROM background_jobs WHERE name = ? AND created < ?",
+                                 (self.name, time.time() - self.ttl_seconds))
+                    conn.execute("INSERT INTO background_jobs (id, name, created, status, result)"
+                                 " VALUES (?, ?, ?, ?, NULL)", (job_id, self.name, time.time(), status))
+                else:
+                    conn.execute("UPDATE background_jobs SET status = ?, result = ? WHERE id = ?",
+                                 (status, json.dumps(result), job_id))
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"[{self.name}] could not store job {job_id}: {e}")
+
+    def _lookup(self, job_id: str) -> Tuple[str, Any]:
+        if not self.db_path:
+            return "unknown", None
+        try:
+            row = self._connection().execute(
+                "SELECT status, result FROM background_jobs WHERE id = ? AND name = ? AND created >= ?",
+                (job_id, self.name, time.time() - self.ttl_seconds),
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"[{self.name}] job lookup failed: {e}")
+            return "unknown", None
+        if row is None:
+            return "unknown", None
+        status, result = row
+        return status, json.loads(result) if result is not None else None
+
+    def _connection(self) -> sqlite3.Connection:
+        # one connection per thread (and per process after a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS background_jobs ("
+                " id TEXT PRIMARY KEY,"
+                " name TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " status TEXT NOT NULL,"
+                " result TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS background_jobs_created ON background_jobs (name, created)")
@@ -0,0 +1,218 @@
+# cq_manager/chat/context_builder.py
+import re
+import threading
+from typing import Dict, List, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from cq_files.cq_manager.chat import metrics
+from cq_files.cq_manager.chat.hybrid_retriever import HybridRetriever, tokenize
+from cq_files.cq_manager.chat.session_memory import approx_tokens
+
+MIN_OVERLAP = 20  # chars; shorter shared text is coincidence, not splitter overlap
+MIN_TRIM_TOKENS = 40  # a trimmed last piece shorter than this is left out
+_SENTENCE_END = re.compile(r"[.!?](?=\s)|\n")
+
+
+def text_overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of `a` that is also a prefix of `b`."""
+    for k in range(min(len(a), len(b)), MIN_OVERLAP - 1, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def trim_to_tokens(text: str, tokens: int) -> str:
+    """Cut at the last sentence or line end that fits; mid-word only if none does."""
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    head = text[:limit]
+    ends = [m.end() for m in _SENTENCE_END.finditer(head)]
+    return (head[:ends[-1]] if ends else head).rstrip()
+
+
+class _Piece:
+    __slots__ = ("text", "rank", "source", "start", "end", "metadata", "terms")
+
+    def __init__(self, doc: Document, rank: int):
+        self.text = doc.page_content.strip()
+        self.rank = rank
+        self.metadata = dict(doc.metadata)
+        self.source = self.metadata.get("source")
+        self.start = self.metadata.get("start_index")
+        # position in the source file, kept apart from len(text) once pieces are joined
+        self.end = None if self.start is None else self.start + len(doc.page_content)
+        self.terms = frozenset(tokenize(self.text))
+
+    def absorb(self, other: "_Piece", after: bool, overlap: int):
+        """Join `other` onto this piece (after or before it), dropping the shared text."""
+        if after:
+            self.text = self.text + ("\n" if overlap == 0 else "") + other.text[overlap:]
+            self.end = other.end
+        else:
+            self.text = other.text + ("\n" if overlap == 0 else "") + self.text[overlap:]
+            self.start = other.start
+            self.metadata["start_index"] = other.start
+        self.rank = min(self.rank, other.rank)
+        self.terms = frozenset(tokenize(self.text))
+
+
+class ContextBuilder:
+    """
+    Turns retrieved chunks into prompt context within a token budget.
+
+    1. merge: chunks from the same file that overlap (chunk_overlap) or are
+       adjacent become one piece, so the shared text is sent once
+    2. dedup: drop a piece contained in, or near-identical to (word-set
+       Jaccard >= `dedup_threshold`), a better-ranked one
+    3. select by maximal marginal relevance: retrieval rank for relevance,
+       word-set Jaccard for redundancy, until the prompt type's budget is
+       used; the last piece may be trimmed at a sentence end
+
+    Tokens are estimated as characters / 4. Every build is counted in
+    context_tokens_total and in stats(), against the naive concatenation
+    of the same chunks.
+    """
+
+    def __init__(self, budgets: Dict[str, int], mmr_lambda: float = 0.7, dedup_threshold: float = 0.8,
+                 adjacency_gap: int = 2):
+        self.budgets = dict(budgets)
+        self.mmr_lambda = mmr_lambda
+        self.dedup_threshold = dedup_threshold
+        self.adjacency_gap = adjacency_gap
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def build(self, docs: List[Document], prompt: str) -> List[Document]:
+        pieces = [_Piece(doc, rank) for rank, doc in enumerate(docs) if doc.page_content.strip()]
+        naive = approx_tokens("\n\n".join(p.text for p in pieces))
+        pieces = self._dedup(self._merge(pieces))
+        selected = self._select(pieces, self.budgets.get(prompt, self.budgets.get("default", 0)))
+        out = [Document(page_content=text, metadata=piece.metadata) for piece, text in selected]
+        if docs:
+            self._record(prompt, naive, approx_tokens("\n\n".join(d.page_content for d in out)), len(docs), len(out))
+        return out
+
+    def build_text(self, docs: List[Document], prompt: str, separator: str = "\n\n") -> str:
+        return separator.join(d.page_content for d in self.build(docs, prompt))
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {}
+            for prompt, s in self._stats.items():
+                saved = s["naive_tokens"] - s["context_tokens"]
+                out[prompt] = dict(s, budget=self.budgets.get(prompt), tokens_saved=saved,
+                                   saved_per_request=round(saved / s["requests"], 1) if s["requests"] else 0.0)
+            return out
+
+    # ------------------------
+    # Steps
+    # ------------------------
+    def _adjoining(self, a: _Piece, b: _Piece) -> Tuple[bool, int]:
+        """(joinable, overlap chars) for `b` directly following `a` in the same file."""
+        if a.source != b.source:
+            return False, 0
+        if a.start is not None and b.start is not None:
+            # offsets only say where to look: after an incremental sync they can be stale,
+            # so the shared text is confirmed before any of it is dropped
+            if not a.start <= b.start <= a.end + self.adjacency_gap:
+                return False, 0
+            claimed = a.end - b.start
+            if claimed <= 0:
+                return True, 0
+            if a.text.endswith(b.text[:claimed]):
+                return True, claimed
+        overlap = text_overlap(a.text, b.text)
+        return overlap > 0, overlap
+
+    def _merge(self, pieces: List[_Piece]) -> List[_Piece]:
+        merged = True
+        while merged:
+            merged = False
+            for i, a in enumerate(pieces):
+                for j in range(i + 1, len(pieces)):
+                    b = pieces[j]
+                    for after, (first, second) in ((True, (a, b)), (False, (b, a))):
+                        ok, overlap = self._adjoining(first, second)
+                        if ok and overlap < len(second.text):
+                            a.absorb(b, after, overlap)
+                            del pieces[j]
+                            merged = True
+                            break
+                    if merged:
+                        break
+                if merged:
+                    break
+        return sorted(pieces, key=lambda p: p.rank)
+
+    def _dedup(self, pieces: List[_Piece]) -> List[_Piece]:
+        kept: List[_Piece] = []
+        for piece in pieces:
+            if any(piece.text in k.text or jaccard(piece.terms, k.terms) >= self.dedup_threshold for k in kept):
+                continue
+            kept.append(piece)
+        return kept
+
+    def _select(self, pieces: List[_Piece], budget: int) -> List[Tuple[_Piece, str]]:
+        if not pieces:
+            return []
+        n = len(pieces)
+        relevance = {id(p): 1.0 - i / n for i, p in enumerate(pieces)}
+        remaining = list(pieces)
+        selected: List[Tuple[_Piece, str]] = []
+        used = 0
+        while remaining:
+            def score(p: _Piece) -> float:
+                redundancy = max((jaccard(p.terms, s.terms) for s, _ in selected), default=0.0)
+                return self.mmr_lambda * relevance[id(p)] - (1 - self.mmr_lambda) * redundancy
+
+            best = max(remaining, key=score)
+            remaining.remove(best)
+            cost = approx_tokens(best.text)
+            if budget <= 0 or used + cost <= budget:
+                selected.append((best, best.text))
+                used += cost
+                continue
+            room = budget - used
+            if room >= MIN_TRIM_TOKENS:
+                text = trim_to_tokens(best.text, room)
+                if text:
+                    selected.append((best, text))
+                    used += approx_tokens(text)
+            # a smaller piece further down may still fit
+        return selected
+
+    def _record(self, prompt: str, naive: int, sent: int, candidates: int, chunks: int):
+        metrics.record_context(prompt, naive, sent)
+        with self._lock:
+            s = self._stats.setdefault(prompt, {"requests": 0, "candidates": 0, "chunks_sent": 0,
+                                                "naive_tokens": 0, "context_tokens": 0})
+            s["requests"] += 1
+            s["candidates"] += candidates
+            s["chunks_sent"] += chunks
+            s["naive_tokens"] += naive
+            s["context_tokens"] += sent
+
+
+class ContextRetriever(BaseRetriever):
+    """
+    Retriever for the "stuff" QA chain: fetches `pool_k` chunks from the
+    hybrid retriever and returns what the ContextBuilder keeps for `prompt`.
+    """
+
+    base: HybridRetriever
+    builder: ContextBuilder
+    prompt: str = "rag"
+    pool_k: int = 3
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.builder.build(self.base.search(query, k=self.pool_k), self.prompt)
@@ -1,20 +1,66 @@
 # cq_manager/chat/document_processor.py
 import os
-from typing import List, Optional
+from collections import defaultdict
+from typing import Dict, List, Optional
 
 from langchain_community.document_loaders import DirectoryLoader, TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from cq_files.cq_manager.chat.embedding_backends import create_embeddings, model_id
+from cq_files.cq_manager.chat.faq_index import FAQIndex
+from cq_files.cq_manager.chat.index_manifest import IndexManifest, chunk_ids, file_sha256
+from cq_files.cq_manager.chat.kb_parsing import load_qa_pairs
+from cq_files.cq_manager.chat.kb_tables import KnowledgeTables
+from cq_files.cq_manager.chat.mmap_store import EmbeddingModelMismatch, MmapVectorStore, convert_faiss_store
+from cq_files.cq_manager.config import Config
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
+# what built indexes saved before the store recorded its model (the original hard-coded embeddings)
+LEGACY_EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+
+def store_ids(vs) -> List[str]:
+    """Docstore ids of every chunk in a FAISS or mmap store, in index order."""
+    if isinstance(vs, MmapVectorStore):
+        return vs.ids
+    return [vs.index_to_docstore_id[i] for i in range(len(vs.index_to_docstore_id))]
+
+
+def update_metadata(vs, metadatas: Dict[str, dict]):
+    """Replace the metadata of chunks already in a FAISS or mmap store, keeping their vectors."""
+    if isinstance(vs, MmapVectorStore):
+        vs.update_metadata(metadatas)
+        return
+    for sid, metadata in metadatas.items():
+        doc = vs.docstore.search(sid)
+        if isinstance(doc, Document):
+            vs.docstore.delete([sid])
+            vs.docstore.add({sid: Document(id=doc.id, page_content=doc.page_content, metadata=dict(metadata))})
 
 
 class DocumentProcessor:
-    def __init__(self, knowledge_base_path: str, vector_store_path: str):
+    def __init__(self, knowledge_base_path: str, vector_store_path: str, embeddings=None,
+                 store_format: Optional[str] = None):
         self.knowledge_base_path = knowledge_base_path
         self.vector_store_path = vector_store_path
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-mpnet-base-v2"
+        # "mmap" (pickle-free, see chat/mmap_store.py) or "faiss" (index.faiss + index.pkl)
+        self.store_format = store_format or Config.VECTOR_STORE_FORMAT
+        # Pass a shared embeddings object (see chat/resources.py) to avoid
+        # loading a second copy of the model.
+        self.embeddings = embeddings or create_embeddings(
+            Config.EMBEDDING_BACKEND, Config.EMBEDDING_MODEL, Config.EMBEDDING_SMALL_MODEL,
+            Config.EMBEDDING_ONNX_DIR, Config.EMBEDDING_ONNX_THREADS,
         )
+        self._store_listeners = []
+        self._embedding_dim: Optional[int] = None
+        self.last_sync: Optional[dict] = None
+
+    def add_store_listener(self, callback):
+        """`callback(vector_store)` runs after every successful (re)build."""
+        self._store_listeners.append(callback)
 
     def load_documents(self):
         print(f"[DocumentProcessor] Loading from {self.knowledge_base_path}")
@@ -56,8 +102,10 @@ class DocumentProcessor:
     def split_documents(self, documents):
         if not documents:
             return []
+        # start_index lets the context builder join neighbouring chunks
         splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500, chunk_overlap=100, length_function=len
+            chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, length_function=len,
+            add_start_index=True,
         )
         splits = splitter.split_documents(documents)
         print(f"Created {len(splits)} splits")
@@ -67,43 +115,276 @@ class DocumentProcessor:
         if not splits:
             print("No splits to index")
             return None
-        print("Creating FAISS vector store...")
-        vs = FAISS.from_documents(splits, self.embeddings)
-        os.makedirs(self.vector_store_path, exist_ok=True)
-        vs.save_local(self.vector_store_path)  # writes index.faiss + index.pkl
-        print(f"Saved FAISS to {self.vector_store_path}")
+        vs = self._new_store(splits)
+        self._save_store(vs)
+        for callback in self._store_listeners:
+            callback(vs)
         return vs
 
-    def load_vector_store(self) -> Optional[FAISS]:
+    def load_vector_store(self):
         index_path = os.path.join(self.vector_store_path, "index.faiss")
         store_path = os.path.join(self.vector_store_path, "index.pkl")
-        if os.path.exists(index_path) and os.path.exists(store_path):
-            print(f"Loading FAISS from {self.vector_store_path}")
+        legacy_exists = os.path.exists(index_path) and os.path.exists(store_path)
+        model = self._index_settings()["embedding_model"]
+        if self.store_format == "mmap":
             try:
-                return FAISS.load_local(
-                    self.vector_store_path,
-                    self.embeddings,
-                    allow_dangerous_deserialization=True,
-                )
+                if not MmapVectorStore.exists(self.vector_store_path) and legacy_exists:
+                    print("Converting index.faiss/index.pkl to the mmap format (one-off)")
+                    convert_faiss_store(self.vector_store_path, self.embeddings, model_name=LEGACY_EMBEDDING_MODEL)
+                if MmapVectorStore.exists(self.vector_store_path):
+                    print(f"Loading mmap vector store from {self.vector_store_path}")
+                    return MmapVectorStore.load(self.vector_store_path, self.embeddings,
+                                                model_name=model, dim=self._dimension())
+            except EmbeddingModelMismatch as e:
+                print(f"[DocumentProcessor] {e}; rebuilding it with the configured backend")
+                return None
             except Exception as e:
-                print(f"FAISS load error: {e}")
-        else:
+                print(f"Vector store load error: {e}")
+                return None
+            print("Vector store not found; will create new")
+            return None
+
+        if not legacy_exists:
             print("FAISS index not found; will create new")
+            return None
+        manifest = IndexManifest.load(self.vector_store_path)
+        # no manifest: saved by the original code, with its model
+        built_with = manifest.settings.get("embedding_model") if manifest else LEGACY_EMBEDDING_MODEL
+        print(f"Loading FAISS from {self.vector_store_path}")
+        try:
+            if built_with and built_with != model:
+                raise EmbeddingModelMismatch(f"FAISS index was built with {built_with}, not {model}")
+            vs = FAISS.load_local(
+                self.vector_store_path,
+                self.embeddings,
+                allow_dangerous_deserialization=True,
+            )
+            if vs.index.d != self._dimension():
+                raise EmbeddingModelMismatch(f"FAISS index holds {vs.index.d}-dim vectors, "
+                                             f"{model} makes {self._dimension()}-dim ones")
+            return vs
+        except EmbeddingModelMismatch as e:
+            print(f"[DocumentProcessor] {e}; rebuilding it with the configured backend")
+        except Exception as e:
+            print(f"FAISS load error: {e}")
         return None
 
     def process_and_store(self):
-        docs = self.load_documents()
-        if not docs:
+        return self.sync_vector_store()
+
+    def rebuild_vector_store(self, full: bool = False):
+        """Bring the index in line with the knowledge base; `full=True` re-embeds everything."""
+        if full:
+            print("Rebuilding FAISS from scratch...")
+        return self.sync_vector_store(full=full)
+
+    # ------------------------
+    # Incremental indexing
+    # ------------------------
+    def sync_vector_store(self, full: bool = False):
+        """
+        Incremental (re)index driven by manifest.json in the vector store directory.
+        Files whose hash is unchanged keep their chunks as they are; changed
+        files are re-split and only chunks with new content are embedded;
+        chunks that disappeared are deleted from the index. Reused chunks of
+        a changed file take the metadata of the new split (start_index moves
+        when text above them changes).
+        """
+        files = self._knowledge_base_files()
+        if not files:
             print("No documents found")
             return None
-        splits = self.split_documents(docs)
-        if not splits:
-            print("No splits created")
-            return None
-        return self.create_vector_store(splits)
 
-    def rebuild_vector_store(self):
-        print("Rebuilding FAISS from scratch...")
-        docs = self.load_documents()
-        splits = self.split_documents(docs)
-        return self.create_vector_store(splits)
+        settings = self._index_settings()
+        # a fresh copy from disk, not the shared store: listeners swap it in once saved
+        vs = None if full else self.load_vector_store()
+        old = None if vs is None else IndexManifest.load(self.vector_store_path)
+        if old is not None and (old.settings != settings
+                                or not set(old.store_ids.values()) <= set(store_ids(vs))):
+            print("[DocumentProcessor] manifest does not match the index; re-checking every chunk")
+            old = None
+        # index built without a manifest: reuse vectors whose chunk text still matches
+        legacy = self._legacy_store_ids(vs) if vs is not None and old is None else {}
+        old = old or IndexManifest(settings)
+
+        new = IndexManifest(settings)
+        pending: Dict[str, object] = {}
+        refreshed: Dict[str, dict] = {}
+        changed_files = 0
+        for rel in files:
+            path = os.path.join(self.knowledge_base_path, rel)
+            sha = file_sha256(path)
+            prev = old.files.get(rel)
+            if prev and prev["sha256"] == sha and all(c in old.store_ids for c in prev["chunks"]):
+                new.files[rel] = prev
+                for cid in prev["chunks"]:
+                    new.store_ids[cid] = old.store_ids[cid]
+                continue
+
+            changed_files += 1
+            splits = self.split_documents(self._load_file(path))
+            ids = chunk_ids(rel, [d.page_content for d in splits])
+            new.files[rel] = {"sha256": sha, "chunks": ids}
+            for cid, doc in zip(ids, splits):
+                key = (os.path.basename(rel), doc.page_content)
+                if cid in old.store_ids:
+                    new.store_ids[cid] = old.store_ids[cid]
+                elif legacy.get(key):
+                    new.store_ids[cid] = legacy[key].pop()
+                else:
+                    pending[cid] = doc
+                    continue
+                refreshed[new.store_ids[cid]] = doc.metadata
+
+        keep = set(new.store_ids.values())
+        stale = [] if vs is None else [sid for sid in store_ids(vs) if sid not in keep]
+        reused = len(new.store_ids)
+
+        if vs is None:
+            if not pending:
+                print("No splits to index")
+                return None
+            vs = self._new_store(list(pending.values()), ids=list(pending))
+        else:
+            if stale:
+                vs.delete(stale)
+            for sid in list(refreshed):
+                docs = vs.get_by_ids([sid])
+                if not docs or docs[0].metadata == refreshed[sid]:
+                    del refreshed[sid]
+            if refreshed:
+                update_metadata(vs, refreshed)
+            if pending:
+                vs.add_documents(list(pending.values()), ids=list(pending))
+        for cid in pending:
+            new.store_ids[cid] = cid
+
+        self.last_sync = {
+            "files": len(files),
+            "changed_files": changed_files,
+            "reused": reused,
+            "embedded": len(pending),
+            "removed": len(stale),
+            "metadata_updated": len(refreshed),
+            "digest": new.digest,
+        }
+        print(f"[DocumentProcessor] index {new.digest}: {reused} chunk(s) reused, "
+              f"{len(pending)} embedded, {len(stale)} removed "
+              f"({changed_files}/{len(files)} file(s) changed)")
+
+        if changed_files or full or KnowledgeTables.load(self.vector_store_path) is None:
+            self._extract_tables(files)
+        if changed_files or full or FAQIndex.load(self.vector_store_path, self._index_settings()["embedding_model"]) is None:
+            self._build_faq()
+
+        manifest_missing = IndexManifest.load(self.vector_store_path) is None
+        if not (pending or stale or refreshed or full or manifest_missing or new.files != old.files):
+            return vs
+
+        self._save_store(vs)
+        new.save(self.vector_store_path)
+        if pending or stale or refreshed or full:
+            for callback in self._store_listeners:
+                callback(vs)
+        return vs
+
+    # ------------------------
+    # Structured tables
+    # ------------------------
+    def load_tables(self) -> KnowledgeTables:
+        """Schedule/contact tables saved by the last sync, extracted now if missing."""
+        tables = KnowledgeTables.load(self.vector_store_path)
+        if tables is None:
+            tables = self._extract_tables(self._knowledge_base_files())
+        return tables
+
+    def _extract_tables(self, files: List[str]) -> KnowledgeTables:
+        tables = KnowledgeTables.from_files([os.path.join(self.knowledge_base_path, rel) for rel in files])
+        os.makedirs(self.vector_store_path, exist_ok=True)
+        tables.save(self.vector_store_path)
+        print(f"[DocumentProcessor] tables: {len(tables.schedule['collections'])} collection day(s), "
+              f"{len(tables.contacts['phones'])} phone(s), {len(tables.contacts['emails'])} email(s)")
+        return tables
+
+    # ------------------------
+    # FAQ fast path
+    # ------------------------
+    def load_faq(self, **kwargs) -> FAQIndex:
+        """Curated Q/A index saved by the last sync, rebuilt now if missing or from another model."""
+        faq = FAQIndex.load(self.vector_store_path, self._index_settings()["embedding_model"], **kwargs)
+        if faq is None:
+            faq = self._build_faq(**kwargs)
+        return faq
+
+    def _build_faq(self, **kwargs) -> FAQIndex:
+        faq = FAQIndex.build(load_qa_pairs(self.knowledge_base_path), self.embeddings, **kwargs)
+        os.makedirs(self.vector_store_path, exist_ok=True)
+        faq.save(self.vector_store_path)
+        print(f"[DocumentProcessor] FAQ: {len(faq)} curated question(s) embedded")
+        return faq
+
+    def _dimension(self) -> int:
+        """Width of the configured model's vectors, probed once."""
+        if self._embedding_dim is None:
+            self._embedding_dim = len(self.embeddings.embed_query("probe"))
+        return self._embedding_dim
+
+    def _index_settings(self) -> dict:
+        return {
+            "embedding_model": getattr(self.embeddings, "model_name", None) or model_id(
+                Config.EMBEDDING_BACKEND, Config.EMBEDDING_MODEL, Config.EMBEDDING_SMALL_MODEL),
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+        }
+
+    def _knowledge_base_files(self) -> List[str]:
+        if not os.path.exists(self.knowledge_base_path):
+            print(f"Error: {self.knowledge_base_path} does not exist")
+            return []
+        files = []
+        for root, _, names in os.walk(self.knowledge_base_path):
+            for name in names:
+                if name.endswith(".txt"):
+                    path = os.path.join(root, name)
+                    files.append(os.path.relpath(path, self.knowledge_base_path).replace(os.sep, "/"))
+        return sorted(files)
+
+    @staticmethod
+    def _load_file(path: str):
+        try:
+            return TextLoader(path, encoding="utf-8", autodetect_encoding=True).load()
+        except Exception as e:
+            print(f"Load failed for {path}: {e}")
+            return []
+
+    # ------------------------
+    # Store format helpers
+    # ------------------------
+    def _new_store(self, docs, ids: Optional[List[str]] = None):
+        if self.store_format == "mmap":
+            print("Creating mmap vector store...")
+            return MmapVectorStore.from_documents(docs, self.embeddings, ids=ids,
+                                                  model_name=self._index_settings()["embedding_model"])
+        print("Creating FAISS vector store...")
+        return FAISS.from_documents(docs, self.embeddings, ids=ids)
+
+    def _save_store(self, vs):
+        os.makedirs(self.vector_store_path, exist_ok=True)
+        if isinstance(vs, MmapVectorStore):
+            vs.save(self.vector_store_path)
+        else:
+            vs.save_local(self.vector_store_path)  # writes index.faiss + index.pkl
+        print(f"Saved vector store to {self.vector_store_path}")
+
+    @staticmethod
+    def _legacy_store_ids(vs) -> Dict[tuple, List[str]]:
+        """(file name, chunk text) -> docstore ids, for indexes saved before the manifest existed."""
+        by_content = defaultdict(list)
+        for sid in store_ids(vs):
+            docs = vs.get_by_ids([sid])
+            if not docs:
+                continue
+            doc = docs[0]
+            source = str(doc.metadata.get("source", "")).replace("\\", "/")
+            by_content[(source.rsplit("/", 1)[-1], doc.page_content)].append(sid)
+        return by_content
@@ -0,0 +1,119 @@
+# cq_manager/chat/embedding_backends.py
+import json
+import os
+import re
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# "torch": full-precision sentence-transformers model
+# "onnx-int8": the same model exported and int8-quantized for ONNX Runtime
+# "small": a smaller sentence-transformers model (torch)
+BACKENDS = ("torch", "onnx-int8", "small")
+ONNX_SUFFIX = "@onnx-int8"
+ONNX_CONFIG_FILE = "onnx_config.json"
+ONNX_MODEL_FILE = "model-int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+def backend_model_name(backend: str, model_name: str, small_model_name: str) -> str:
+    """The Hugging Face model a backend runs."""
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown embedding backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    return small_model_name if backend == "small" else model_name
+
+
+def model_id(backend: str, model_name: str, small_model_name: str) -> str:
+    """
+    What the vector store, index manifest and embedding cache record. The
+    quantized model gets its own id: its vectors are close to, but not the
+    same as, the full-precision ones.
+    """
+    name = backend_model_name(backend, model_name, small_model_name)
+    return name + ONNX_SUFFIX if backend == "onnx-int8" else name
+
+
+def onnx_model_dir(onnx_root: str, model_name: str) -> str:
+    return os.path.join(onnx_root, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+
+
+def create_embeddings(backend: str, model_name: str, small_model_name: str, onnx_root: str,
+                      threads: int = 0) -> Embeddings:
+    name = backend_model_name(backend, model_name, small_model_name)
+    if backend == "onnx-int8":
+        directory = onnx_model_dir(onnx_root, name)
+        if not os.path.exists(os.path.join(directory, ONNX_CONFIG_FILE)):
+            raise FileNotFoundError(
+                f"no exported ONNX model in {directory}; run "
+                f"`python -m cq_files.tools.embedding_backend export --model {name}`"
+            )
+        return OnnxEmbeddings(directory, threads=threads)
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=name)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from an int8 ONNX export of a sentence-transformers
+    model (see tools/embedding_backend.py): fast tokenizer, ONNX Runtime on
+    CPU, then the model's own pooling and normalisation. Needs neither torch
+    nor sentence-transformers at runtime.
+    """
+
+    def __init__(self, directory: str, threads: int = 0, batch_size: int = 32):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(directory, ONNX_CONFIG_FILE), encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.model_name = self.config["model"] + ONNX_SUFFIX
+        self.batch_size = batch_size
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(os.path.join(directory, self.config.get("file", ONNX_MODEL_FILE)),
+                                            sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=int(self.config["max_length"]))
+        self.tokenizer.enable_padding(pad_id=int(self.config["pad_id"]), pad_token=self.config["pad_token"])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        # same preprocessing as HuggingFaceEmbeddings
+        texts = [t.replace("\n", " ") for t in texts]
+        out = np.zeros((len(texts), int(self.config["dim"])), dtype=np.float32)
+        # batches of similar length pad less
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            out[idx] = self._embed_batch([texts[i] for i in idx])
+        return out
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(ids)
+        hidden = self.session.run(None, feeds)[0]
+
+        if self.config.get("pooling", "mean") == "cls":
+            pooled = hidden[:, 0]
+        else:
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        if self.config.get("normalize", True):
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
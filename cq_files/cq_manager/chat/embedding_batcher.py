@@ -0,0 +1,120 @@
+# cq_manager/chat/embedding_batcher.py
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Coalesces concurrent embed_query calls from request threads into one
+    batched model call.
+
+    Callers enqueue their text and block on a Future; a single dispatcher
+    thread takes whatever is queued, waits up to `max_wait` seconds for more
+    (never past `max_batch`), and runs the batch through
+    `base.embed_documents`. sentence-transformers and the ONNX backend
+    embed queries and documents the same way, so the vectors are the ones
+    embed_query would return. A lone request only pays the wait window;
+    under load, requests that arrive while a batch is running form the
+    next one.
+
+    embed_documents (indexing) is already batched and goes straight through.
+    """
+
+    def __init__(self, base: Embeddings, max_batch: int = 32, max_wait: float = 0.002):
+        self.base = base
+        self.model_name = getattr(base, "model_name", None)
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait)
+        self._queue: "deque[tuple]" = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._closed = False
+        self._batches = 0
+        self._items = 0
+        self._largest = 0
+        self._batch_seconds = 0.0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        if self._closed:
+            return self.base.embed_query(text)
+        future: Future = Future()
+        with self._cond:
+            self._ensure_thread()
+            self._queue.append((text, future))
+            self._cond.notify()
+        return future.result()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "batches": self._batches,
+                "queries": self._items,
+                "mean_batch": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "largest_batch": self._largest,
+                "model_seconds": round(self._batch_seconds, 3),
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1e3,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    # ------------------------
+    # Dispatcher
+    # ------------------------
+    def _ensure_thread(self):
+        # threads do not survive fork: a preloaded app starts its own per worker
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def _next_batch(self) -> list:
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return []
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(len(self._queue), self.max_batch)
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            # the same question asked by several threads is embedded once
+            unique = list(dict.fromkeys(text for text, _ in batch))
+            t0 = time.perf_counter()
+            try:
+                vectors = dict(zip(unique, self.base.embed_documents(unique)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - t0
+            for text, future in batch:
+                future.set_result(list(vectors[text]))
+            with self._cond:
+                self._batches += 1
+                self._items += len(batch)
+                self._largest = max(self._largest, len(batch))
+                self._batch_seconds += elapsed
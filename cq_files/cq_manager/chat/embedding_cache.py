@@ -0,0 +1,288 @@
+# cq_manager/chat/embedding_cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+KEY_BYTES = 32  # sha256 digest
+
+
+class EmbeddingDiskCache:
+    """
+    Append-only float32 store for one embedding model.
+
+    `<dir>/<model>.bin` is a sequence of fixed-size records: a 32-byte key
+    followed by `dim` float32 values. Each record goes out in one O_APPEND
+    write, so several workers can share the file. `<dir>/<model>.json`
+    records the model name and dimension. The key -> offset index is rebuilt
+    on open and whenever the file has grown since it was last read.
+
+    Every distinct query adds a record, so once the file holds `max_records`
+    it is renamed to `<model>.old.bin` (replacing the previous one) and a
+    new file is started: disk use and each worker's index stay under two
+    files' worth. A hit in the old file is appended to the current one, so
+    entries still in use (the indexed chunks, frequent queries) survive the
+    next rotation. Workers notice a rotation by the file's inode changing.
+    """
+
+    def __init__(self, directory: str, model_name: str, max_records: int = 20000):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        os.makedirs(directory, exist_ok=True)
+        self.model_name = model_name
+        self.max_records = max_records
+        self.data_path = os.path.join(directory, f"{slug}.bin")
+        self.old_path = os.path.join(directory, f"{slug}.old.bin")
+        self.meta_path = os.path.join(directory, f"{slug}.json")
+        self.dim: Optional[int] = None
+        self._offsets: Dict[bytes, int] = {}
+        self._scanned = 0
+        self._inode = None
+        self._old_offsets: Dict[bytes, int] = {}
+        self._old_inode = None
+        self._rotations = 0
+        self._lock = threading.Lock()
+        with self._lock:
+            self._load_meta()
+
+    def __len__(self):
+        return len(self._offsets) + len(self._old_offsets)
+
+    @property
+    def record_size(self) -> int:
+        return KEY_BYTES + 4 * self.dim
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            if self.dim is None and not self._load_meta():
+                return None
+            found = self._locate(key)
+            if found is None:
+                self._refresh()
+                found = self._locate(key)
+            if found is None:
+                return None
+        path, offset = found
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                record = f.read(self.record_size)
+        except OSError:
+            return None
+        # another worker may have rotated the file since it was indexed
+        if len(record) != self.record_size or record[:KEY_BYTES] != key:
+            return None
+        vector = np.frombuffer(record[KEY_BYTES:], dtype=np.float32)
+        if path == self.old_path:
+            self.put(key, vector)
+        return vector
+
+    def put(self, key: bytes, vector: np.ndarray):
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vector.shape[0])
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model_name, "dim": self.dim}, f)
+            if vector.shape[0] != self.dim or key in self._offsets:
+                return
+            record = key + np.asarray(vector, dtype="<f4").tobytes()
+            fd = os.open(self.data_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, record)
+            finally:
+                os.close(fd)
+            # picks up this record and anything other workers appended
+            self._refresh()
+            if self.max_records > 0 and self._scanned >= self.max_records * self.record_size:
+                self._rotate()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._offsets),
+                "old_entries": len(self._old_offsets),
+                "max_entries": self.max_records,
+                "rotations": self._rotations,
+            }
+
+    def _load_meta(self) -> bool:
+        """Pick up the dimension another worker (or an earlier run) recorded; False if there is none."""
+        if not os.path.exists(self.meta_path):
+            return False
+        with open(self.meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model") != self.model_name:
+            return False
+        self.dim = int(meta["dim"])
+        self._refresh()
+        return True
+
+    def _locate(self, key: bytes):
+        offset = self._offsets.get(key)
+        if offset is not None:
+            return self.data_path, offset
+        offset = self._old_offsets.get(key)
+        if offset is not None:
+            return self.old_path, offset
+        return None
+
+    def _rotate(self):
+        try:
+            # two workers rotating at once can drop one old file; it is only a cache
+            if os.stat(self.data_path).st_ino != self._inode:
+                return
+            os.replace(self.data_path, self.old_path)
+        except FileNotFoundError:
+            return
+        self._rotations += 1
+        print(f"[EmbeddingCache] {os.path.basename(self.data_path)} reached {self.max_records} "
+              f"records; rotated to {os.path.basename(self.old_path)}")
+        self._refresh()
+
+    def _refresh(self):
+        try:
+            inode = os.stat(self.data_path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self._inode:
+            # rotated, by us or another worker (or first look at the files)
+            self._offsets, self._scanned, self._inode = {}, 0, inode
+            try:
+                old_inode = os.stat(self.old_path).st_ino
+            except FileNotFoundError:
+                old_inode = None
+            if old_inode != self._old_inode:
+                self._old_offsets = {}
+                if old_inode is not None:
+                    self._scan(self.old_path, 0, self._old_offsets)
+                self._old_inode = old_inode
+        if inode is not None:
+            self._scanned = self._scan(self.data_path, self._scanned, self._offsets)
+
+    def _scan(self, path: str, start: int, offsets: Dict[bytes, int]) -> int:
+        """Index the complete records of `path` from byte `start`; returns where it stopped."""
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                complete = size - size % self.record_size
+                if complete <= start:
+                    return start
+                f.seek(start)
+                buf = f.read(complete - start)
+        except FileNotFoundError:
+            return start
+        for pos in range(0, len(buf), self.record_size):
+            offsets.setdefault(buf[pos:pos + KEY_BYTES], start + pos)
+        return complete
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Content-addressed cache in front of an Embeddings model, shared by
+    indexing (embed_documents) and query time (embed_query).
+
+    Keys are sha256(model name, kind, text), so a different model never hits
+    and query/document embeddings stay separate for models that embed them
+    differently. Lookups go to an in-memory LRU first, then to the on-disk
+    float32 tier; misses are embedded in one batch and written to both.
+    """
+
+    def __init__(self, base: Embeddings, model_name: str, cache_dir: Optional[str] = None,
+                 max_entries: int = 4096, disk_max_entries: int = 20000):
+        self.base = base
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.disk = EmbeddingDiskCache(cache_dir, model_name, disk_max_entries) if cache_dir else None
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts), "document")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query")[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._memory_hits + self._disk_hits + self._misses
+            stats = {
+                "model": self.model_name,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self.disk) if self.disk is not None else 0,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round((self._memory_hits + self._disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        if hasattr(self.base, "stats"):
+            stats["batching"] = self.base.stats()
+        return stats
+
+    # ------------------------
+    # Internals
+    # ------------------------
+    def _key(self, kind: str, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).digest()
+
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        keys = [self._key(kind, t) for t in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        missing: Dict[bytes, str] = {}
+
+        for key, text in zip(keys, texts):
+            if key in found or key in missing:
+                continue
+            vector = self._memory_get(key)
+            if vector is not None:
+                found[key] = vector
+                continue
+            vector = self.disk.get(key) if self.disk is not None else None
+            if vector is not None:
+                with self._lock:
+                    self._disk_hits += 1
+                self._memory_put(key, vector)
+                found[key] = vector
+            else:
+                missing[key] = text
+
+        if missing:
+            with self._lock:
+                self._misses += len(missing)
+            miss_keys = list(missing)
+            if kind == "query":
+                computed = [self.base.embed_query(missing[k]) for k in miss_keys]
+            else:
+                computed = self.base.embed_documents([missing[k] for k in miss_keys])
+            for key, values in zip(miss_keys, computed):
+                vector = np.asarray(values, dtype=np.float32)
+                found[key] = vector
+                self._memory_put(key, vector)
+                if self.disk is not None:
+                    self.disk.put(key, vector)
+
+        return [found[k].tolist() for k in keys]
+
+    def _memory_get(self, key: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+            return vector
+
+    def _memory_put(self, key: bytes, vector: np.ndarray):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
@@ -0,0 +1,143 @@
+# cq_manager/chat/faq_index.py
+import json
+import os
+import threading
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+FAQ_FILE = "faq.json"
+FAQ_VECTORS_FILE = "faq.f32"
+
+
+class FAQMatch(NamedTuple):
+    question: str
+    answer: str
+    source: str
+    section: str
+    score: float
+
+
+class FAQIndex:
+    """
+    The knowledge base's curated “question” → “answer” pairs
+    (kb_parsing.extract_qa_pairs) with one embedding per question.
+
+    Built at index time and saved next to the vector store: faq.f32 holds
+    the unit-normalised question vectors, faq.json the pairs and the model
+    that embedded them. `match()` is one matrix-vector product against the
+    turn's query vector; at or above `threshold` the curated answer is
+    returned as is, without retrieval or an LLM call.
+    """
+
+    def __init__(self, pairs: List[Dict[str, str]], vectors: np.ndarray, model_name: Optional[str] = None,
+                 threshold: float = 0.9, near_miss_margin: float = 0.05):
+        self.pairs = pairs
+        self.model_name = model_name
+        self.threshold = threshold
+        self.near_miss_margin = near_miss_margin
+        if pairs:
+            vectors = np.asarray(vectors, dtype=np.float32).reshape(len(pairs), -1)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            self._matrix = vectors / np.where(norms > 0, norms, 1.0)
+        else:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._near_misses = 0
+        self._recent = deque(maxlen=20)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    @classmethod
+    def build(cls, pairs: List[Dict[str, str]], embeddings, **kwargs) -> "FAQIndex":
+        vectors = embeddings.embed_documents([p["question"] for p in pairs]) if pairs else []
+        return cls(pairs, np.asarray(vectors, dtype=np.float32), getattr(embeddings, "model_name", None), **kwargs)
+
+    @classmethod
+    def load(cls, directory: str, model_name: Optional[str] = None, **kwargs) -> Optional["FAQIndex"]:
+        """None when missing, unreadable, or embedded by a model other than `model_name`."""
+        path = os.path.join(directory, FAQ_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if model_name and data.get("model") != model_name:
+                print(f"[FAQIndex] {path} was embedded with {data.get('model')}, not {model_name}")
+                return None
+            pairs = data["pairs"]
+            vectors = np.fromfile(os.path.join(directory, FAQ_VECTORS_FILE), dtype=np.float32)
+            if pairs and vectors.size != len(pairs) * int(data["dim"]):
+                raise ValueError(f"{FAQ_VECTORS_FILE} does not match {FAQ_FILE}")
+            return cls(pairs, vectors, data.get("model"), **kwargs)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[FAQIndex] ignoring unreadable {path}: {e}")
+            return None
+
+    def save(self, directory: str):
+        vectors_tmp = os.path.join(directory, FAQ_VECTORS_FILE + ".tmp")
+        np.ascontiguousarray(self._matrix, dtype=np.float32).tofile(vectors_tmp)
+        os.replace(vectors_tmp, os.path.join(directory, FAQ_VECTORS_FILE))
+        path = os.path.join(directory, FAQ_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "model": self.model_name,
+                "dim": int(self._matrix.shape[1]) if len(self.pairs) else 0,
+                "pairs": self.pairs,
+            }, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    # ------------------------
+    # Matching
+    # ------------------------
+    def best(self, vector) -> Optional[FAQMatch]:
+        if not self.pairs or vector is None:
+            return None
+        q = np.asarray(vector, dtype=np.float32)
+        if q.shape[0] != self._matrix.shape[1]:
+            return None
+        n = float(np.linalg.norm(q))
+        sims = self._matrix @ (q / n if n > 0 else q)
+        idx = int(np.argmax(sims))
+        pair = self.pairs[idx]
+        return FAQMatch(pair["question"], pair["answer"], pair.get("source", ""),
+                        pair.get("section", ""), round(float(sims[idx]), 4))
+
+    def match(self, vector, query: str = "") -> Optional[FAQMatch]:
+        """The curated pair for this query vector, or None below the threshold."""
+        found = self.best(vector)
+        if found is None:
+            return None
+        hit = found.score >= self.threshold
+        near = not hit and found.score >= self.threshold - self.near_miss_margin
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+                self._near_misses += near
+            if hit or near:
+                # curated questions only: /chat/faq-stats is public, user text stays in the server log
+                self._recent.append({"question": found.question, "source": found.source,
+                                     "score": found.score, "hit": hit})
+        if hit or near:
+            print(f"[FAQIndex] {'hit' if hit else 'near miss'} {found.score:.3f} "
+                  f"{found.source} / {found.section}: {found.question!r} <- {query!r}")
+        return found if hit else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pairs": len(self.pairs),
+                "model": self.model_name,
+                "threshold": self.threshold,
+                "hits": self._hits,
+                "misses": self._misses,
+                "near_misses": self._near_misses,
+                "recent": list(self._recent),
+            }
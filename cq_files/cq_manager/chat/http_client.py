@@ -0,0 +1,188 @@
+# cq_manager/chat/http_client.py
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Upstream is marked unhealthy; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker. After `failure_threshold`
+    consecutive failed calls it opens and rejects immediately for
+    `reset_timeout` seconds, then lets one probe through; a success closes
+    it again, a failure re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            # half-open: a single probe at a time
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release(self):
+        """Give back a half-open probe slot without judging upstream (e.g. cancelled call)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    print(f"[HTTP] circuit open after {self._failures} failure(s)")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class PooledHTTPClient:
+    """
+    Shared keep-alive session for OpenRouter calls.
+
+    - one connection pool of `pool_size` per process (rebuilt after fork)
+    - separate connect/read timeouts
+    - retries on connection errors, timeouts, 429 and 5xx with full-jitter
+      exponential backoff, honouring Retry-After up to `retry_after_max`
+    - a circuit breaker that rejects calls while upstream is unhealthy
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 4.0,
+        retry_after_max: float = 10.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._pid = None
+
+    @property
+    def session(self) -> requests.Session:
+        # pooled sockets must not be shared across a fork
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    s = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size,
+                                          max_retries=0)
+                    s.mount("https://", adapter)
+                    s.mount("http://", adapter)
+                    self._session = s
+                    self._pid = os.getpid()
+        return self._session
+
+    def post(self, url: str, headers: dict, payload: dict, stream: bool = False) -> requests.Response:
+        """
+        POST with retries. Returns the final response (possibly a non-2xx one);
+        raises CircuitOpenError or the last requests exception.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("upstream circuit is open")
+
+        attempt = 0
+        while True:
+            try:
+                r = self.session.post(url, headers=headers, json=payload,
+                                      timeout=self.timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+                self._sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            except requests.exceptions.RequestException:
+                self.breaker.record_failure()
+                raise
+
+            if r.status_code in RETRY_STATUSES:
+                delay = self._retry_after(r)
+                if attempt >= self.max_retries or (delay is not None and delay > self.retry_after_max):
+                    self.breaker.record_failure()
+                    return r
+                r.close()
+                self._sleep(delay if delay is not None else self._backoff(attempt))
+                attempt += 1
+                continue
+
+            # 4xx other than 429 is our request's fault, not upstream health
+            self.breaker.record_success()
+            return r
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _retry_after(r: requests.Response) -> Optional[float]:
+        value = r.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _sleep(seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
@@ -0,0 +1,111 @@
+# cq_manager/chat/hybrid_retriever.py
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; "e-waste" yields "e-waste" plus its parts."""
+    tokens = []
+    for tok in _TOKEN.findall(text.lower()):
+        tokens.append(tok)
+        if "-" in tok:
+            tokens.extend(p for p in tok.split("-") if p)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-process Okapi BM25 over the chunks of the vector store. Built from
+    the same documents, so exact keywords (days, ward names, phone numbers,
+    "e-waste") rank the chunks that contain them.
+    """
+
+    def __init__(self, documents: List[Document], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents = documents
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._lengths = []
+        for idx, doc in enumerate(documents):
+            counts = Counter(tokenize(doc.page_content))
+            self._lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings[term].append((idx, tf))
+        n = len(documents)
+        self._avg_len = (sum(self._lengths) / n) if n else 0.0
+        self._idf = {
+            term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in self._postings.items()
+        }
+
+    def __len__(self):
+        return len(self.documents)
+
+    @classmethod
+    def from_vector_store(cls, vector_store: VectorStore, **kwargs) -> "BM25Index":
+        from cq_files.cq_manager.chat.document_processor import store_ids
+
+        docs = vector_store.get_by_ids(store_ids(vector_store))
+        print(f"[BM25] indexed {len(docs)} chunk(s)")
+        return cls(docs, **kwargs)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for idx, tf in self._postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[idx] / (self._avg_len or 1.0))
+                scores[idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        return [(self.documents[idx], score) for idx, score in best]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = 60,
+                           weights: Optional[List[float]] = None) -> List[Document]:
+    """Merge ranked lists by sum(weight / (k + rank)); chunks are matched by text."""
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = defaultdict(float)
+    docs: Dict[str, Document] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking):
+            key = doc.page_content
+            scores[key] += weight / (k + rank + 1)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense (vector store) + sparse (BM25) retrieval fused with reciprocal
+    rank fusion. Each side fetches `fetch_k` candidates; the top `k` fused
+    chunks are returned.
+    """
+
+    vector_store: VectorStore
+    bm25: BM25Index
+    k: int = 2
+    fetch_k: int = 10
+    rrf_k: int = 60
+    dense_weight: float = 1.0
+    sparse_weight: float = 1.0
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Document]:
+        dense = self.vector_store.similarity_search(query, k=self.fetch_k)
+        sparse = [doc for doc, _ in self.bm25.search(query, k=self.fetch_k)]
+        fused = reciprocal_rank_fusion([dense, sparse], k=self.rrf_k,
+                                       weights=[self.dense_weight, self.sparse_weight])
+        return fused[:k or self.k]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.search(query)
@@ -0,0 +1,85 @@
+# cq_manager/chat/index_manifest.py
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_ids(source: str, texts: Iterable[str]) -> List[str]:
+    """
+    Stable ids for the chunks of one file: sha256 of (source, text). A text
+    repeated inside the same file gets an occurrence suffix so ids stay unique.
+    """
+    seen: Dict[str, int] = {}
+    ids = []
+    for text in texts:
+        digest = hashlib.sha256(f"{source}\n{text}".encode("utf-8")).hexdigest()
+        n = seen.get(digest, 0)
+        seen[digest] = n + 1
+        ids.append(digest if n == 0 else f"{digest}-{n}")
+    return ids
+
+
+class IndexManifest:
+    """
+    What is in the vector index, stored as manifest.json next to it.
+
+    - `settings`: embedding model and splitter parameters; if any of them
+      change, every chunk has to be re-embedded
+    - `files`: relative path -> {"sha256", "chunks": [chunk id, ...]}
+    - `store_ids`: chunk id -> docstore id in the vector store (the same as
+      the chunk id, except for chunks adopted from an index built without a
+      manifest)
+    """
+
+    def __init__(self, settings: dict, files: Optional[dict] = None, store_ids: Optional[dict] = None):
+        self.settings = settings
+        self.files: Dict[str, dict] = files or {}
+        self.store_ids: Dict[str, str] = store_ids or {}
+
+    @property
+    def digest(self) -> str:
+        """Content version of the index: changes iff the chunk set changes."""
+        h = hashlib.sha256(json.dumps(self.settings, sort_keys=True).encode("utf-8"))
+        for chunk_id in sorted(self.store_ids):
+            h.update(chunk_id.encode("ascii"))
+        return h.hexdigest()[:16]
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["IndexManifest"]:
+        path = os.path.join(directory, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                return None
+            return cls(data["settings"], data["files"], data["store_ids"])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[IndexManifest] ignoring unreadable manifest: {e}")
+            return None
+
+    def save(self, directory: str):
+        path = os.path.join(directory, MANIFEST_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "digest": self.digest,
+                "settings": self.settings,
+                "files": self.files,
+                "store_ids": self.store_ids,
+            }, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
@@ -0,0 +1,101 @@
+# cq_manager/chat/intent_classifier.py
+import json
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from cq_files.cq_manager.chat.kb_parsing import load_qa_pairs
+
+OFF_TOPIC = "Unknown"
+
+# Knowledge-base sections whose curated questions seed each intent
+SECTION_INTENTS = {
+    "CORE WASTE MANAGEMENT CONCEPTS": "3R Tips",
+    "WASTE TYPES AND CLASSIFICATION": "3R Tips",
+    "RECYCLABLE MATERIALS": "3R Tips",
+    "COMPOSTING INFORMATION": "3R Tips",
+    "WASTE SEPARATION GUIDELINES": "3R Tips",
+    "CHEMICAL WASTE AND EMISSIONS": "3R Tips",
+    "PUBLIC AWARENESS AND COMMUNITY ENGAGEMENT": "Public Awareness Tips",
+    "HANDLING COMPLAINTS AND FEEDBACK": "Complaints",
+}
+SUBSECTION_INTENTS = {
+    "Feedback Handling": "Feedback",
+}
+
+
+class IntentPrediction(NamedTuple):
+    intent: str
+    confidence: float
+    on_topic: bool
+    elapsed_ms: float
+
+
+class EmbeddingIntentClassifier:
+    """
+    Nearest-exemplar intent classifier on top of the shared sentence embedding.
+    Exemplar vectors are embedded once at build time; `predict()` is a single
+    matrix-vector product, so with the query vector already computed for the
+    turn it costs well under a millisecond on CPU.
+
+    Each intent scores the mean of its top-k exemplar similarities; confidence
+    is a softmax over those scores. `on_topic` is False when the winner is the
+    off-topic ("Unknown") class.
+    """
+
+    def __init__(self, embeddings, exemplars: Dict[str, List[str]], top_k: int = 3,
+                 temperature: float = 0.05):
+        self.top_k = top_k
+        self.temperature = temperature
+        self.intents = sorted(i for i, xs in exemplars.items() if xs)
+
+        texts, labels = [], []
+        for idx, intent in enumerate(self.intents):
+            for x in exemplars[intent]:
+                texts.append(x)
+                labels.append(idx)
+        vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self._matrix = vectors / np.where(norms > 0, norms, 1.0)
+        labels = np.asarray(labels)
+        self._groups = [np.flatnonzero(labels == idx) for idx in range(len(self.intents))]
+        print(f"[IntentClassifier] {len(texts)} exemplars across {len(self.intents)} intents")
+
+    @classmethod
+    def from_files(cls, embeddings, exemplars_path: str, knowledge_base_path: Optional[str] = None,
+                   **kwargs) -> "EmbeddingIntentClassifier":
+        with open(exemplars_path, encoding="utf-8") as f:
+            exemplars = {k: list(v) for k, v in json.load(f).items() if not k.startswith("_")}
+        if knowledge_base_path:
+            for pair in load_qa_pairs(knowledge_base_path):
+                intent = (SUBSECTION_INTENTS.get(pair["subsection"])
+                          or SECTION_INTENTS.get(pair["section"]))
+                if intent:
+                    exemplars.setdefault(intent, []).append(pair["question"])
+        return cls(embeddings, exemplars, **kwargs)
+
+    def predict(self, vector) -> IntentPrediction:
+        t0 = time.perf_counter()
+        q = np.asarray(vector, dtype=np.float32)
+        n = float(np.linalg.norm(q))
+        if n > 0:
+            q = q / n
+        sims = self._matrix @ q
+
+        scores = np.empty(len(self.intents), dtype=np.float32)
+        for idx, group in enumerate(self._groups):
+            s = sims[group]
+            k = min(self.top_k, s.size)
+            scores[idx] = np.partition(s, -k)[-k:].mean()
+
+        z = (scores - scores.max()) / self.temperature
+        probs = np.exp(z) / np.exp(z).sum()
+        best = int(np.argmax(probs))
+        intent = self.intents[best]
+        return IntentPrediction(
+            intent=intent,
+            confidence=round(float(probs[best]), 4),
+            on_topic=intent != OFF_TOPIC,
+            elapsed_ms=round((time.perf_counter() - t0) * 1000, 3),
+        )
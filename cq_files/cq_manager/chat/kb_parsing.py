@@ -0,0 +1,74 @@
+# cq_manager/chat/kb_parsing.py
+import os
+import re
+from typing import Dict, List
+
+_QUOTED = re.compile(r'^\s*[“"](.+?)[”"]\s*$')
+_SECTION = re.compile(r"^[A-Z0-9][A-Z0-9 &/()\-]{3,}$")
+_SUBSECTION = re.compile(r"^([A-Z][^:“”\"]{2,60}):\s*$")
+
+
+def _section_name(line: str) -> str:
+    # "WASTE COLLECTION SCHEDULE (Weekly Waste Collection Schedule)" -> "WASTE COLLECTION SCHEDULE"
+    return line.split("(")[0].strip()
+
+
+def extract_qa_pairs(text: str) -> List[Dict[str, str]]:
+    """
+    Curated question/answer pairs from a knowledge-base file: a line that is
+    entirely quoted (“...”), followed by the next fully quoted line. Blank
+    lines may sit between them; any other line breaks the pair.
+    Each pair carries the ALL-CAPS section and the "Xxx:" subsection it sits under.
+    """
+    pairs = []
+    section, subsection = "", ""
+    question = None
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        m = _QUOTED.match(line)
+        if m:
+            body = m.group(1).strip()
+            if question is None:
+                question = body
+            else:
+                pairs.append({
+                    "question": question,
+                    "answer": body,
+                    "section": section,
+                    "subsection": subsection,
+                })
+                question = None
+            continue
+
+        question = None
+        if _SECTION.match(line) or (line.isupper() and "(" in line):
+            section, subsection = _section_name(line), ""
+        else:
+            sm = _SUBSECTION.match(line)
+            if sm:
+                subsection = sm.group(1).strip()
+    return pairs
+
+
+def load_qa_pairs(knowledge_base_path: str) -> List[Dict[str, str]]:
+    """extract_qa_pairs over every .txt file in the knowledge base, tagged with `source`."""
+    pairs = []
+    if not os.path.isdir(knowledge_base_path):
+        return pairs
+    for root, _, files in os.walk(knowledge_base_path):
+        for name in sorted(files):
+            if not name.endswith(".txt"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    text = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"[kb_parsing] could not read {path}: {e}")
+                continue
+            for p in extract_qa_pairs(text):
+                p["source"] = os.path.relpath(path, knowledge_base_path)
+                pairs.append(p)
+    return pairs
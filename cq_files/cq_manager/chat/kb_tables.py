@@ -0,0 +1,262 @@
+# cq_manager/chat/kb_tables.py
+import json
+import os
+import re
+from typing import Dict, List, Optional
+
+TABLES_FILE = "tables.json"
+
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+_SECTION = re.compile(r"^[A-Z][A-Z &/-]+(?:\s*\(.*\))?\s*$")
+_SCHEDULE_HEADER = re.compile(r"^WASTE COLLECTION SCHEDULE\b")
+_CONTACT_HEADER = re.compile(r"^CONTACT DETAILS\b")
+_SCHEDULE_LINE = re.compile(
+    rf"^(?P<day>{'|'.join(DAYS)})\s*:\s*(?P<what>[^,]+?)(?:,\s*Time\s*:\s*(?P<time>.+))?$", re.I)
+_FIELD = re.compile(r"^(?P<label>[A-Z][\w /-]*?)\s*:\s*(?P<value>.+)$")
+_PHONE = re.compile(r"\(?\+?\d[\d() -]{6,}\d")
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
+_URL = re.compile(r"https?://\S+")
+_DAY_MENTION = re.compile(rf"\b({'|'.join(DAYS)})\b", re.I)
+_SPECIAL_PICKUP = re.compile(r"\b(bulky|hazardous|special|large items?|furniture)\b", re.I)
+_CONTACT_FIELDS = {
+    "email": re.compile(r"\be-?mail\b", re.I),
+    "phone": re.compile(r"\b(phone|number|call|telephone|hotline|mobile)\b", re.I),
+    "address": re.compile(r"\b(address|where|located|location|visit)\b", re.I),
+    "website": re.compile(r"\b(website|web ?site|site|url|online)\b", re.I),
+}
+
+
+_WASTE_TYPE = re.compile(r"\b(inorganic|organic|e-waste|electronic)", re.I)
+
+# what a generic schedule question ("show my schedule", "when is collection") is made of;
+# any other word names a material or item the table can't answer for
+_SCHEDULE_WORDS = frozenset("""
+    a an the is are be do does did will would can could should to for of on in at by this that
+    next each every week weekly weeks today tomorrow day days daily time times what when which
+    s how often usually normally regular show me my our tell give list see check know want need
+    please you your i we us it there schedule schedules scheduled timetable calendar collection
+    collections collected collecting collect collects pickup pickups pick picked up come comes
+    coming arrive arrives truck trucks bin bins garbage trash rubbish refuse waste general
+    household home house area street out put taken take away
+""".split()) | {d.lower() for d in DAYS}
+_WORDS = re.compile(r"[a-z]+")
+
+
+def waste_type_key(text: str) -> Optional[str]:
+    """The last waste type mentioned, so "organic ... and inorganic?" means inorganic."""
+    found = _WASTE_TYPE.findall(text)
+    if not found:
+        return None
+    last = found[-1].lower()
+    return "e-waste" if last == "electronic" else last
+
+
+def is_generic_schedule_question(text: str) -> bool:
+    return all(w in _SCHEDULE_WORDS for w in _WORDS.findall(text.lower()))
+
+
+def mentioned_day(text: str) -> Optional[str]:
+    found = _DAY_MENTION.findall(text)
+    return found[-1].capitalize() if found else None
+
+
+def _lower_first(text: str) -> str:
+    return text[:1].lower() + text[1:]
+
+
+def _sections(text: str) -> Dict[str, List[str]]:
+    """ALL-CAPS heading -> its non-empty lines."""
+    sections, current = {}, None
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if _SECTION.match(line):
+            current = line
+            sections[current] = []
+        elif current is not None:
+            sections[current].append(line)
+    return sections
+
+
+def extract_schedule(lines: List[str]) -> dict:
+    collections, no_collection, notes = [], [], {}
+    for line in lines:
+        m = _SCHEDULE_LINE.match(line)
+        if m:
+            day = m.group("day").capitalize()
+            what = m.group("what").strip()
+            key = waste_type_key(what)
+            if key is None:
+                no_collection.append(day)
+                continue
+            label = re.sub(r"\s+(waste\s+)?collection$", "", what, flags=re.I).strip()
+            time = (m.group("time") or "").strip()
+            collections.append({"waste_type": key, "label": label, "day": day, "time": time})
+            continue
+        f = _FIELD.match(line)
+        if f:
+            notes[f.group("label").strip().lower().replace(" ", "_")] = f.group("value").strip()
+    return {"collections": collections, "no_collection_days": no_collection, "notes": notes}
+
+
+def extract_contacts(lines: List[str]) -> dict:
+    organisation, address, phones, emails, websites = None, None, [], [], []
+    for line in lines:
+        f = _FIELD.match(line)
+        if not f:
+            continue
+        label, value = f.group("label").strip(), f.group("value").strip()
+        if _EMAIL.fullmatch(value):
+            emails.append({"label": label, "email": value})
+        elif _URL.fullmatch(value):
+            websites.append({"label": label, "url": value})
+        elif _PHONE.fullmatch(value):
+            phones.append({"label": label, "phone": value})
+        elif label.lower() == "address":
+            address = value
+        elif organisation is None and "office" in label.lower():
+            organisation = value
+    return {"organisation": organisation, "address": address, "phones": phones,
+            "emails": emails, "websites": websites}
+
+
+class KnowledgeTables:
+    """
+    Structured facts pulled out of the knowledge base at index time: the
+    weekly collection schedule (waste type -> day/time) and the council's
+    contact details. Stored as tables.json next to the vector store.
+    """
+
+    def __init__(self, schedule: Optional[dict] = None, contacts: Optional[dict] = None):
+        self.schedule = schedule or {"collections": [], "no_collection_days": [], "notes": {}}
+        self.contacts = contacts or {"organisation": None, "address": None, "phones": [],
+                                     "emails": [], "websites": []}
+
+    @classmethod
+    def from_text(cls, text: str) -> "KnowledgeTables":
+        tables = cls()
+        for heading, lines in _sections(text).items():
+            if _SCHEDULE_HEADER.match(heading):
+                tables.schedule = extract_schedule(lines)
+            elif _CONTACT_HEADER.match(heading):
+                tables.contacts = extract_contacts(lines)
+        return tables
+
+    @classmethod
+    def from_files(cls, paths: List[str]) -> "KnowledgeTables":
+        """Later files fill in whatever earlier ones did not define."""
+        tables = cls()
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                found = cls.from_text(f.read())
+            if found.schedule["collections"] and not tables.schedule["collections"]:
+                tables.schedule = found.schedule
+            if (found.contacts["phones"] or found.contacts["emails"]) and not \
+                    (tables.contacts["phones"] or tables.contacts["emails"]):
+                tables.contacts = found.contacts
+        return tables
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["KnowledgeTables"]:
+        path = os.path.join(directory, TABLES_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(data.get("schedule"), data.get("contacts"))
+        except (OSError, ValueError) as e:
+            print(f"[KnowledgeTables] ignoring unreadable {path}: {e}")
+            return None
+
+    def save(self, directory: str):
+        path = os.path.join(directory, TABLES_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"schedule": self.schedule, "contacts": self.contacts}, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    # ------------------------
+    # Lookups
+    # ------------------------
+    def collection(self, waste_type: str) -> Optional[dict]:
+        for entry in self.schedule["collections"]:
+            if entry["waste_type"] == waste_type:
+                return entry
+        return None
+
+    def collections_on(self, day: str) -> List[dict]:
+        return [e for e in self.schedule["collections"] if e["day"] == day]
+
+    def has_schedule(self) -> bool:
+        return bool(self.schedule["collections"])
+
+    def has_contacts(self) -> bool:
+        c = self.contacts
+        return bool(c["phones"] or c["emails"] or c["address"] or c["websites"])
+
+    # ------------------------
+    # Templated answers (None = no entry; use the LLM path)
+    # ------------------------
+    def _slot(self, entry: dict) -> str:
+        return f"{entry['day']}, {_lower_first(entry['time'])}" if entry["time"] else entry["day"]
+
+    def schedule_answer(self, message: str) -> Optional[str]:
+        if not self.has_schedule():
+            return None
+        notes = self.schedule["notes"]
+        if _SPECIAL_PICKUP.search(message):
+            return notes.get("special_pickups")
+
+        tip = f" Tip: {notes['tip']}" if notes.get("tip") else ""
+        waste_type = waste_type_key(message)
+        if waste_type:
+            entry = self.collection(waste_type)
+            if entry is None:
+                return None
+            return f"{entry['label']} is collected on {self._slot(entry)}.{tip}"
+        if not is_generic_schedule_question(message):
+            return None  # glass, a sofa, rainwater...: not in the table
+
+        day = mentioned_day(message)
+        if day:
+            entries = self.collections_on(day)
+            if entries:
+                what = " and ".join(_lower_first(e["label"]) if i else e["label"] for i, e in enumerate(entries))
+                when = f", {_lower_first(entries[0]['time'])}" if entries[0]["time"] else ""
+                return f"{what} is collected on {day}{when}.{tip}"
+            if day in self.schedule["no_collection_days"]:
+                return f"{day} is not a general waste collection day. {self.weekly_summary()}"
+            return None
+
+        return f"{self.weekly_summary()}{tip}"
+
+    def weekly_summary(self) -> str:
+        days = "; ".join(f"{e['label']}: {self._slot(e)}" for e in self.schedule["collections"])
+        return f"Weekly collection schedule - {days}."
+
+    def contact_answer(self, message: str) -> Optional[str]:
+        if not self.has_contacts():
+            return None
+        c = self.contacts
+        org = c["organisation"] or "the Municipal Council"
+        wanted = [field for field, rx in _CONTACT_FIELDS.items() if rx.search(message)]
+        lines = []
+        if "email" in wanted and c["emails"]:
+            lines.append("Email: " + ", ".join(e["email"] for e in c["emails"]))
+        if "phone" in wanted and c["phones"]:
+            lines.extend(f"{p['label']}: {p['phone']}" for p in c["phones"])
+        if "address" in wanted and c["address"]:
+            lines.append(f"Address: {c['address']}")
+        if "website" in wanted and c["websites"]:
+            lines.append("Website: " + ", ".join(w["url"] for w in c["websites"]))
+        if wanted and not lines:
+            return None  # asked for a field the table doesn't have
+        if not lines:
+            lines = ([f"Address: {c['address']}"] if c["address"] else []) + \
+                    [f"{p['label']}: {p['phone']}" for p in c["phones"]] + \
+                    [f"Email: {e['email']}" for e in c["emails"]] + \
+                    [f"Website: {w['url']}" for w in c["websites"]]
+        return f"Contact details for {org}:\n" + "\n".join(lines)
@@ -1,11 +1,114 @@
 # cq_manager/chat/llm_handler.py
+import json
 import os
+import threading
+import time
 import requests
-from typing import Optional, List, Any
+from contextlib import contextmanager
+from typing import Optional, List, Any, Iterator
 from pydantic import Field
 from langchain.llms.base import LLM  # still supported; subclass OK (LC v0.3 notes)
+from langchain_core.outputs import GenerationChunk
 
-OPENROUTER_BASE = "https://openrouter.ai/api/v1/chat/completions"
+from cq_files.cq_manager.chat import metrics
+from cq_files.cq_manager.chat.admission import UpstreamBusy
+from cq_files.cq_manager.chat.http_client import CircuitOpenError
+from cq_files.cq_manager.chat.model_router import AttemptFailed, ModelRouter
+
+OPENROUTER_BASE = os.getenv(
+    "OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1/chat/completions"
+)
+
+# Canned replies returned instead of a completion when the upstream call fails
+API_ERROR_RESPONSE = "I encountered an API error. Please try again."
+TIMEOUT_RESPONSE = "The request timed out. Please try again."
+CONNECTION_ERROR_RESPONSE = "A connection error occurred. Please try again."
+UNEXPECTED_ERROR_RESPONSE = "I hit an unexpected error. Please try again."
+UNAVAILABLE_RESPONSE = "The assistant is temporarily unavailable. Please try again in a minute."
+BUSY_RESPONSE = "I'm helping a lot of people right now. Please try again in a few seconds."
+FALLBACK_RESPONSES = (
+    API_ERROR_RESPONSE,
+    TIMEOUT_RESPONSE,
+    CONNECTION_ERROR_RESPONSE,
+    UNEXPECTED_ERROR_RESPONSE,
+    UNAVAILABLE_RESPONSE,
+    BUSY_RESPONSE,
+)
+
+
+def _http_client():
+    # one pooled session per process, shared by every OpenRouter call
+    from cq_files.cq_manager.chat.resources import get_registry
+
+    return get_registry().get("http_client")
+
+
+@contextmanager
+def upstream_slot():
+    """Holds one of the process's OpenRouter slots (chat/admission.py); raises UpstreamBusy."""
+    from cq_files.cq_manager.chat.resources import get_registry
+
+    limiter = get_registry().get("upstream_limiter")
+    if limiter is None:
+        yield
+        return
+    with limiter.slot():
+        yield
+
+
+def _sse_deltas(r) -> Iterator[str]:
+    """Content deltas of an OpenRouter `stream: true` response."""
+    for line in r.iter_lines(decode_unicode=True):
+        # SSE: "data: {...}" frames; ":" lines are keep-alive comments
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        try:
+            delta = json.loads(data)["choices"][0].get("delta", {})
+        except (ValueError, KeyError, IndexError):
+            continue
+        text = delta.get("content") or ""
+        if text:
+            yield text
+
+
+def post_completion(url: str, api_key: str, payload: dict) -> str:
+    """Blocking chat completion; returns the text or one of FALLBACK_RESPONSES."""
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+    t0 = time.perf_counter()
+    status, usage = "error", None
+    try:
+        with upstream_slot():
+            r = _http_client().post(url, headers, payload)
+        status = str(r.status_code)
+        if r.status_code == 200:
+            j = r.json()
+            usage = j.get("usage")
+            return j["choices"][0]["message"]["content"].strip()
+        print(f"OpenRouter API Error: {r.status_code} - {r.text}")
+        return API_ERROR_RESPONSE
+    except UpstreamBusy:
+        status = "busy"
+        return BUSY_RESPONSE
+    except CircuitOpenError:
+        status = "circuit_open"
+        return UNAVAILABLE_RESPONSE
+    except requests.exceptions.Timeout:
+        status = "timeout"
+        return TIMEOUT_RESPONSE
+    except requests.exceptions.RequestException as e:
+        print(f"OpenRouter request error: {e}")
+        return CONNECTION_ERROR_RESPONSE
+    except Exception as e:
+        print(f"Unexpected LLM error: {e}")
+        return UNEXPECTED_ERROR_RESPONSE
+    finally:
+        metrics.record_llm_call("completion", status, time.perf_counter() - t0, usage)
 
 
 class OpenRouterLLM(LLM):
@@ -15,9 +118,12 @@ class OpenRouterLLM(LLM):
     temperature: float = Field(default=0.8)
     top_p: float = Field(default=0.96)
     base_url: str = Field(default=OPENROUTER_BASE)
+    # several models raced by hedging (chat/model_router.py); None = `model` only
+    router: Optional[ModelRouter] = Field(default=None, exclude=True)
 
     class Config:
         extra = "forbid"
+        arbitrary_types_allowed = True
 
     @property
     def _llm_type(self) -> str:
@@ -30,39 +136,154 @@ class OpenRouterLLM(LLM):
         run_manager: Optional[Any] = None,
         **kwargs: Any,
     ) -> str:
+        if self.router is not None:
+            return self.router.complete(self._attempt(prompt, stop), TIMEOUT_RESPONSE).strip()
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+        }
+        if stop:
+            payload["stop"] = stop
+        return post_completion(self.base_url, self.api_key, payload)
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        """OpenRouter `stream: true`; yields content deltas as they arrive."""
+        if self.router is not None:
+            for text in self.router.stream(self._attempt(prompt, stop), TIMEOUT_RESPONSE):
+                if run_manager:
+                    run_manager.on_llm_new_token(text)
+                yield GenerationChunk(text=text)
+            return
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "stream": True,
+        }
+        if stop:
+            payload["stop"] = stop
+
+        yielded = False
+        t0 = time.perf_counter()
+        status = "error"
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
+            # the slot is held until the stream ends
+            with upstream_slot(), _http_client().post(self.base_url, headers, payload, stream=True) as r:
+                status = str(r.status_code)
+                metrics.record_llm_call("stream", status, time.perf_counter() - t0)
+                if r.status_code != 200:
+                    print(f"OpenRouter API Error: {r.status_code} - {r.text}")
+                    yield GenerationChunk(text=API_ERROR_RESPONSE)
+                    return
+                for text in _sse_deltas(r):
+                    if run_manager:
+                        run_manager.on_llm_new_token(text)
+                    yielded = True
+                    yield GenerationChunk(text=text)
+        except UpstreamBusy:
+            metrics.record_llm_call("stream", "busy", time.perf_counter() - t0)
+            yield GenerationChunk(text=BUSY_RESPONSE)
+        except CircuitOpenError:
+            metrics.record_llm_call("stream", "circuit_open", time.perf_counter() - t0)
+            yield GenerationChunk(text=UNAVAILABLE_RESPONSE)
+        except requests.exceptions.Timeout:
+            if status == "error":
+                metrics.record_llm_call("stream", "timeout", time.perf_counter() - t0)
+            # a stream cut off midway keeps what was already sent
+            if not yielded:
+                yield GenerationChunk(text=TIMEOUT_RESPONSE)
+        except requests.exceptions.RequestException as e:
+            if status == "error":
+                metrics.record_llm_call("stream", "error", time.perf_counter() - t0)
+            print(f"OpenRouter request error: {e}")
+            if not yielded:
+                yield GenerationChunk(text=CONNECTION_ERROR_RESPONSE)
+        except Exception as e:
+            if status == "error":
+                metrics.record_llm_call("stream", "error", time.perf_counter() - t0)
+            print(f"Unexpected LLM error: {e}")
+            if not yielded:
+                yield GenerationChunk(text=UNEXPECTED_ERROR_RESPONSE)
+
+    def _attempt(self, prompt: str, stop: Optional[List[str]]):
+        """
+        One model's try for the router: streams even when the caller wants
+        the whole text, so a cancelled attempt closes its connection
+        between deltas instead of waiting out the completion.
+        """
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+        def stream(model: str, cancel: threading.Event) -> Iterator[str]:
             payload = {
-                "model": self.model,
+                "model": model,
                 "messages": [{"role": "user", "content": prompt}],
                 "max_tokens": self.max_tokens,
                 "temperature": self.temperature,
                 "top_p": self.top_p,
+                "stream": True,
             }
             if stop:
                 payload["stop"] = stop
+            t0 = time.perf_counter()
+            try:
+                r = _http_client().post(self.base_url, headers, payload, stream=True)
+            except CircuitOpenError:
+                metrics.record_llm_call("stream", "circuit_open", time.perf_counter() - t0)
+                raise AttemptFailed(UNAVAILABLE_RESPONSE, "circuit_open")
+            except requests.exceptions.Timeout:
+                metrics.record_llm_call("stream", "timeout", time.perf_counter() - t0)
+                raise AttemptFailed(TIMEOUT_RESPONSE, "timeout")
+            except requests.exceptions.RequestException as e:
+                metrics.record_llm_call("stream", "error", time.perf_counter() - t0)
+                print(f"OpenRouter request error ({model}): {e}")
+                raise AttemptFailed(CONNECTION_ERROR_RESPONSE, "error")
+            with r:
+                metrics.record_llm_call("stream", str(r.status_code), time.perf_counter() - t0)
+                if r.status_code != 200:
+                    print(f"OpenRouter API Error ({model}): {r.status_code} - {r.text}")
+                    raise AttemptFailed(API_ERROR_RESPONSE, str(r.status_code))
+                try:
+                    for text in _sse_deltas(r):
+                        if cancel.is_set():
+                            return
+                        yield text
+                except requests.exceptions.Timeout:
+                    raise AttemptFailed(TIMEOUT_RESPONSE, "timeout")
+                except requests.exceptions.RequestException as e:
+                    print(f"OpenRouter request error ({model}): {e}")
+                    raise AttemptFailed(CONNECTION_ERROR_RESPONSE, "error")
 
-            r = requests.post(self.base_url, headers=headers, json=payload, timeout=30)
-            if r.status_code == 200:
-                j = r.json()
-                return j["choices"][0]["message"]["content"].strip()
-            print(f"OpenRouter API Error: {r.status_code} - {r.text}")
-            return "I encountered an API error. Please try again."
-        except requests.exceptions.Timeout:
-            return "The request timed out. Please try again."
-        except requests.exceptions.RequestException as e:
-            print(f"OpenRouter request error: {e}")
-            return "A connection error occurred. Please try again."
-        except Exception as e:
-            print(f"Unexpected LLM error: {e}")
-            return "I hit an unexpected error. Please try again."
+        def run(model: str, cancel: threading.Event) -> Iterator[str]:
+            try:
+                with upstream_slot():
+                    yield from stream(model, cancel)
+            except UpstreamBusy:
+                metrics.record_llm_call("stream", "busy", 0.0)
+                raise AttemptFailed(BUSY_RESPONSE, "busy")
+
+        return run
 
 
 class LLMHandler:
-    def __init__(self):
+    def __init__(self, router: Optional[ModelRouter] = None):
         self.api_key = os.getenv("OPENROUTER_API_KEY")
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY environment variable not set")
@@ -74,7 +295,9 @@ class LLMHandler:
             max_tokens=int(os.getenv("OPENROUTER_MAX_TOKENS", "200")),
             temperature=float(os.getenv("OPENROUTER_TEMPERATURE", "0.8")),
             top_p=float(os.getenv("OPENROUTER_TOP_P", "0.96")),
+            router=router,
         )
+        self.router = router
 
         self.base_url = OPENROUTER_BASE
         self.model = self.llm.model
@@ -85,30 +308,20 @@ class LLMHandler:
     def generate_response(self, prompt: str) -> str:
         return self.llm._call(prompt)
 
+    def stream_response(self, prompt: str) -> Iterator[str]:
+        for chunk in self.llm._stream(prompt):
+            yield chunk.text
+
     def generate_response_direct(self, prompt: str) -> str:
-        # For parity with your original; uses requests directly
-        try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
-            payload = {
-                "model": self.model,
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": self.max_tokens,
-                "temperature": self.temperature,
-                "top_p": self.top_p,
-            }
-            r = requests.post(self.base_url, headers=headers, json=payload, timeout=30)
-            if r.status_code == 200:
-                return r.json()["choices"][0]["message"]["content"].strip()
-            print(f"API Error: {r.status_code} - {r.text}")
-            return "I encountered an API error. Please try again."
-        except requests.exceptions.Timeout:
-            return "The request timed out. Please try again."
-        except requests.exceptions.RequestException as e:
-            print(f"Request error: {e}")
-            return "A connection error occurred. Please try again."
+        # For parity with your original; bypasses LangChain but shares the HTTP pool
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+        }
+        return post_completion(self.base_url, self.api_key, payload)
 
     def set_model(self, model_name: str):
         self.model = model_name
@@ -0,0 +1,306 @@
+# cq_manager/chat/metrics.py
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Seconds; covers sub-millisecond lookups up to slow LLM round trips
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """
+    Fixed buckets; observe() is one bisect and three additions under a lock.
+    Counts are stored per bucket and made cumulative only when rendered.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for labels, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                bucket = _labels(self.labelnames, labels, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {n}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Per-process: with several workers, scrape each one (or run a single worker)
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "chat_stage_seconds", "Time spent in one pipeline stage", ["component", "stage"])
+TURN_SECONDS = REGISTRY.histogram(
+    "chat_turn_seconds", "End-to-end time of a chat turn, by the branch that answered", ["branch"])
+BRANCH_TOTAL = REGISTRY.counter(
+    "chat_branch_total", "Turns answered, by process_message branch", ["branch"])
+LLM_SECONDS = REGISTRY.histogram(
+    "openrouter_request_seconds", "OpenRouter round trip (time to headers for streams)", ["kind", "status"])
+LLM_REQUESTS = REGISTRY.counter(
+    "openrouter_requests_total", "OpenRouter requests by outcome", ["kind", "status"])
+LLM_TOKENS = REGISTRY.counter(
+    "openrouter_tokens_total", "Token usage reported by OpenRouter", ["type"])
+LLM_MODEL_ATTEMPTS = REGISTRY.counter(
+    "openrouter_model_attempts_total", "Hedged attempts per model (chat/model_router.py), by outcome",
+    ["model", "outcome"])
+UPSTREAM_IN_FLIGHT = REGISTRY.gauge(
+    "openrouter_in_flight", "OpenRouter requests holding an upstream slot (chat/admission.py)")
+UPSTREAM_QUEUE_DEPTH = REGISTRY.gauge(
+    "openrouter_queue_depth", "Callers waiting for an upstream slot")
+UPSTREAM_WAIT_SECONDS = REGISTRY.histogram(
+    "openrouter_queue_wait_seconds", "Time spent waiting for an upstream slot, admitted callers")
+UPSTREAM_REJECTED = REGISTRY.counter(
+    "openrouter_rejected_total", "Callers turned away without an upstream slot", ["reason"])
+SESSION_RATE_LIMITED = REGISTRY.counter(
+    "chat_rate_limited_total", "Chat requests refused by the per-session rate limit", ["route"])
+CONTEXT_TOKENS = REGISTRY.counter(
+    "context_tokens_total", "Estimated prompt-context tokens, retrieved (naive) vs sent", ["prompt", "kind"])
+
+
+# ------------------------
+# Turn traces
+# ------------------------
+class TurnTrace:
+    """Stages of the turn running in this context, for the slow-turn log line."""
+
+    __slots__ = ("started", "stages", "branch", "intent", "llm_calls", "context_saved", "upstream_busy")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+        self.branch: Optional[str] = None
+        self.intent: Optional[Tuple[str, float]] = None  # (intent, confidence) when the turn classified one
+        self.llm_calls = 0
+        self.context_saved = 0
+        self.upstream_busy = False  # refused an upstream slot; later LLM calls fail fast
+
+    def summary(self) -> str:
+        return " ".join(f"{name}={seconds * 1e3:.0f}ms" for name, seconds in self.stages)
+
+
+_trace: contextvars.ContextVar = contextvars.ContextVar("chat_turn_trace", default=None)
+_last: contextvars.ContextVar = contextvars.ContextVar("chat_last_turn", default=None)
+
+
+def start_turn() -> TurnTrace:
+    trace = TurnTrace()
+    _trace.set(trace)
+    return trace
+
+
+def finish_turn(trace: TurnTrace, slow_after: float = 0.0, fallback_branch: str = "unknown") -> float:
+    """Record the turn; logs its stage breakdown when it took longer than `slow_after` seconds."""
+    elapsed = time.perf_counter() - trace.started
+    branch = trace.branch or fallback_branch
+    TURN_SECONDS.observe(elapsed, branch)
+    BRANCH_TOTAL.inc(branch)
+    if slow_after and elapsed > slow_after:
+        print(f"[Metrics] slow turn {elapsed:.2f}s branch={branch} llm_calls={trace.llm_calls} "
+              f"context_saved={trace.context_saved} {trace.summary()}")
+    # clear rather than reset(token): streaming generators may finish in another context
+    _trace.set(None)
+    _last.set(trace)
+    return elapsed
+
+
+def current_turn() -> Optional[TurnTrace]:
+    return _trace.get()
+
+
+def last_turn() -> Optional[TurnTrace]:
+    """The turn most recently finished in this context (tools/eval_batch.py reads its branch and stages)."""
+    return _last.get()
+
+
+def set_branch(branch: str):
+    trace = _trace.get()
+    if trace is not None and trace.branch is None:
+        trace.branch = branch
+
+
+def set_intent(intent: str, confidence: float):
+    trace = _trace.get()
+    if trace is not None:
+        trace.intent = (intent, confidence)
+
+
+def observe_stage(component: str, stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, component, stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace.stages.append((stage, seconds))
+
+
+class timed:
+    """
+    `with timed("chat", "intent"):` or `@timed("chat", "intent")`: observes
+    chat_stage_seconds and adds the stage to the current turn trace.
+    """
+
+    __slots__ = ("component", "stage", "_t0")
+
+    def __init__(self, component: str, stage: str):
+        self.component = component
+        self.stage = stage
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe_stage(self.component, self.stage, time.perf_counter() - self._t0)
+        return False
+
+    def __call__(self, fn):
+        component, stage = self.component, self.stage
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe_stage(component, stage, time.perf_counter() - t0)
+
+        return wrapper
+
+
+def record_llm_call(kind: str, status: str, seconds: float, usage: Optional[dict] = None):
+    """One OpenRouter request: `kind` is "completion" or "stream", `status` the HTTP code or an error name."""
+    LLM_SECONDS.observe(seconds, kind, status)
+    LLM_REQUESTS.inc(kind, status)
+    if usage:
+        for key in ("prompt_tokens", "completion_tokens"):
+            if usage.get(key):
+                LLM_TOKENS.inc(key.split("_")[0], amount=usage[key])
+    trace = _trace.get()
+    if trace is not None:
+        trace.llm_calls += 1
+
+
+def record_context(prompt: str, naive_tokens: int, sent_tokens: int):
+    """One context build (chat/context_builder.py): what retrieval returned vs what went into the prompt."""
+    CONTEXT_TOKENS.inc(prompt, "naive", amount=naive_tokens)
+    CONTEXT_TOKENS.inc(prompt, "sent", amount=sent_tokens)
+    trace = _trace.get()
+    if trace is not None:
+        trace.context_saved += naive_tokens - sent_tokens
@@ -0,0 +1,327 @@
+# cq_manager/chat/mmap_store.py
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+STORE_FILE = "store.json"
+STORE_FORMAT = "mmap-v1"
+
+
+class EmbeddingModelMismatch(ValueError):
+    """The store was built by a different embedding model than the one loading it."""
+
+
+class MmapVectorStore(VectorStore):
+    """
+    Pickle-free vector store laid out for sharing between workers.
+
+    - vectors-<gen>.f32: raw float32 matrix (count x dim), opened with
+      np.memmap so every process maps the same OS page-cache pages
+    - docs-<gen>.sqlite: chunk id, text and JSON metadata, read on demand
+    - store.json: format, dimension, count, embedding model and the current
+      generation; it is replaced atomically on save, so readers never see a
+      half-written store
+
+    A save keeps the previous generation's files (older ones are swept), so
+    a process still on it, e.g. a worker that has not reloaded after
+    another one rebuilt the index, can keep opening them. If they are gone
+    too, document lookups move to the current generation: chunk ids are
+    content hashes, so unchanged chunks keep their id.
+
+    Search is exact L2 like the IndexFlatL2 that FAISS.from_documents builds,
+    so scores and ranking match the old store.
+
+    delete() and add_texts() build new arrays and swap them in together
+    under a lock; searches read one consistent snapshot, so a sync running
+    alongside requests never pairs new vectors with old ids or documents.
+    """
+
+    def __init__(self, embedding: Embeddings, vectors: np.ndarray, ids: List[str],
+                 docs_path: Optional[str] = None, docs: Optional[Dict[str, Document]] = None,
+                 model_name: Optional[str] = None):
+        self.embedding = embedding
+        self.model_name = model_name
+        self._vectors = vectors
+        self._ids = list(ids)
+        self._docs_path = docs_path
+        self._docs: Dict[str, Document] = dict(docs or {})
+        self._local = threading.local()
+        self._lock = threading.RLock()  # guards the five fields above as one unit
+        self._sq_norms = np.einsum("ij,ij->i", vectors, vectors) if len(ids) else np.zeros(0, np.float32)
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding
+
+    @property
+    def ids(self) -> List[str]:
+        return list(self._snapshot()[2])
+
+    def __len__(self):
+        return len(self._ids)
+
+    # ------------------------
+    # Loading / saving
+    # ------------------------
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, STORE_FILE))
+
+    @classmethod
+    def load(cls, directory: str, embedding: Embeddings, model_name: Optional[str] = None,
+             dim: Optional[int] = None) -> "MmapVectorStore":
+        """`model_name` / `dim`: refuse a store recorded as built by any other model, or of another width."""
+        with open(os.path.join(directory, STORE_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != STORE_FORMAT:
+            raise ValueError(f"unsupported vector store format: {meta.get('format')}")
+        built_with = meta.get("embedding_model")
+        if model_name and built_with and built_with != model_name:
+            raise EmbeddingModelMismatch(f"vector store was built with {built_with}, not {model_name}")
+        if dim and int(meta["dim"]) != dim:
+            raise EmbeddingModelMismatch(f"vector store holds {meta['dim']}-dim vectors, "
+                                         f"{model_name or 'the embedding model'} makes {dim}-dim ones")
+        count, dim, gen = int(meta["count"]), int(meta["dim"]), meta["generation"]
+        docs_path = os.path.join(directory, f"docs-{gen}.sqlite")
+        if count:
+            vectors = np.memmap(os.path.join(directory, f"vectors-{gen}.f32"),
+                                dtype=np.float32, mode="r", shape=(count, dim))
+        else:
+            vectors = np.zeros((0, dim), dtype=np.float32)
+        with sqlite3.connect(f"file:{docs_path}?mode=ro", uri=True) as conn:
+            ids = [row[0] for row in conn.execute("SELECT id FROM chunks ORDER BY pos")]
+        if len(ids) != count:
+            raise ValueError(f"vector store is inconsistent: {len(ids)} docs for {count} vectors")
+        return cls(embedding, vectors, ids, docs_path=docs_path, model_name=meta.get("embedding_model"))
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        gen = uuid.uuid4().hex[:12]
+        vectors_path = os.path.join(directory, f"vectors-{gen}.f32")
+        docs_path = os.path.join(directory, f"docs-{gen}.sqlite")
+
+        vectors, _, ids, _, _ = state = self._snapshot()
+        np.ascontiguousarray(vectors, dtype=np.float32).tofile(vectors_path)
+        docs = self._get_by_ids(state, ids)
+        with sqlite3.connect(docs_path) as conn:
+            conn.execute("CREATE TABLE chunks (pos INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL,"
+                         " text TEXT NOT NULL, metadata TEXT NOT NULL)")
+            conn.executemany(
+                "INSERT INTO chunks (pos, id, text, metadata) VALUES (?, ?, ?, ?)",
+                ((pos, sid, doc.page_content, json.dumps(doc.metadata, default=str))
+                 for pos, (sid, doc) in enumerate(zip(ids, docs))),
+            )
+        conn.close()
+
+        meta_path = os.path.join(directory, STORE_FILE)
+        old_gen = _current_generation(directory)
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "format": STORE_FORMAT,
+                "generation": gen,
+                "previous_generation": old_gen,
+                "count": len(ids),
+                "dim": int(vectors.shape[1]),
+                "metric": "l2",
+                "embedding_model": self.model_name,
+            }, f, indent=1)
+        os.replace(tmp, meta_path)
+        with self._lock:
+            if self._ids is ids:  # not changed while saving
+                self._docs_path = docs_path
+
+        # readers open docs-<gen>.sqlite lazily (per thread and per process),
+        # so the generation they loaded has to outlive this save
+        keep = {gen, old_gen}
+        for name in os.listdir(directory):
+            stem, _, ext = name.rpartition(".")
+            prefix, _, file_gen = stem.partition("-")
+            if (prefix, ext) in (("vectors", "f32"), ("docs", "sqlite")) and file_gen not in keep:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    # ------------------------
+    # VectorStore API
+    # ------------------------
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, **kwargs: Any) -> "MmapVectorStore":
+        vectors = np.asarray(embedding.embed_documents(list(texts)), dtype=np.float32)
+        store = cls(embedding, vectors[:0], [], model_name=kwargs.get("model_name"))
+        store._append(vectors, list(texts), metadatas, ids)
+        return store
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = np.asarray(self.embedding.embed_documents(texts), dtype=np.float32)
+        return self._append(vectors, texts, metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        drop = set(ids)
+        with self._lock:
+            state = self._snapshot()
+            vectors, sq_norms, old_ids, _, _ = state
+            keep = [i for i, sid in enumerate(old_ids) if sid not in drop]
+            kept_ids = [old_ids[i] for i in keep]
+            # pull surviving documents out of the old file before dropping the reference
+            survivors = dict(zip(kept_ids, self._get_by_ids(state, kept_ids)))
+            self._publish(np.asarray(vectors[keep], dtype=np.float32), sq_norms[keep], kept_ids, survivors, None)
+        return True
+
+    def update_metadata(self, metadatas: Dict[str, dict]):
+        """Replace the metadata of existing chunks (text and vectors unchanged)."""
+        with self._lock:
+            vectors, sq_norms, ids, old_docs, docs_path = state = self._snapshot()
+            docs = dict(old_docs)
+            for doc in self._get_by_ids(state, [sid for sid in metadatas if sid in set(ids)]):
+                docs[doc.id] = Document(id=doc.id, page_content=doc.page_content, metadata=dict(metadatas[doc.id]))
+            self._publish(vectors, sq_norms, ids, docs, docs_path)
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        return self._get_by_ids(self._snapshot(), ids)
+
+    def _get_by_ids(self, state, ids: Sequence[str]) -> List[Document]:
+        docs, docs_path = state[3], state[4]
+        missing = [sid for sid in ids if sid not in docs]
+        fetched: Dict[str, Document] = {}
+        if missing and docs_path:
+            conn = self._connection(docs_path)
+            for start in range(0, len(missing), 500):
+                batch = missing[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                for sid, text, metadata in conn.execute(
+                        f"SELECT id, text, metadata FROM chunks WHERE id IN ({marks})", batch):
+                    fetched[sid] = Document(id=sid, page_content=text, metadata=json.loads(metadata))
+        out = []
+        for sid in ids:
+            doc = docs.get(sid) or fetched.get(sid)
+            if doc is not None:
+                out.append(doc)
+        return out
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        vectors, sq_norms, ids, _, _ = state = self._snapshot()
+        if not ids:
+            return []
+        q = np.asarray(embedding, dtype=np.float32)
+        dist = sq_norms - 2.0 * (vectors @ q) + float(q @ q)
+        k = min(k, len(ids))
+        top = np.argpartition(dist, k - 1)[:k]
+        top = top[np.argsort(dist[top], kind="stable")]
+        docs = self._get_by_ids(state, [ids[i] for i in top])
+        return [(doc, float(dist[i])) for doc, i in zip(docs, top)]
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    # ------------------------
+    # Internals
+    # ------------------------
+    def _append(self, vectors: np.ndarray, texts: List[str], metadatas: Optional[List[dict]],
+                ids: Optional[List[str]]) -> List[str]:
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        with self._lock:
+            old_vectors, _, old_ids, old_docs, docs_path = self._snapshot()
+            clash = set(ids) & set(old_ids)
+            if clash:
+                raise ValueError(f"Tried to add ids that already exist: {sorted(clash)[:5]}")
+            metadatas = metadatas or [{} for _ in texts]
+            docs = dict(old_docs)
+            for sid, text, metadata in zip(ids, texts, metadatas):
+                docs[sid] = Document(id=sid, page_content=text, metadata=dict(metadata or {}))
+            vectors = np.concatenate([np.asarray(old_vectors, dtype=np.float32), vectors]) \
+                if len(old_ids) else vectors
+            self._publish(vectors, np.einsum("ij,ij->i", vectors, vectors), old_ids + ids, docs, docs_path)
+        return ids
+
+    def _snapshot(self):
+        """(vectors, sq_norms, ids, docs, docs_path) as of one moment; never mutated afterwards."""
+        with self._lock:
+            return self._vectors, self._sq_norms, self._ids, self._docs, self._docs_path
+
+    def _publish(self, vectors, sq_norms, ids, docs, docs_path):
+        with self._lock:
+            self._vectors, self._sq_norms, self._ids, self._docs, self._docs_path = \
+                vectors, sq_norms, ids, docs, docs_path
+
+    def _connection(self, docs_path: str) -> sqlite3.Connection:
+        # one read-only connection per thread, never reused across a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid() or self._local.wanted != docs_path:
+            path = docs_path if os.path.exists(docs_path) else self._follow_current_generation(docs_path)
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn, self._local.pid, self._local.wanted = conn, os.getpid(), docs_path
+        return conn
+
+    def _follow_current_generation(self, docs_path: str) -> str:
+        """Our generation's docs file was swept by later saves; read documents from the current one."""
+        directory = os.path.dirname(docs_path)
+        gen = _current_generation(directory)
+        if gen is None:
+            return docs_path
+        current = os.path.join(directory, f"docs-{gen}.sqlite")
+        if current != docs_path:
+            print(f"[MmapVectorStore] {os.path.basename(docs_path)} is gone; reading {gen}")
+            with self._lock:
+                if self._docs_path == docs_path:
+                    self._docs_path = current
+        return current
+
+
+def _current_generation(directory: str) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, STORE_FILE), encoding="utf-8") as f:
+            return json.load(f).get("generation")
+    except (OSError, ValueError):
+        return None
+
+
+def convert_faiss_store(directory: str, embedding: Optional[Embeddings] = None,
+                        model_name: Optional[str] = None) -> MmapVectorStore:
+    """
+    One-off conversion of index.faiss + index.pkl in `directory` to the mmap
+    format, keeping docstore ids and index order. `model_name` is the model
+    that built the legacy index, not necessarily the one now configured. This is the only place the
+    legacy pickle is read, and only our own previously written file.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    legacy = FAISS.load_local(directory, embedding, allow_dangerous_deserialization=True)
+    count = legacy.index.ntotal
+    ids = [legacy.index_to_docstore_id[i] for i in range(count)]
+    vectors = legacy.index.reconstruct_n(0, count).astype(np.float32) if count else \
+        np.zeros((0, legacy.index.d), dtype=np.float32)
+    docs = {}
+    for sid in ids:
+        doc = legacy.docstore.search(sid)
+        docs[sid] = Document(id=sid, page_content=doc.page_content, metadata=dict(doc.metadata))
+    store = MmapVectorStore(embedding, vectors, ids, docs=docs, model_name=model_name)
+    store.save(directory)
+    print(f"[MmapVectorStore] converted {count} vector(s) in {directory}")
+    return MmapVectorStore.load(directory, embedding)
@@ -0,0 +1,354 @@
+# cq_manager/chat/model_router.py
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from cq_files.cq_manager.chat import metrics
+
+
+class AttemptFailed(Exception):
+    """One model's request failed; `response` is the canned reply for that failure."""
+
+    def __init__(self, response: str, status: str):
+        super().__init__(status)
+        self.response = response
+        self.status = status
+
+
+def parse_models(spec: str, default_budget: float) -> List[Tuple[str, float]]:
+    """'model-a@6, model-b' -> [("model-a", 6.0), ("model-b", default_budget)]"""
+    models = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, budget = item.rpartition("@")
+        if not sep:
+            name, budget = item, ""
+        models.append((name, float(budget) if budget else default_budget))
+    return models
+
+
+class ModelStats:
+    __slots__ = ("budget", "latency", "error_rate", "requests", "wins", "errors", "timeouts", "cancelled",
+                 "last_used")
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.latency: Optional[float] = None  # EWMA seconds of successful completions
+        self.error_rate = 0.0  # EWMA of failures and timeouts (1) against successes (0)
+        self.requests = 0
+        self.wins = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.last_used = 0.0
+
+
+class _Attempt:
+    __slots__ = ("model", "started", "deadline", "cancel", "parts", "finished")
+
+    def __init__(self, model: str, budget: float):
+        self.model = model
+        self.started = time.monotonic()
+        self.deadline = self.started + budget
+        self.cancel = threading.Event()
+        self.parts: List[str] = []
+        self.finished = False
+
+
+class ModelRouter:
+    """
+    Ordered OpenRouter models with per-model latency budgets, raced by
+    hedging.
+
+    A call starts on the first model of `order()`. If no answer has come
+    back after `hedge_delay` seconds (or the running attempt fails, or
+    passes its model's budget), the next model is started alongside it, up
+    to `max_attempts` models. The first good answer wins and the other
+    attempts are cancelled: the blocking path stops reading their streams
+    and closes the connection, the async path cancels their tasks.
+
+    Every finished attempt feeds the model's EWMA latency and error rate;
+    an attempt cancelled after `hedge_delay` counts its elapsed time as a
+    lower bound on the model's latency. `order()` keeps the configured
+    preference among healthy models, ahead of those slower than
+    `hedge_delay` (each call to one of those pays for a hedge), and moves a
+    model behind them all while its error rate is above `max_error_rate`
+    or its latency above its budget; after `recovery_after` seconds
+    without traffic it is tried first again.
+    """
+
+    def __init__(self, models: Sequence[Tuple[str, float]], hedge_delay: float = 4.0, max_attempts: int = 3,
+                 alpha: float = 0.2, max_error_rate: float = 0.5, recovery_after: float = 60.0,
+                 workers: int = 10, can_hedge: Optional[Callable[[], bool]] = None):
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+        self.models = [name for name, _ in models]
+        self.hedge_delay = hedge_delay
+        self.max_attempts = max(1, max_attempts)
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.recovery_after = recovery_after
+        self.workers = workers
+        # False while upstream capacity is short: hedges are extra load, fallbacks are not
+        self.can_hedge = can_hedge or (lambda: True)
+        self._stats: Dict[str, ModelStats] = {name: ModelStats(budget) for name, budget in models}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+
+    # ------------------------
+    # Ordering and statistics
+    # ------------------------
+    def _healthy(self, s: ModelStats, now: float) -> bool:
+        if s.requests == 0 or now - s.last_used > self.recovery_after:
+            return True
+        return s.error_rate <= self.max_error_rate and (s.latency is None or s.latency <= s.budget)
+
+    def _slow(self, s: ModelStats, now: float) -> bool:
+        """Usually still running when the hedge fires."""
+        if self.hedge_delay <= 0 or s.latency is None or now - s.last_used > self.recovery_after:
+            return False
+        return s.latency > self.hedge_delay
+
+    def order(self) -> List[str]:
+        now = time.monotonic()
+        with self._lock:
+            def key(item):
+                i, name = item
+                s = self._stats[name]
+                if self._healthy(s, now):
+                    return (0, self._slow(s, now), i)
+                return (1, 0, (s.latency or s.budget) / s.budget + s.error_rate)
+            return [name for _, name in sorted(enumerate(self.models), key=key)]
+
+    def primary(self) -> str:
+        return self.order()[0]
+
+    def budget(self, model: str) -> float:
+        return self._stats[model].budget
+
+    def record(self, model: str, outcome: str, seconds: float = 0.0):
+        """
+        `outcome`: "won", "error", "timeout" or "cancelled" (not an error;
+        past hedge_delay its time still raises the latency estimate).
+        """
+        metrics.LLM_MODEL_ATTEMPTS.inc(model, outcome)
+        with self._lock:
+            s = self._stats[model]
+            s.last_used = time.monotonic()
+            if outcome == "cancelled":
+                s.cancelled += 1
+                # it would have taken at least this long; only ever moves the estimate up
+                if seconds > self.hedge_delay > 0 and (s.latency is None or seconds > s.latency):
+                    s.latency = seconds if s.latency is None else s.latency + self.alpha * (seconds - s.latency)
+                return
+            s.requests += 1
+            failed = outcome != "won"
+            s.error_rate += self.alpha * (float(failed) - s.error_rate)
+            if outcome == "won":
+                s.wins += 1
+                s.latency = seconds if s.latency is None else s.latency + self.alpha * (seconds - s.latency)
+            elif outcome == "timeout":
+                s.timeouts += 1
+                # a timed-out attempt took at least its budget
+                s.latency = seconds if s.latency is None else s.latency + self.alpha * (seconds - s.latency)
+            else:
+                s.errors += 1
+
+    def stats(self) -> dict:
+        order = self.order()
+        with self._lock:
+            return {
+                "order": order,
+                "hedge_delay": self.hedge_delay,
+                "max_attempts": self.max_attempts,
+                "models": {
+                    name: {
+                        "budget": s.budget,
+                        "latency_ewma": None if s.latency is None else round(s.latency, 3),
+                        "error_rate_ewma": round(s.error_rate, 3),
+                        "requests": s.requests,
+                        "wins": s.wins,
+                        "errors": s.errors,
+                        "timeouts": s.timeouts,
+                        "cancelled": s.cancelled,
+                    }
+                    for name, s in self._stats.items()
+                },
+            }
+
+    # ------------------------
+    # Blocking calls
+    # ------------------------
+    def complete(self, attempt: Callable[[str, threading.Event], Iterator[str]], timeout_response: str) -> str:
+        """
+        Race `attempt(model, cancel)` generators; returns the first complete
+        non-empty answer, or the canned reply of the last failure.
+        """
+        return "".join(self._race(attempt, timeout_response, streaming=False))
+
+    def stream(self, attempt: Callable[[str, threading.Event], Iterator[str]],
+               timeout_response: str) -> Iterator[str]:
+        """As complete(), but the first attempt to produce text wins and is streamed."""
+        return self._race(attempt, timeout_response, streaming=True)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # worker threads do not survive fork: a preloaded app starts its own per worker
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="llm-hedge")
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _launch(self, model: str, attempt, events: queue.Queue) -> _Attempt:
+        a = _Attempt(model, self.budget(model))
+
+        def drive():
+            try:
+                for piece in attempt(model, a.cancel):
+                    if a.cancel.is_set():
+                        return
+                    events.put((a, "text", piece))
+                events.put((a, "done", None))
+            except AttemptFailed as e:
+                events.put((a, "failed", e))
+            except Exception as e:
+                print(f"[ModelRouter] {model} attempt error: {e}")
+                events.put((a, "failed", AttemptFailed("", "error")))
+
+        # the caller's turn trace counts every attempt as an LLM call
+        self._pool().submit(contextvars.copy_context().run, drive)
+        return a
+
+    def _race(self, attempt, timeout_response: str, streaming: bool) -> Iterator[str]:
+        waiting = self.order()[:self.max_attempts]
+        events: queue.Queue = queue.Queue()
+        running: List[_Attempt] = []
+        next_hedge = time.monotonic()
+        last_failure = timeout_response
+        winner: Optional[_Attempt] = None
+        try:
+            while winner is None:
+                now = time.monotonic()
+                for a in [a for a in running if now >= a.deadline]:
+                    self._finish(a, running, "timeout", now)
+                    last_failure = timeout_response
+                if waiting and now >= next_hedge and running and not self.can_hedge():
+                    next_hedge = now + self.hedge_delay
+                elif waiting and (not running or now >= next_hedge):
+                    running.append(self._launch(waiting.pop(0), attempt, events))
+                    next_hedge = now + self.hedge_delay if self.hedge_delay > 0 else float("inf")
+                    continue
+                if not running:
+                    yield last_failure
+                    return
+                wake = min([a.deadline for a in running] + ([next_hedge] if waiting else []))
+                try:
+                    a, kind, payload = events.get(timeout=max(0.0, wake - now))
+                except queue.Empty:
+                    continue
+                if a.finished:
+                    continue  # late event from an attempt already given up on
+                if kind == "text":
+                    a.parts.append(payload)
+                    if streaming:
+                        winner = a
+                elif kind == "done" and "".join(a.parts).strip():
+                    winner = a
+                    self._finish(a, running, "won", time.monotonic())
+                else:
+                    self._finish(a, running, "error", time.monotonic())
+                    if kind == "failed":
+                        last_failure = payload.response or last_failure
+                    next_hedge = time.monotonic()  # fall back to the next model now
+
+            for a in list(running):
+                if a is not winner:
+                    self._finish(a, running, "cancelled", time.monotonic())
+            if not streaming:
+                yield "".join(winner.parts)
+                return
+            yield from winner.parts
+            while not winner.finished:
+                a, kind, payload = events.get()
+                if a is not winner:
+                    continue
+                if kind == "text":
+                    yield payload
+                else:
+                    # a stream cut off midway keeps what was already sent
+                    self._finish(winner, running, "won" if kind == "done" else "error", time.monotonic())
+        finally:
+            # the consumer stopped early (or an error escaped): stop everything still running
+            for a in list(running):
+                self._finish(a, running, "cancelled", time.monotonic())
+
+    def _finish(self, a: _Attempt, running: List[_Attempt], outcome: str, now: float):
+        if a.finished:
+            return
+        a.finished = True
+        if outcome != "won":
+            a.cancel.set()
+        if a in running:
+            running.remove(a)
+        self.record(a.model, outcome, now - a.started)
+
+    # ------------------------
+    # Async calls
+    # ------------------------
+    async def acomplete(self, attempt: Callable[[str], Awaitable[str]], timeout_response: str) -> str:
+        """Event-loop counterpart of complete(): `attempt(model)` returns the text or raises AttemptFailed."""
+        loop = asyncio.get_running_loop()
+        waiting = self.order()[:self.max_attempts]
+        tasks: Dict[asyncio.Future, Tuple[str, float]] = {}
+        next_hedge = loop.time()
+        last_failure = timeout_response
+        try:
+            while True:
+                now = loop.time()
+                for task, (model, started) in list(tasks.items()):
+                    if now >= started + self.budget(model):
+                        task.cancel()
+                        del tasks[task]
+                        self.record(model, "timeout", now - started)
+                        last_failure = timeout_response
+                if waiting and now >= next_hedge and tasks and not self.can_hedge():
+                    next_hedge = now + self.hedge_delay
+                elif waiting and (not tasks or now >= next_hedge):
+                    model = waiting.pop(0)
+                    tasks[asyncio.ensure_future(attempt(model))] = (model, now)
+                    next_hedge = now + self.hedge_delay if self.hedge_delay > 0 else float("inf")
+                    continue
+                if not tasks:
+                    return last_failure
+                wake = min([started + self.budget(model) for model, started in tasks.values()]
+                           + ([next_hedge] if waiting else []))
+                done, _ = await asyncio.wait(list(tasks), timeout=max(0.0, wake - now),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    model, started = tasks.pop(task)
+                    try:
+                        text = task.result()
+                    except AttemptFailed as e:
+                        text = ""
+                        last_failure = e.response or last_failure
+                    except Exception as e:
+                        print(f"[ModelRouter] {model} attempt error: {e}")
+                        text = ""
+                    if text.strip():
+                        self.record(model, "won", loop.time() - started)
+                        return text
+                    self.record(model, "error", loop.time() - started)
+                    next_hedge = loop.time()  # fall back to the next model now
+        finally:
+            for task, (model, started) in tasks.items():
+                task.cancel()
+                self.record(model, "cancelled", loop.time() - started)
@@ -1,37 +1,89 @@
 # cq_manager/chat/processor.py
-import os
 import re
+import time
 import uuid
-from typing import Tuple
+from typing import Iterator, Optional, Tuple
 
 from langchain.prompts import PromptTemplate
 from langchain.chains import RetrievalQA
 
-from cq_files.cq_manager.chat.document_processor import DocumentProcessor
-from cq_files.cq_manager.chat.llm_handler import LLMHandler
+from cq_files.cq_manager.chat import metrics
+from cq_files.cq_manager.chat.context_builder import ContextRetriever
+from cq_files.cq_manager.chat.kb_tables import waste_type_key
+from cq_files.cq_manager.chat.llm_handler import FALLBACK_RESPONSES
+from cq_files.cq_manager.chat.resources import ResourceRegistry, get_registry
+from cq_files.cq_manager.chat.response_cleaner import ResponseCleaner, clean_response
+from cq_files.cq_manager.chat.session_memory import format_history
 from cq_files.cq_manager.config import Config
 
+ERROR_RESPONSE = "I encountered an error. Please try again with your waste management question."
+GREETING_RESPONSE = "Hello! How can I help with waste management today?"
+THANKS_RESPONSE = "Thank you! Any other waste management questions?"
+FEEDBACK_RESPONSE = "Thank you for your feedback! Any other waste management questions?"
+COMPLAINT_FALLBACK_RESPONSE = (
+    "I’m sorry about this issue. I don’t have a specific fix in my KB. "
+    "If you share your contact details, our waste team will reach out to resolve it."
+)
+OFF_TOPIC_RESPONSE = (
+    "I’m designed for waste management. Please ask about waste disposal, recycling, "
+    "collection schedules, or sustainability."
+)
+
+
+class ResponsePlan:
+    """
+    What process_message decided to do with a message: reply with fixed
+    `text`, send `prompt` to the LLM, or run the default RAG chain. `branch`
+    names the decision. Executing the plan is separate so the same routing
+    serves the blocking and the streaming paths.
+    """
+
+    __slots__ = ("branch", "text", "prompt", "rag")
+
+    def __init__(self, branch: str, text: str = None, prompt: str = None, rag: bool = False):
+        self.branch = branch
+        self.text = text
+        self.prompt = prompt
+        self.rag = rag
+
 
 class ChatProcessor:
-    def __init__(self):
-        self.doc_processor = DocumentProcessor(
-            knowledge_base_path=os.getenv(
-                "KNOWLEDGE_BASE_PATH", Config.KNOWLEDGE_BASE_PATH
-            ),
-            vector_store_path=os.getenv("VECTOR_STORE_PATH", Config.VECTOR_STORE_PATH),
-        )
-        self.llm_handler = LLMHandler()
+    def __init__(self, resources: ResourceRegistry = None):
+        self.resources = resources or get_registry()
+        self.doc_processor = self.resources.get("doc_processor")
+        self.llm_handler = self.resources.get("llm_handler")
+        self.embeddings = self.resources.get("embeddings")
+        self.answer_cache = self.resources.get("answer_cache")
+        self.rules = self.resources.get("rules")
+        self.kb_tables = self.resources.get("kb_tables")
+        self.faq_index = self.resources.get("faq_index")
+        self.memory = self.resources.get("session_memory")
+        self.context_builder = self.resources.get("context_builder")
         self.vector_store = self.initialize_vector_store()
+        self.retriever = self.resources.get("retriever")
         self.qa_chain = self.setup_qa_chain()
+        self.resources.subscribe("vector_store", self._on_vector_store_changed)
+        self.resources.subscribe("retriever", self._on_retriever_changed)
+        self.resources.subscribe("kb_tables", self._on_kb_tables_changed)
+        self.resources.subscribe("faq_index", self._on_faq_index_changed)
 
     def initialize_vector_store(self):
-        vs = self.doc_processor.load_vector_store()
-        if not vs:
-            print("Vector store missing; creating a new one...")
-            vs = self.doc_processor.process_and_store()
-        else:
-            print("Vector store loaded")
-        return vs
+        # shared with SuggestionsGenerator through the resource registry
+        return self.resources.get("vector_store")
+
+    def _on_vector_store_changed(self, vector_store):
+        self.vector_store = vector_store
+
+    def _on_retriever_changed(self, retriever):
+        # follows every vector store change (see _build_retriever)
+        self.retriever = retriever
+        self.qa_chain = self.setup_qa_chain()
+
+    def _on_kb_tables_changed(self, kb_tables):
+        self.kb_tables = kb_tables
+
+    def _on_faq_index_changed(self, faq_index):
+        self.faq_index = faq_index
 
     def setup_qa_chain(self):
         prompt_template = """You are a waste management assistant.
@@ -54,18 +106,29 @@ class ChatProcessor:
         PROMPT = PromptTemplate(
             template=prompt_template, input_variables=["context", "question"]
         )
+        self.qa_prompt = PROMPT  # reused by the streaming RAG path
+        # the chain "stuffs" whatever the retriever returns, so merging, dedup
+        # and the token budget happen in the retriever (chat/context_builder.py)
+        retriever = ContextRetriever(base=self.retriever, builder=self.context_builder,
+                                     prompt="rag", pool_k=Config.RETRIEVAL_K)
         return RetrievalQA.from_chain_type(
             llm=self.llm_handler.llm,
             chain_type="stuff",
-            retriever=self.vector_store.as_retriever(search_kwargs={"k": 3}),
+            retriever=retriever,
             chain_type_kwargs={"prompt": PROMPT},
         )
 
     # ------------------------
     # Heuristic + LLM Intents
     # ------------------------
-    def classify_intent(self, message: str, session_id: str) -> Tuple[str, float]:
-        # quick heuristic first
+    @metrics.timed("chat", "intent")
+    def classify_intent(self, message: str, session_id: str, vector=None) -> Tuple[str, float]:
+        intent = self._local_intent(message, vector) or self._classify_intent_llm(message)
+        metrics.set_intent(*intent)
+        return intent
+
+    def _local_intent(self, message: str, vector=None) -> Optional[Tuple[str, float]]:
+        """Keyword heuristics, then the local classifier; None when only the LLM can decide."""
         if self._is_greeting(message):
             return "Greetings", 0.9
         if self._is_thanks(message):
@@ -75,7 +138,25 @@ class ChatProcessor:
         if self._is_schedule_query(message):
             return "Waste Collection Schedules", 0.8
 
-        prompt = f"""
+        prediction = self._predict_intent(message, vector)
+        if prediction and prediction.confidence >= Config.INTENT_CONFIDENCE_THRESHOLD:
+            return prediction.intent, prediction.confidence
+        return None
+
+    def _predict_intent(self, message: str, vector=None):
+        classifier = self.resources.get("intent_classifier")
+        if classifier is None:
+            return None
+        try:
+            if vector is None:
+                vector = self.embeddings.embed_query(message)
+            return classifier.predict(vector)
+        except Exception as e:
+            print(f"Intent classifier error: {e}")
+            return None
+
+    def _intent_prompt(self, message: str) -> str:
+        return f"""
                  Classify this message into EXACTLY one category:
                  - Complaints
                  - Feedback
@@ -89,18 +170,22 @@ class ChatProcessor:
                 
                  Return JSON: {{"intent":"<one of above>","confidence":<0..1>}}
                  """
+
+    def _parse_intent(self, raw: str) -> Tuple[str, float]:
+        # naive parse
+        intent = "Unknown"
+        conf = 0.6
+        m = re.search(r'"intent"\s*:\s*"([^"]+)"', raw)
+        if m:
+            intent = m.group(1)
+        m2 = re.search(r'"confidence"\s*:\s*([0-9]*\.?[0-9]+)', raw)
+        if m2:
+            conf = float(m2.group(1))
+        return intent, conf
+
+    def _classify_intent_llm(self, message: str) -> Tuple[str, float]:
         try:
-            raw = self.llm_handler.generate_response(prompt)
-            # naive parse
-            intent = "Unknown"
-            conf = 0.6
-            m = re.search(r'"intent"\s*:\s*"([^"]+)"', raw)
-            if m:
-                intent = m.group(1)
-            m2 = re.search(r'"confidence"\s*:\s*([0-9]*\.?[0-9]+)', raw)
-            if m2:
-                conf = float(m2.group(1))
-            return intent, conf
+            return self._parse_intent(self.llm_handler.generate_response(self._intent_prompt(message)))
         except Exception:
             return "Unknown", 0.5
 
@@ -108,26 +193,8 @@ class ChatProcessor:
     # Pipeline helpers
     # ------------------------
     def _clean_response(self, response: str) -> str:
-        if isinstance(response, str):
-            s = response.strip()
-            if (s.startswith('"') and s.endswith('"')) or (s.startswith("'") and s.endswith("'")):
-                response = s[1:-1]
-        for prefix in [
-            "Answer: ",
-            "Response: ",
-            "Based on the information,",
-            "According to the information,",
-        ]:
-            if response.strip().startswith(prefix):
-                response = response[len(prefix):].strip()
-
-        response = re.sub(r'(\*{1,2}|_{1,2}|-{3,}|#{1,6}\s)', '', response)
-        response = re.sub(r'^\d+\.\s*|\•\s*|\-\s*', '', response, flags=re.MULTILINE)
-        response = re.sub(r'^[\'"]+|[\'"]+$', '', response, flags=re.MULTILINE)
-        response = ' '.join(response.split())
-        if response:
-            response = response[0].upper() + response[1:]
-        return response
+        # same rules as the streaming path; see chat/response_cleaner.py
+        return clean_response(response)
 
     def _check_relevance(self, query, document_content):
         query_terms = set(re.findall(r'\b\w{3,}\b', query.lower()))
@@ -137,15 +204,26 @@ class ChatProcessor:
         important_overlap = overlap.intersection(waste_keywords)
         return len(overlap) >= 2 or len(important_overlap) >= 1
 
+    def _completion_prompt(self, response, message):
+        return f"""
+                Original question: "{message}"
+                Incomplete response: "{response}"
+                Finish the response in 1 short sentence, without repeating.
+                """
+
+    def _enhance_prompt(self, response, message):
+        return f"""
+                User asked: "{message}"
+                Initial answer: "{response}"
+                Improve briefly (still concise and helpful).
+                """
+
     def _validate_response_completeness(self, response, message):
         if not response.strip().endswith((".", "!", "?")):
-            completion_prompt = f"""
-                                Original question: "{message}"
-                                Incomplete response: "{response}"
-                                Finish the response in 1 short sentence, without repeating.
-                                """
+            completion_prompt = self._completion_prompt(response, message)
             try:
-                completion = self.llm_handler.generate_response(completion_prompt)
+                with metrics.timed("chat", "completion"):
+                    completion = self.llm_handler.generate_response(completion_prompt)
                 return self._clean_response(f"{response} {completion}")
             except Exception:
                 return response
@@ -154,175 +232,452 @@ class ChatProcessor:
     # ------------------------
     # Slot helpers
     # ------------------------
+    @metrics.timed("chat", "retrieval_schedule")
     def get_schedule_from_knowledge_base(self, waste_type=None):
         query = "waste collection schedule"
         if waste_type:
             query = f"{waste_type} waste collection schedule"
-        docs = self.vector_store.similarity_search(query, k=5)
+        docs = self.retriever.search(query, k=Config.SLOT_RETRIEVAL_K)
         out = []
         for d in docs:
             if "collection" in d.page_content.lower() and "schedule" in d.page_content.lower():
-                out.append(d.page_content)
-        return "\n".join(out)
+                out.append(d)
+        return self.context_builder.build_text(out, "slot", separator="\n")
 
+    @metrics.timed("chat", "retrieval_contact")
     def get_contact_details_from_knowledge_base(self):
-        docs = self.vector_store.similarity_search("municipal council contact details", k=5)
+        docs = self.retriever.search("municipal council contact details", k=Config.SLOT_RETRIEVAL_K)
         out = []
         for d in docs:
             if any(k in d.page_content.lower() for k in ["contact", "phone", "email", "address"]):
-                out.append(d.page_content)
-        return "\n".join(out)
+                out.append(d)
+        return self.context_builder.build_text(out, "slot", separator="\n")
 
     # ------------------------
     # Lightweight classifiers
     # ------------------------
+    # One compiled pass per message (chat/rules.py, data/rules/keywords.json)
     def _is_schedule_query(self, message):
-        kws = ["schedule", "collection", "pickup", "pick up", "collect",
-               "garbage day", "trash day", "when", "what day", "what time",
-               "organic waste", "inorganic waste", "e-waste"]
-        return any(k in message.lower() for k in kws)
+        return self.rules.match(message).schedule
 
     def _is_greeting(self, message):
-        greetings = ['hello', 'hi', 'hey', 'greetings', 'howdy',
-                     'good morning', 'good afternoon', 'good evening']
-        return any(g in message.lower() for g in greetings) and len(message.split()) < 5
+        return self.rules.match(message).greeting
 
     def _is_feedback(self, message):
-        kws = ['feedback', 'suggestion', 'improve', 'better', 'thanks',
-               'thank you', 'grateful', 'appreciate', 'good job', 'well done',
-               'helpful', 'service', 'experience']
-        return any(k in message.lower() for k in kws)
+        return self.rules.match(message).feedback
 
     def _is_thanks(self, message):
-        kws = ['thanks', 'thank you', 'appreciated', 'grateful', 'appreciate', 'valuable']
-        return any(k in message.lower() for k in kws) and len(message.split()) < 7
+        return self.rules.match(message).thanks
 
     def _is_complaint(self, message):
-        kws = ['complaint', 'issue', 'problem', 'not working', 'broken', 'failed', 'poor',
-               'missed', 'miss', 'disappointed', 'unhappy', 'dissatisfied', 'bad',
-               'terrible', 'horrible', "didn't collect", "didn't pick up", 'skipped', 'forgot']
-        return any(k in message.lower() for k in kws)
+        return self.rules.match(message).complaint
 
     def _is_contact_request(self, message):
-        contact_k = ['contact', 'details', 'phone', 'number', 'email', 'address', 'website', 'office']
-        municipal_k = ['municipal', 'council', 'office', 'city', 'town', 'local']
-        return any(k in message.lower() for k in contact_k) and any(k in message.lower() for k in municipal_k)
+        return self.rules.match(message).contact_request
+
+    # ------------------------
+    # Answer cache
+    # ------------------------
+    def _cache_scope(self, message: str, vector=None):
+        """Intent bucket for the answer cache; None for instant replies not worth caching."""
+        if self._is_greeting(message) or self._is_thanks(message):
+            return None
+        if self._is_contact_request(message):
+            return "Contact"
+        if self._is_complaint(message):
+            return "Complaints"
+        if self._is_schedule_query(message):
+            return "Waste Collection Schedules"
+        prediction = self._predict_intent(message, vector) if vector is not None else None
+        if prediction and prediction.confidence >= Config.INTENT_CONFIDENCE_THRESHOLD:
+            return prediction.intent
+        return "General"
+
+    def _is_cacheable(self, response: str) -> bool:
+        if not response or response == ERROR_RESPONSE:
+            return False
+        return not any(f in response for f in FALLBACK_RESPONSES)
 
     # ------------------------
     # Main handler
     # ------------------------
+    @metrics.timed("chat", "embed")
+    def _turn_vector(self, message: str):
+        """One query embedding per turn, shared by the answer cache and the intent classifier."""
+        if self._is_greeting(message) or self._is_thanks(message):
+            return None
+        try:
+            return self.embeddings.embed_query(message)
+        except Exception as e:
+            print(f"Query embedding error: {e}")
+            return None
+
+    @metrics.timed("chat", "cache_lookup")
+    def _cache_lookup(self, message: str, vector) -> Tuple[Optional[str], Optional[str]]:
+        """Returns (scope, cached answer or None); scope None means don't cache."""
+        if vector is None or not self.answer_cache.enabled:
+            return None, None
+        scope = self._cache_scope(message, vector)
+        if not scope:
+            return None, None
+        cached = self.answer_cache.lookup(scope, vector, message)
+        if cached is not None:
+            metrics.set_branch("cache_hit")
+        return scope, cached
+
+    @metrics.timed("chat", "table")
+    def _table_plan(self, message: str) -> Optional[ResponsePlan]:
+        """
+        Schedule and contact questions answered straight from the tables
+        extracted at index time (chat/kb_tables.py): no embedding, no LLM.
+        None when the message isn't one of those or the table has no entry.
+        """
+        flags = self.rules.match(message)
+        if flags.complaint or flags.greeting or flags.thanks or self.kb_tables is None:
+            return None
+        plan = None
+        if flags.contact_request:
+            text = self.kb_tables.contact_answer(message)
+            if text:
+                plan = ResponsePlan("contact_table", text=text)
+        elif flags.collection_time:
+            text = self.kb_tables.schedule_answer(message)
+            if text:
+                plan = ResponsePlan("schedule_table", text=text)
+        if plan is not None:
+            metrics.set_branch(plan.branch)
+        return plan
+
+    @metrics.timed("chat", "faq")
+    def _faq_plan(self, message: str, vector) -> Optional[ResponsePlan]:
+        """A curated KB answer when the question matches one closely enough."""
+        if self.faq_index is None or vector is None:
+            return None
+        if self.rules.match(message).complaint:
+            return None
+        found = self.faq_index.match(vector, message)
+        if found is None:
+            return None
+        metrics.set_branch("faq")
+        return ResponsePlan("faq", text=found.answer)
+
+    @metrics.timed("chat", "memory")
+    def _with_history(self, message: str, session_id: str = None) -> Tuple[str, str]:
+        """
+        (routing query, history block) for this turn. A short message that
+        opens like a follow-up ("and for glass?", "what about plastic?") is
+        routed together with the previous question and answered by the LLM
+        with the recent turns folded into the prompt; the table, FAQ and
+        answer-cache shortcuts never see the merged text. Any other message
+        is handled on its own, exactly as without memory.
+        """
+        flags = self.rules.match(message)
+        if not flags.followup or flags.greeting or flags.thanks:
+            return message, ""
+        turns = self.memory.history(session_id)
+        if not turns:
+            return message, ""
+        return f"{turns[-1].user} {message}", format_history(turns, Config.SESSION_HISTORY_TOKENS)
+
     def process_message(self, message: str, session_id: str = None) -> str:
+        trace = metrics.start_turn()
         try:
-            session_id = session_id or str(uuid.uuid4())
-            intent, confidence = self.classify_intent(message, session_id)
-
-            if self._is_contact_request(message):
-                info = self.get_contact_details_from_knowledge_base()
-                if info:
-                    prompt = f"""
-                             User asked: "{message}"
-                             Contact information from knowledge base:
-                             {info}
-                            
-                             Provide a clear answer. If they asked email only, give only that. Do NOT hyperlink emails.
-                             """
-                    return self._clean_response(self.llm_handler.generate_response(prompt))
-
-            if self._is_greeting(message) and len(message.split()) < 5:
-                return "Hello! How can I help with waste management today?"
-
-            if self._is_thanks(message):
-                return "Thank you! Any other waste management questions?"
-
-            if intent == "Feedback" and self._is_feedback(message):
-                return "Thank you for your feedback! Any other waste management questions?"
-
-            if intent == "Complaints" or self._is_complaint(message):
-                if any(w in message.lower() for w in ['miss', 'missed', "didn't collect", 'skipped', 'forgot']):
-                    complaint_prompt = f"""
-                                        Complaint about missed collection: "{message}"
-                                        Write 20–60 words that:
-                                        1) Apologize
-                                        2) Say it's reported to the collection team
-                                        3) Assure pickup next scheduled day or sooner
-                                        4) Keep professional, empathetic tone
-                                        """
-                    return self._clean_response(self.llm_handler.generate_response(complaint_prompt))
-
-                # try to find KB-backed solution
-                docs = self.vector_store.similarity_search(message, k=5)
-                for d in docs:
-                    if any(w in d.page_content.lower() for w in ["solution", "resolve", "fix", "address"]):
-                        sol_prompt = f"""
-                                     Complaint: "{message}"
-                                     Relevant info:
-                                     {d.page_content}
-                                    
-                                     Write 20–60 words:
-                                     - Acknowledge with empathy
-                                     - Provide solution ONLY from the info above
-                                     - Brief apology
-                                     - Professional tone
-                                     """
-                        return self._clean_response(self.llm_handler.generate_response(sol_prompt))
-
-                return ("I’m sorry about this issue. I don’t have a specific fix in my KB. "
-                        "If you share your contact details, our waste team will reach out to resolve it.")
-
-            # Non-waste queries guard
-            if not self.is_waste_management_related(message):
-                return ("I’m designed for waste management. Please ask about waste disposal, recycling, "
-                        "collection schedules, or sustainability.")
-
-            # Schedule shortcut
-            if intent == "Waste Collection Schedules" or self._is_schedule_query(message):
-                wtype = None
-                ml = message.lower()
-                if "organic" in ml: wtype = "organic"
-                elif "inorganic" in ml: wtype = "inorganic"
-                elif "e-waste" in ml or "electronic" in ml: wtype = "e-waste"
-
-                info = self.get_schedule_from_knowledge_base(wtype)
-                if info:
-                    prompt = f"""
-                             User asked: "{message}"
-                             Schedule info:
-                             {info}
-                            
-                             Answer ONLY with concrete day/time if present. Keep it clear.
-                             """
-                    return self._clean_response(self.llm_handler.generate_response(prompt))
-
-            # Default RAG
-            response = self.qa_chain.run(message)
-            if len(response.split()) < 10:
-                enhance = f"""
-                          User asked: "{message}"
-                          Initial answer: "{response}"
-                          Improve briefly (still concise and helpful).
-                          """
-                response = self.llm_handler.generate_response(enhance)
-
-            response = self._clean_response(response)
-            response = self._validate_response_completeness(response, message)
+            query, history = self._with_history(message, session_id)
+            response = self._respond(query, session_id, history)
+            self._remember(session_id, message, response)
             return response
+        finally:
+            metrics.finish_turn(trace, Config.SLOW_TURN_SECONDS)
+
+    def _remember(self, session_id: str, message: str, response: str):
+        if response and response != ERROR_RESPONSE:
+            self.memory.append(session_id, message, response)
+
+    def _respond(self, message: str, session_id: str = None, history: str = "") -> str:
+        # follow-ups depend on the conversation, so they bypass the tables, FAQ and answer cache
+        plan = None if history else self._table_plan(message)
+        if plan is not None:
+            return plan.text
+
+        vector = self._turn_vector(message)
+        plan = None if history else self._faq_plan(message, vector)
+        if plan is not None:
+            return plan.text
+        scope, cached = (None, None) if history else self._cache_lookup(message, vector)
+        if cached is not None:
+            return cached
+
+        response = self._process_message(message, session_id, vector, history)
+        if scope and self._is_cacheable(response):
+            self.answer_cache.store(scope, vector, message, response)
+        return response
 
+    def _process_message(self, message: str, session_id: str = None, vector=None, history: str = "") -> str:
+        try:
+            plan = self._plan_response(message, session_id, vector)
+            metrics.set_branch(plan.branch)
+            return self._execute_plan(plan, message, history)
         except Exception as e:
+            metrics.set_branch("error")
             print(f"process_message error: {e}")
-            return "I encountered an error. Please try again with your waste management question."
+            return ERROR_RESPONSE
 
-    def is_waste_management_related(self, message: str) -> bool:
-        # quick exits
-        if self._is_feedback(message) or self._is_greeting(message) or self._is_thanks(message) or self._is_complaint(message):
-            return True
+    def _plan_response(self, message: str, session_id: str = None, vector=None) -> ResponsePlan:
+        session_id = session_id or str(uuid.uuid4())
+        intent, confidence = self.classify_intent(message, session_id, vector)
+
+        if self._is_contact_request(message):
+            info = self.get_contact_details_from_knowledge_base()
+            if info:
+                return ResponsePlan("contact", prompt=self._contact_prompt(message, info))
+
+        if self._is_greeting(message) and len(message.split()) < 5:
+            return ResponsePlan("greeting", text=GREETING_RESPONSE)
+
+        if self._is_thanks(message):
+            return ResponsePlan("thanks", text=THANKS_RESPONSE)
+
+        if intent == "Feedback" and self._is_feedback(message):
+            return ResponsePlan("feedback", text=FEEDBACK_RESPONSE)
+
+        if intent == "Complaints" or self._is_complaint(message):
+            if self._is_missed_collection(message):
+                return ResponsePlan("complaint_missed", prompt=self._missed_collection_prompt(message))
+
+            # try to find KB-backed solution
+            solution = self._find_complaint_solution(message)
+            if solution:
+                return ResponsePlan("complaint_kb", prompt=self._complaint_solution_prompt(message, solution))
+
+            return ResponsePlan("complaint_fallback", text=COMPLAINT_FALLBACK_RESPONSE)
+
+        # Non-waste queries guard
+        if not self.is_waste_management_related(message, vector):
+            return ResponsePlan("off_topic", text=OFF_TOPIC_RESPONSE)
+
+        # Schedule shortcut
+        if intent == "Waste Collection Schedules" or self._is_schedule_query(message):
+            info = self.get_schedule_from_knowledge_base(self._waste_type(message))
+            if info:
+                return ResponsePlan("schedule", prompt=self._schedule_prompt(message, info))
+
+        # Default RAG
+        return ResponsePlan("rag", rag=True)
+
+    # Branch helpers shared with the async pipeline (chat/async_processor.py)
+    def _is_missed_collection(self, message: str) -> bool:
+        return self.rules.match(message).missed_collection
 
-        classification_prompt = f"""
-                                Is this about waste management / sustainability? 
-                                Message: "{message}"
-                                Respond ONLY YES or NO.
-                                """
+    @metrics.timed("chat", "retrieval_complaint")
+    def _find_complaint_solution(self, message: str) -> Optional[str]:
+        docs = self.retriever.search(message, k=Config.SLOT_RETRIEVAL_K)
+        for d in docs:
+            if any(w in d.page_content.lower() for w in ["solution", "resolve", "fix", "address"]):
+                return d.page_content
+        return None
+
+    def _waste_type(self, message: str) -> Optional[str]:
+        return waste_type_key(message)
+
+    def _contact_prompt(self, message: str, info: str) -> str:
+        return f"""
+                User asked: "{message}"
+                Contact information from knowledge base:
+                {info}
+               
+                Provide a clear answer. If they asked email only, give only that. Do NOT hyperlink emails.
+                """
+
+    def _missed_collection_prompt(self, message: str) -> str:
+        return f"""
+                Complaint about missed collection: "{message}"
+                Write 20–60 words that:
+                1) Apologize
+                2) Say it's reported to the collection team
+                3) Assure pickup next scheduled day or sooner
+                4) Keep professional, empathetic tone
+                """
+
+    def _complaint_solution_prompt(self, message: str, solution: str) -> str:
+        return f"""
+                Complaint: "{message}"
+                Relevant info:
+                {solution}
+               
+                Write 20–60 words:
+                - Acknowledge with empathy
+                - Provide solution ONLY from the info above
+                - Brief apology
+                - Professional tone
+                """
+
+    def _schedule_prompt(self, message: str, info: str) -> str:
+        return f"""
+                User asked: "{message}"
+                Schedule info:
+                {info}
+               
+                Answer ONLY with concrete day/time if present. Keep it clear.
+                """
+
+    def _execute_plan(self, plan: ResponsePlan, message: str, history: str = "") -> str:
+        if plan.text is not None:
+            return plan.text
+        if plan.prompt is not None:
+            with metrics.timed("chat", "llm_prompt"):
+                response = self.llm_handler.generate_response(history + plan.prompt)
+            return self._clean_response(response)
+
+        if history:
+            prompt = self._rag_prompt(message, history)
+            with metrics.timed("chat", "qa_chain"):
+                response = self.llm_handler.generate_response(prompt)
+        else:
+            with metrics.timed("chat", "qa_chain"):
+                response = self.qa_chain.run(message)
+        if len(response.split()) < 10:
+            with metrics.timed("chat", "enhance"):
+                response = self.llm_handler.generate_response(self._enhance_prompt(response, message))
+
+        response = self._clean_response(response)
+        response = self._validate_response_completeness(response, message)
+        return response
+
+    # ------------------------
+    # Streaming
+    # ------------------------
+    def stream_message(self, message: str, session_id: str = None) -> Iterator[str]:
+        """
+        Same routing as process_message, but yields the answer in pieces as the
+        LLM produces them. Fixed replies and cache hits arrive as one piece.
+        """
+        trace = metrics.start_turn()
         try:
-            resp = self.llm_handler.generate_response(classification_prompt).strip().upper()
+            query, history = self._with_history(message, session_id)
+            parts = []
+            for piece in self._stream_respond(query, session_id, history):
+                if not parts:
+                    metrics.observe_stage("chat", "first_piece", time.perf_counter() - trace.started)
+                parts.append(piece)
+                yield piece
+            self._remember(session_id, message, "".join(parts))
+        finally:
+            metrics.finish_turn(trace, Config.SLOW_TURN_SECONDS)
+
+    def _stream_respond(self, message: str, session_id: str = None, history: str = "") -> Iterator[str]:
+        plan = None if history else self._table_plan(message)
+        if plan is not None:
+            yield plan.text
+            return
+
+        vector = self._turn_vector(message)
+        plan = None if history else self._faq_plan(message, vector)
+        if plan is not None:
+            yield plan.text
+            return
+        scope, cached = (None, None) if history else self._cache_lookup(message, vector)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        try:
+            plan = self._plan_response(message, session_id, vector)
+            metrics.set_branch(plan.branch)
+            if plan.text is not None:
+                parts.append(plan.text)
+                yield plan.text
+            elif plan.prompt is not None:
+                for piece in self._stream_clean(self.llm_handler.stream_response(history + plan.prompt)):
+                    parts.append(piece)
+                    yield piece
+            else:
+                for piece in self._stream_rag(message, history):
+                    parts.append(piece)
+                    yield piece
+        except Exception as e:
+            metrics.set_branch("error")
+            print(f"stream_message error: {e}")
+            if not parts:
+                parts.append(ERROR_RESPONSE)
+                yield ERROR_RESPONSE
+            return
+
+        response = "".join(parts)
+        if scope and self._is_cacheable(response):
+            self.answer_cache.store(scope, vector, message, response)
+
+    def _stream_clean(self, tokens, cleaner: ResponseCleaner = None) -> Iterator[str]:
+        cleaner = cleaner or ResponseCleaner()
+        for token in tokens:
+            piece = cleaner.feed(token)
+            if piece:
+                yield piece
+        tail = cleaner.finish()
+        if tail:
+            yield tail
+
+    @metrics.timed("chat", "rag_retrieval")
+    def _rag_prompt(self, message: str, history: str = "") -> str:
+        """The RetrievalQA prompt built by hand, so a history block can go in front."""
+        docs = self.qa_chain.retriever.invoke(message)
+        context = "\n\n".join(d.page_content for d in docs)
+        return history + self.qa_prompt.format(context=context, question=message)
+
+    def _stream_rag(self, message: str, history: str = "") -> Iterator[str]:
+        tokens = self.llm_handler.stream_response(self._rag_prompt(message, history))
+
+        # Hold output until 10 words are in: shorter answers get the
+        # "enhance" rewrite instead, as in the blocking path.
+        raw = ""
+        for token in tokens:
+            raw += token
+            if len(raw.split()) >= 10:
+                break
+        else:
+            tokens = self.llm_handler.stream_response(self._enhance_prompt(raw, message))
+            raw = ""
+
+        cleaned = []
+
+        def replay():
+            if raw:
+                yield raw
+            yield from tokens
+
+        for piece in self._stream_clean(replay()):
+            cleaned.append(piece)
+            yield piece
+
+        response = "".join(cleaned)
+        if response and not response.strip().endswith((".", "!", "?")):
+            completion = self.llm_handler.stream_response(self._completion_prompt(response, message))
+            yield from self._stream_clean(completion, ResponseCleaner(continuation=True))
+
+    @metrics.timed("chat", "relevance")
+    def is_waste_management_related(self, message: str, vector=None) -> bool:
+        local = self._local_relevance(message, vector)
+        if local is not None:
+            return local
+        try:
+            resp = self.llm_handler.generate_response(self._relevance_prompt(message)).strip().upper()
             return "YES" in resp
         except Exception:
             return True
+
+    def _local_relevance(self, message: str, vector=None) -> Optional[bool]:
+        # quick exits
+        if self._is_feedback(message) or self._is_greeting(message) or self._is_thanks(message) or self._is_complaint(message):
+            return True
+
+        prediction = self._predict_intent(message, vector)
+        if prediction and prediction.confidence >= Config.INTENT_CONFIDENCE_THRESHOLD:
+            return prediction.on_topic
+        return None
+
+    def _relevance_prompt(self, message: str) -> str:
+        return f"""
+                Is this about waste management / sustainability? 
+                Message: "{message}"
+                Respond ONLY YES or NO.
+                """
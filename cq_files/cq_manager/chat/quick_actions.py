@@ -0,0 +1,215 @@
+# cq_manager/chat/quick_actions.py
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: refreshes are then only serialised within a process
+    fcntl = None
+
+# Buttons in the chat UI send one of these actions instead of a message
+QUICK_ACTIONS = {
+    "schedule": "Show me my waste collection schedule",
+    "recycle-guide": "What's the guide for recycling different materials?",
+    "report-issue": "I want to report an issue with waste collection",
+    "tips": "Share some eco-friendly waste management tips",
+}
+
+QUICK_ACTIONS_FILE = "quick_actions.json"
+QUICK_ACTIONS_LOCK = "quick_actions.lock"
+
+
+def actions_signature(actions: Dict[str, str], models: Sequence[str]) -> str:
+    """Changes when a quick-action prompt or the answering models do."""
+    payload = json.dumps({"actions": actions, "models": list(models)}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class QuickActionStore:
+    """
+    Quick-action answers and their follow-up suggestions, generated once per
+    knowledge-base version and saved as quick_actions.json next to the
+    vector store, so a click costs a dict lookup instead of a pipeline run
+    and a suggestions call.
+
+    Every entry carries the version it was generated for (`version_fn()`:
+    index digest plus actions_signature). Only entries of the current
+    version are served; anything else is regenerated in a background
+    thread, and until then the caller answers through the normal pipeline.
+    The index digest changes with the KB, so after a rebuild clicks fall
+    back to live answers for the few seconds a refresh takes, never to a
+    stale one.
+
+    With several workers one process refreshes at a time (a lock file next
+    to the JSON); the others see the new file by its mtime and reload it.
+    """
+
+    def __init__(self, directory: str, actions: Dict[str, str],
+                 generate: Callable[[str], Optional[Tuple[str, List[str]]]],
+                 version_fn: Callable[[], str]):
+        self.directory = directory
+        self.actions = dict(actions)
+        # prompt -> (response, suggestions), or None when the answer should not be kept
+        self.generate = generate
+        self.version_fn = version_fn
+        self.path = os.path.join(directory, QUICK_ACTIONS_FILE)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        self._mtime = None
+        self._version = version_fn()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._hits = 0
+        self._misses = 0
+        self._refreshes = 0
+        self._generated = 0
+        self._skipped = 0
+        self._last_refresh: Optional[dict] = None
+        self._reload()
+
+    # ------------------------
+    # Serving
+    # ------------------------
+    def get(self, action: str) -> Optional[dict]:
+        """{"prompt", "response", "suggestions", ...} for `action` at the current version, else None."""
+        self._reload()
+        entry = self._entries.get(action)
+        if entry is not None and entry.get("version") == self._version:
+            self._hits += 1
+            return entry
+        self._misses += 1
+        if action in self.actions:
+            self.refresh_async()
+        return None
+
+    def stale(self) -> List[str]:
+        return [a for a in self.actions if self._entries.get(a, {}).get("version") != self._version]
+
+    def invalidate(self):
+        """The index changed: recompute the version and regenerate in the background."""
+        self._version = self.version_fn()
+        if self.stale():
+            self.refresh_async()
+
+    # ------------------------
+    # Refresh
+    # ------------------------
+    def refresh_async(self):
+        # the thread object survives fork but not the thread: track it per process
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self.refresh, name="quick-actions", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def refresh(self) -> bool:
+        """Regenerate stale entries; False when another process is already doing it."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, QUICK_ACTIONS_LOCK), "a") as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return False
+            try:
+                self._refresh()
+            finally:
+                if fcntl is not None:
+                    # explicit: forked workers share this descriptor and would keep it locked
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        return True
+
+    def _refresh(self):
+        self._reload()
+        version = self._version
+        t0 = time.perf_counter()
+        generated, skipped = [], []
+        for action in self.stale():
+            prompt = self.actions[action]
+            try:
+                result = self.generate(prompt)
+            except Exception as e:
+                print(f"[QuickActions] {action}: generation failed: {e}")
+                result = None
+            if result is None:
+                skipped.append(action)
+                continue
+            response, suggestions = result
+            with self._lock:
+                self._entries[action] = {
+                    "prompt": prompt,
+                    "response": response,
+                    "suggestions": list(suggestions),
+                    "version": version,
+                    "generated_at": time.time(),
+                }
+            self._save()
+            generated.append(action)
+        seconds = time.perf_counter() - t0
+        self._refreshes += 1
+        self._generated += len(generated)
+        self._skipped += len(skipped)
+        self._last_refresh = {"version": version, "generated": generated, "skipped": skipped,
+                              "seconds": round(seconds, 2)}
+        if generated or skipped:
+            print(f"[QuickActions] {version}: {len(generated)} generated, {len(skipped)} skipped "
+                  f"in {seconds:.2f}s")
+
+    # ------------------------
+    # Persistence
+    # ------------------------
+    def _reload(self):
+        """Re-read the file when another process (or an earlier run) has written it."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            entries = {a: e for a, e in data.get("actions", {}).items()
+                       if a in self.actions and e.get("prompt") == self.actions[a]}
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"[QuickActions] ignoring unreadable {self.path}: {e}")
+            return
+        with self._lock:
+            # keep what this process generated for the current version over older entries on disk
+            for action, entry in entries.items():
+                mine = self._entries.get(action)
+                if mine is None or mine.get("version") != self._version or entry.get("version") == self._version:
+                    self._entries[action] = entry
+            self._mtime = mtime
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with self._lock:
+            payload = {"actions": dict(self._entries)}
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        with self._lock:
+            self._mtime = os.stat(self.path).st_mtime_ns
+
+    def stats(self) -> dict:
+        with self._lock:
+            current = sorted(a for a, e in self._entries.items() if e.get("version") == self._version)
+        return {
+            "version": self._version,
+            "actions": len(self.actions),
+            "current": current,
+            "stale": self.stale(),
+            "refreshing": self._pid == os.getpid() and self._thread is not None and self._thread.is_alive(),
+            "hits": self._hits,
+            "misses": self._misses,
+            "refreshes": self._refreshes,
+            "generated": self._generated,
+            "skipped": self._skipped,
+            "last_refresh": self._last_refresh,
+        }
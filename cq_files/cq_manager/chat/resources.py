@@ -0,0 +1,521 @@
+# cq_manager/chat/resources.py
+import atexit
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from cq_files.cq_manager.config import Config
+
+_MISSING = object()
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB (0.0 if it can't be read)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, KB elsewhere (peak, not current)
+        return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+    except Exception:
+        return 0.0
+
+
+class ResourceRegistry:
+    """
+    Process-wide home for heavy, shareable objects (embedding model, vector
+    store, LLM client). Each resource is built lazily on first `get()` by its
+    registered factory, then handed to every caller by reference.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._factories: Dict[str, Callable[["ResourceRegistry"], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._report: List[Dict[str, Any]] = []
+        # time/RSS spent in nested get() calls, so each row reports its own cost
+        self._nested: List[List[float]] = []
+        self._listeners: Dict[str, List[Callable[[Any], None]]] = {}
+        self._versions: Dict[str, int] = {}
+        # last build error per resource; a later get() retries
+        self._errors: Dict[str, str] = {}
+
+    def register(self, name: str, factory: Callable[["ResourceRegistry"], Any]):
+        with self._lock:
+            self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        inst = self._instances.get(name, _MISSING)
+        if inst is not _MISSING:
+            return inst
+        with self._lock:
+            inst = self._instances.get(name, _MISSING)
+            if inst is not _MISSING:
+                return inst
+            if name not in self._factories:
+                raise KeyError(f"Unknown resource: {name}")
+
+            rss_before = current_rss_mb()
+            t0 = time.perf_counter()
+            self._nested.append([0.0, 0.0])
+            try:
+                inst = self._factories[name](self)
+            except Exception as e:
+                self._errors[name] = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                nested_s, nested_mb = self._nested.pop()
+            total_s = time.perf_counter() - t0
+            total_mb = current_rss_mb() - rss_before
+            if self._nested:
+                self._nested[-1][0] += total_s
+                self._nested[-1][1] += total_mb
+
+            elapsed = total_s - nested_s
+            rss_delta = total_mb - nested_mb
+            self._instances[name] = inst
+            self._errors.pop(name, None)
+            self._report.append({
+                "resource": name,
+                "seconds": round(elapsed, 3),
+                "rss_mb": round(current_rss_mb(), 1),
+                "rss_delta_mb": round(rss_delta, 1),
+            })
+            print(f"[Resources] {name} ready in {elapsed:.2f}s (RSS +{rss_delta:.1f} MB)")
+            return inst
+
+    def set(self, name: str, instance: Any):
+        """Replace a loaded resource (e.g. after a vector store rebuild)."""
+        with self._lock:
+            self._instances[name] = instance
+            self._versions[name] = self._versions.get(name, 0) + 1
+            listeners = list(self._listeners.get(name, []))
+        for callback in listeners:
+            try:
+                callback(instance)
+            except Exception as e:
+                print(f"[Resources] listener for {name} failed: {e}")
+
+    def subscribe(self, name: str, callback: Callable[[Any], None]):
+        """Call `callback(new_instance)` whenever `name` is replaced via set()."""
+        with self._lock:
+            self._listeners.setdefault(name, []).append(callback)
+
+    def version(self, name: str) -> int:
+        """Bumped on every set(); lets callers key caches by resource generation."""
+        return self._versions.get(name, 0)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def status(self) -> Dict[str, str]:
+        """"loaded", "not loaded" or the last build error, for every registered resource."""
+        with self._lock:
+            return {
+                name: "loaded" if name in self._instances else self._errors.get(name, "not loaded")
+                for name in self._factories
+            }
+
+    def report(self) -> List[Dict[str, Any]]:
+        return list(self._report)
+
+    def format_report(self) -> str:
+        lines = ["[Resources] startup report",
+                 f"  {'resource':<16}{'time (s)':>10}{'RSS +MB':>10}{'RSS MB':>10}"]
+        total = 0.0
+        for row in self._report:
+            total += row["seconds"]
+            lines.append(
+                f"  {row['resource']:<16}{row['seconds']:>10.2f}"
+                f"{row['rss_delta_mb']:>10.1f}{row['rss_mb']:>10.1f}"
+            )
+        lines.append(f"  {'total':<16}{total:>10.2f}{'':>10}{current_rss_mb():>10.1f}")
+        return "\n".join(lines)
+
+
+# ------------------------
+# Default factories
+# ------------------------
+def _build_chat_processor(registry: ResourceRegistry):
+    from cq_files.cq_manager.chat.processor import ChatProcessor
+
+    return ChatProcessor(registry)
+
+
+def _build_suggestions_generator(registry: ResourceRegistry):
+    from cq_files.cq_manager.chat.suggestions_generator import SuggestionsGenerator
+
+    return SuggestionsGenerator(registry)
+
+
+def _build_quick_actions(registry: ResourceRegistry):
+    if not Config.QUICK_ACTIONS_PRECOMPUTE:
+        return None
+    from cq_files.cq_manager.chat.index_manifest import IndexManifest
+    from cq_files.cq_manager.chat.quick_actions import QUICK_ACTIONS, QuickActionStore, actions_signature
+
+    doc_processor = registry.get("doc_processor")
+    chat_processor = registry.get("chat_processor")
+    suggestions_generator = registry.get("suggestions_generator")
+    llm_handler = registry.get("llm_handler")
+    limiter = registry.get("upstream_limiter")
+    models = llm_handler.router.models if llm_handler.router is not None else [llm_handler.model]
+    signature = actions_signature(QUICK_ACTIONS, models)
+
+    def version():
+        manifest = IndexManifest.load(doc_processor.vector_store_path)
+        return f"{manifest.digest if manifest else 'unindexed'}-{signature}"
+
+    def generate(prompt):
+        if limiter is not None and limiter.busy():
+            return None  # leave the upstream slots to chat turns; retried on a later click
+        # no session: no history folded in and nothing remembered
+        response = chat_processor._respond(prompt)
+        if not chat_processor._is_cacheable(response):
+            return None
+        return response, suggestions_generator.generate_suggestions(prompt, response)
+
+    store = QuickActionStore(doc_processor.vector_store_path, QUICK_ACTIONS, generate, version)
+    registry.subscribe("vector_store", lambda vs: store.invalidate())
+    # no generation thread here: this may run in a pre-fork master (see start_background)
+    return store
+
+
+def _build_embeddings(registry: ResourceRegistry):
+    from cq_files.cq_manager.chat.embedding_backends import create_embeddings, model_id
+
+    backend = Config.EMBEDDING_BACKEND
+    embeddings = create_embeddings(backend, Config.EMBEDDING_MODEL, Config.EMBEDDING_SMALL_MODEL,
+                                   Config.EMBEDDING_ONNX_DIR, Config.EMBEDDING_ONNX_THREADS)
+    if Config.EMBEDDING_BATCHING_ENABLED:
+        from cq_files.cq_manager.chat.embedding_batcher import BatchingEmbeddings
+
+        # below the cache, so hits never wait for a batch
+        embeddings = BatchingEmbeddings(embeddings, max_batch=Config.EMBEDDING_BATCH_MAX_SIZE,
+                                        max_wait=Config.EMBEDDING_BATCH_MAX_WAIT_MS / 1000.0)
+    if not Config.EMBEDDING_CACHE_ENABLED:
+        return embeddings
+    from cq_files.cq_manager.chat.embedding_cache import CachedEmbeddings
+
+    return CachedEmbeddings(
+        embeddings,
+        model_name=model_id(backend, Config.EMBEDDING_MODEL, Config.EMBEDDING_SMALL_MODEL),
+        cache_dir=Config.EMBEDDING_CACHE_DIR,
+        max_entries=Config.EMBEDDING_CACHE_MAX_ENTRIES,
+        disk_max_entries=Config.EMBEDDING_CACHE_DISK_MAX_ENTRIES,
+    )
+
+
+def _build_doc_processor(registry: ResourceRegistry):
+    from cq_files.cq_manager.chat.document_processor import DocumentProcessor
+
+    doc_processor = DocumentProcessor(
+        knowledge_base_path=os.getenv("KNOWLEDGE_BASE_PATH", Config.KNOWLEDGE_BASE_PATH),
+        vector_store_path=os.getenv("VECTOR_STORE_PATH", Config.VECTOR_STORE_PATH),
+        embeddings=registry.get("embeddings"),
+    )
+    # a rebuilt index replaces the shared store and notifies its subscribers
+    doc_processor.add_store_listener(lambda vs: registry.set("vector_store", vs))
+    return doc_processor
+
+
+def _build_vector_store(registry: ResourceRegistry):
+    doc_processor = registry.get("doc_processor")
+    vs = doc_processor.load_vector_store()
+    if not vs:
+        print("Vector store missing; creating a new one...")
+        vs = doc_processor.process_and_store()
+    return vs
+
+
+def _build_retriever(registry: ResourceRegistry):
+    from cq_files.cq_manager.chat.hybrid_retriever import BM25Index, HybridRetriever
+
+    def build(vs):
+        return HybridRetriever(
+            vector_store=vs,
+            bm25=BM25Index.from_vector_store(vs),
+            k=Config.RETRIEVAL_K,
+            fetch_k=Config.RETRIEVAL_FETCH_K,
+            rrf_k=Config.RETRIEVAL_RRF_K,
+        )
+
+    # the BM25 side is rebuilt from the same chunks whenever the store changes
+    registry.subscribe("vector_store", lambda vs: registry.set("retriever", build(vs)))
+    return build(registry.get("vector_store"))
+
+
+def _build_context_builder(registry: ResourceRegistry):
+    from cq_files.cq_manager.chat.context_builder import ContextBuilder
+
+    return ContextBuilder(
+        budgets={
+            "rag": Config.CONTEXT_TOKENS_RAG,
+            "slot": Config.CONTEXT_TOKENS_SLOT,
+            "suggestions": Config.CONTEXT_TOKENS_SUGGESTIONS,
+        },
+        mmr_lambda=Config.CONTEXT_MMR_LAMBDA,
+        dedup_threshold=Config.CONTEXT_DEDUP_THRESHOLD,
+    )
+
+
+def _build_kb_tables(registry: ResourceRegistry):
+    doc_processor = registry.get("doc_processor")
+    registry.get("vector_store")  # the first sync writes tables.json
+    # re-read after every index change; a sync re-extracts when files changed
+    registry.subscribe("vector_store", lambda vs: registry.set("kb_tables", doc_processor.load_tables()))
+    return doc_processor.load_tables()
+
+
+def _build_faq_index(registry: ResourceRegistry):
+    if not Config.FAQ_ENABLED:
+        return None
+    doc_processor = registry.get("doc_processor")
+    registry.get("vector_store")  # the first sync writes faq.json
+    settings = {"threshold": Config.FAQ_THRESHOLD, "near_miss_margin": Config.FAQ_NEAR_MISS}
+    registry.subscribe("vector_store", lambda vs: registry.set("faq_index", doc_processor.load_faq(**settings)))
+    return doc_processor.load_faq(**settings)
+
+
+def _build_llm_handler(registry: ResourceRegistry):
+    from cq_files.cq_manager.chat.llm_handler import LLMHandler
+    from cq_files.cq_manager.chat.model_router import ModelRouter, parse_models
+
+    models = parse_models(Config.OPENROUTER_MODELS, Config.OPENROUTER_MODEL_BUDGET)
+    if not models:
+        return LLMHandler()
+    limiter = registry.get("upstream_limiter")
+    router = ModelRouter(
+        models,
+        hedge_delay=Config.OPENROUTER_HEDGE_DELAY,
+        max_attempts=Config.OPENROUTER_MAX_ATTEMPTS,
+        alpha=Config.OPENROUTER_STATS_ALPHA,
+        max_error_rate=Config.OPENROUTER_MAX_ERROR_RATE,
+        recovery_after=Config.OPENROUTER_RECOVERY_AFTER,
+        # one thread per pooled connection
+        workers=Config.OPENROUTER_POOL_SIZE,
+        can_hedge=lambda: limiter is None or not limiter.busy(),
+    )
+    print(f"[Resources] OpenRouter models: {', '.join(f'{m}@{b:g}s' for m, b in models)}")
+    handler = LLMHandler(router=router)
+    handler.set_model(router.models[0])
+    return handler
+
+
+def _build_upstream_limiter(registry: ResourceRegistry):
+    from cq_files.cq_manager.chat.admission import UpstreamLimiter
+
+    if Config.OPENROUTER_MAX_CONCURRENT <= 0:
+        return None
+    return UpstreamLimiter(
+        max_concurrent=Config.OPENROUTER_MAX_CONCURRENT,
+        max_queue=Config.OPENROUTER_QUEUE_SIZE,
+        max_wait=Config.OPENROUTER_QUEUE_TIMEOUT,
+    )
+
+
+def _build_session_rate_limiter(registry: ResourceRegistry):
+    from cq_files.cq_manager.chat.admission import SessionRateLimiter
+
+    if Config.CHAT_RATE_PER_MINUTE <= 0:
+        return None
+    return SessionRateLimiter(rate=Config.CHAT_RATE_PER_MINUTE / 60.0, burst=Config.CHAT_RATE_BURST)
+
+
+def _build_http_client(registry: ResourceRegistry):
+    from cq_files.cq_manager.chat.http_client import CircuitBreaker, PooledHTTPClient
+
+    return PooledHTTPClient(
+        pool_size=Config.OPENROUTER_POOL_SIZE,
+        connect_timeout=Config.OPENROUTER_CONNECT_TIMEOUT,
+        read_timeout=Config.OPENROUTER_READ_TIMEOUT,
+        max_retries=Config.OPENROUTER_MAX_RETRIES,
+        backoff_base=Config.OPENROUTER_BACKOFF_BASE,
+        backoff_max=Config.OPENROUTER_BACKOFF_MAX,
+        retry_after_max=Config.OPENROUTER_RETRY_AFTER_MAX,
+        breaker=CircuitBreaker(
+            failure_threshold=Config.OPENROUTER_BREAKER_THRESHOLD,
+            reset_timeout=Config.OPENROUTER_BREAKER_RESET,
+        ),
+    )
+
+
+def _build_answer_cache(registry: ResourceRegistry):
+    from cq_files.cq_manager.chat.answer_cache import SemanticAnswerCache
+
+    cache = SemanticAnswerCache(
+        threshold=Config.ANSWER_CACHE_THRESHOLD,
+        near_miss_margin=Config.ANSWER_CACHE_NEAR_MISS,
+        max_entries=Config.ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds=Config.ANSWER_CACHE_TTL,
+        enabled=Config.ANSWER_CACHE_ENABLED,
+    )
+    registry.subscribe("vector_store", lambda vs: cache.clear("vector store rebuilt"))
+    return cache
+
+
+def _build_rules(registry: ResourceRegistry):
+    from cq_files.cq_manager.chat.rules import RuleEngine
+
+    return RuleEngine.from_file(Config.RULES_PATH)
+
+
+def _build_intent_classifier(registry: ResourceRegistry):
+    if not Config.INTENT_CLASSIFIER_ENABLED:
+        return None
+    from cq_files.cq_manager.chat.intent_classifier import EmbeddingIntentClassifier
+
+    def build():
+        return EmbeddingIntentClassifier.from_files(
+            registry.get("embeddings"),
+            Config.INTENT_EXEMPLARS_PATH,
+            os.getenv("KNOWLEDGE_BASE_PATH", Config.KNOWLEDGE_BASE_PATH),
+        )
+
+    # the curated KB questions are part of the exemplar set
+    registry.subscribe("vector_store", lambda vs: registry.set("intent_classifier", build()))
+    return build()
+
+
+def _build_session_memory(registry: ResourceRegistry):
+    from cq_files.cq_manager.chat.session_memory import SessionMemory, sqlite_path
+
+    db_path = sqlite_path(Config.SQLALCHEMY_DATABASE_URI)
+    if db_path is None and Config.SESSION_MEMORY_ENABLED:
+        print("[SessionMemory] DATABASE_URL is not sqlite:///; keeping history in memory only")
+    memory = SessionMemory(
+        db_path=db_path,
+        max_turns=Config.SESSION_MAX_TURNS,
+        max_chars=Config.SESSION_MAX_CHARS,
+        max_sessions=Config.SESSION_MAX_SESSIONS,
+        idle_ttl=Config.SESSION_IDLE_TTL,
+        flush_interval=Config.SESSION_FLUSH_INTERVAL,
+        enabled=Config.SESSION_MEMORY_ENABLED,
+    )
+    # write out turns still queued for the write-behind thread
+    atexit.register(memory.close)
+    return memory
+
+
+def _build_suggestion_jobs(registry: ResourceRegistry):
+    from cq_files.cq_manager.chat.background import BackgroundJobs
+    from cq_files.cq_manager.chat.session_memory import sqlite_path
+
+    # shared so a poll answered by another worker still finds the job
+    db_path = sqlite_path(Config.SQLALCHEMY_DATABASE_URI)
+    if db_path is None:
+        print("[Suggestions] DATABASE_URL is not sqlite:///; jobs are only visible to the worker that ran them")
+    return BackgroundJobs(
+        max_workers=Config.SUGGESTION_WORKERS,
+        ttl_seconds=Config.SUGGESTION_JOB_TTL,
+        name="suggestions",
+        db_path=db_path,
+    )
+
+
+_registry: Optional[ResourceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ResourceRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                reg = ResourceRegistry()
+                reg.register("chat_processor", _build_chat_processor)
+                reg.register("suggestions_generator", _build_suggestions_generator)
+                reg.register("quick_actions", _build_quick_actions)
+                reg.register("embeddings", _build_embeddings)
+                reg.register("doc_processor", _build_doc_processor)
+                reg.register("vector_store", _build_vector_store)
+                reg.register("retriever", _build_retriever)
+                reg.register("context_builder", _build_context_builder)
+                reg.register("kb_tables", _build_kb_tables)
+                reg.register("faq_index", _build_faq_index)
+                reg.register("llm_handler", _build_llm_handler)
+                reg.register("http_client", _build_http_client)
+                reg.register("upstream_limiter", _build_upstream_limiter)
+                reg.register("session_rate_limiter", _build_session_rate_limiter)
+                reg.register("answer_cache", _build_answer_cache)
+                reg.register("session_memory", _build_session_memory)
+                reg.register("suggestion_jobs", _build_suggestion_jobs)
+                reg.register("intent_classifier", _build_intent_classifier)
+                reg.register("rules", _build_rules)
+                _registry = reg
+    return _registry
+
+
+# ------------------------
+# Warm start / readiness
+# ------------------------
+# Everything /chat needs; building these pulls in every other resource
+SERVING_RESOURCES = ("chat_processor", "suggestions_generator")
+# Built by warm_up() too, but /readyz does not wait for them
+OPTIONAL_RESOURCES = ("quick_actions",)
+
+
+def warm_up(registry: Optional[ResourceRegistry] = None, background: bool = True) -> bool:
+    """
+    Build the serving resources now instead of on the first request. Run it
+    in a pre-fork master (gunicorn.conf.py) with `background=False` and the
+    workers inherit the model weights, vector store and indexes
+    copy-on-write; each worker then calls start_background() itself.
+    Failures are logged, not raised: the process still starts and /readyz
+    reports them.
+    """
+    registry = registry or get_registry()
+    t0 = time.perf_counter()
+    ok = True
+    for name in SERVING_RESOURCES:
+        try:
+            registry.get(name)
+        except Exception as e:
+            ok = False
+            print(f"[Resources] warm-up: {name} failed: {e}")
+    for name in OPTIONAL_RESOURCES if ok else ():
+        try:
+            registry.get(name)
+        except Exception as e:
+            print(f"[Resources] warm-up: {name} failed: {e}")
+    print(registry.format_report())
+    print(f"[Resources] warm-up {'done' if ok else 'incomplete'} in {time.perf_counter() - t0:.2f}s")
+    if ok and background:
+        start_background(registry)
+    return ok
+
+
+def start_background(registry: Optional[ResourceRegistry] = None):
+    """
+    Start this process's background work: regenerating stale quick-action
+    answers. Never before a fork: the thread would not follow into the
+    workers, but the upstream slots, breaker state and locks it holds would.
+    With several workers each one calls this and the store's lock file lets
+    one of them do the work.
+    """
+    registry = registry or get_registry()
+    try:
+        store = registry.get("quick_actions")
+    except Exception as e:
+        print(f"[Resources] quick actions unavailable: {e}")
+        return
+    if store is not None and store.stale():
+        store.refresh_async()
+
+
+def readiness(registry: Optional[ResourceRegistry] = None) -> dict:
+    registry = registry or get_registry()
+    status = registry.status()
+    return {
+        "ready": all(status.get(name) == "loaded" for name in SERVING_RESOURCES),
+        "resources": status,
+    }
@@ -0,0 +1,133 @@
+# cq_manager/chat/response_cleaner.py
+import re
+
+PREFIXES = (
+    "Answer: ",
+    "Response: ",
+    "Based on the information,",
+    "According to the information,",
+)
+_MAX_PREFIX = max(len(p) for p in PREFIXES)
+
+_MARKDOWN = re.compile(r"(\*{1,2}|_{1,2}|-{3,}|#{1,6}\s|•\s*)")
+_LINE_MARKER = re.compile(r"^\s*(?:\d+\.|•|-)\s*")
+# a partial line made only of these could still turn into a list marker
+_AMBIGUOUS_LINE_START = re.compile(r"^[\s\d.•\-'\"*_#]*$")
+# trailing characters that may change meaning once the next token arrives
+_HOLD = set(" \t\r'\"*_-#•")
+_QUOTES = "'\""
+
+
+class ResponseCleaner:
+    """
+    Incremental version of ChatProcessor._clean_response. Feed raw LLM text in
+    arbitrary chunks and get back cleaned text as soon as it can no longer
+    change; `finish()` flushes the rest. Cleaning a whole string in one feed
+    gives exactly the same result as streaming it.
+
+    Rules: leading quotes and stock prefixes ("Answer: " ...) are dropped,
+    markdown emphasis/headings/rules and bullets are removed, numbered and
+    dashed list markers and quotes are stripped at line boundaries (so
+    "e-waste" keeps its hyphen), whitespace collapses to single spaces and
+    the first letter is capitalised.
+
+    With `continuation=True` the output is treated as following text that was
+    already emitted (no prefix stripping or capitalisation, leading space).
+    """
+
+    def __init__(self, continuation: bool = False):
+        self._buf = ""
+        self._started = continuation
+        self._at_line_start = True
+        self._emitted_any = continuation
+        self._space_pending = continuation
+
+    def feed(self, chunk: str) -> str:
+        if not chunk:
+            return ""
+        self._buf += chunk
+        return self._drain(final=False)
+
+    def finish(self) -> str:
+        return self._drain(final=True)
+
+    # ------------------------
+    # Internals
+    # ------------------------
+    def _drain(self, final: bool) -> str:
+        out = []
+        if not self._started:
+            stripped = self._buf.lstrip().lstrip(_QUOTES).lstrip()
+            if not final and len(stripped) < _MAX_PREFIX and "\n" not in stripped:
+                return ""
+            for prefix in PREFIXES:
+                if stripped.startswith(prefix):
+                    stripped = stripped[len(prefix):].lstrip()
+            self._buf = stripped
+            self._started = True
+
+        while self._buf:
+            nl = self._buf.find("\n")
+            if nl >= 0:
+                line, self._buf = self._buf[:nl], self._buf[nl + 1:]
+                out.append(self._clean_segment(line, line_end=True))
+                continue
+            if final:
+                line, self._buf = self._buf, ""
+                out.append(self._clean_segment(line, line_end=True))
+                break
+
+            if self._at_line_start and _AMBIGUOUS_LINE_START.match(self._buf):
+                break
+            cut = len(self._buf)
+            while cut > 0 and self._buf[cut - 1] in _HOLD:
+                cut -= 1
+            if cut == 0:
+                break
+            seg, self._buf = self._buf[:cut], self._buf[cut:]
+            out.append(self._clean_segment(seg, line_end=False))
+            break
+        return "".join(out)
+
+    def _clean_segment(self, seg: str, line_end: bool) -> str:
+        seg = _MARKDOWN.sub("", seg)
+        if self._at_line_start:
+            seg = _LINE_MARKER.sub("", seg).lstrip().lstrip(_QUOTES)
+        if line_end:
+            seg = seg.rstrip().rstrip(_QUOTES)
+            self._at_line_start = True
+        elif seg.strip():
+            self._at_line_start = False
+        text = self._collapse(seg)
+        if line_end and self._emitted_any:
+            self._space_pending = True
+        return text
+
+    def _collapse(self, seg: str) -> str:
+        if not seg:
+            return ""
+        parts = seg.split()
+        if not parts:
+            if self._emitted_any:
+                self._space_pending = True
+            return ""
+
+        out = []
+        if seg[0].isspace() and self._emitted_any:
+            self._space_pending = True
+        for i, part in enumerate(parts):
+            if self._emitted_any and (self._space_pending or i > 0):
+                out.append(" ")
+            if not self._emitted_any:
+                part = part[0].upper() + part[1:]
+                self._emitted_any = True
+            out.append(part)
+            self._space_pending = False
+        if seg[-1].isspace():
+            self._space_pending = True
+        return "".join(out)
+
+
+def clean_response(response: str) -> str:
+    cleaner = ResponseCleaner()
+    return cleaner.feed(response) + cleaner.finish()
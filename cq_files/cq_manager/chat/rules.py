@@ -0,0 +1,118 @@
+# cq_manager/chat/rules.py
+import json
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, NamedTuple, Set
+
+
+class MessageFlags(NamedTuple):
+    greeting: bool
+    thanks: bool
+    feedback: bool
+    complaint: bool
+    schedule: bool
+    collection_time: bool
+    contact_request: bool
+    missed_collection: bool
+    followup: bool
+    groups: FrozenSet[str]
+    word_count: int
+
+
+_WORD_TAIL = r"[\w'-]"
+_LEADING = re.compile(r"\W*")  # punctuation and spaces before the first word
+
+
+def _units(keyword: str) -> List[str]:
+    """Regex pieces for one keyword: escaped characters, \\s+ between words, a stem tail for *."""
+    units = []
+    for i, word in enumerate(keyword.strip().split()):
+        if i:
+            units.append(r"\s+")
+        units.extend(re.escape(ch) for ch in word.rstrip("*"))
+        if word.endswith("*"):
+            units.append(_WORD_TAIL + "*")
+    return units
+
+
+def _trie_regex(keywords: List[str]) -> str:
+    """
+    One regex for all keywords, factored as a trie so the engine follows a
+    single branch per character instead of trying every keyword. The end of
+    keyword i is marked by an empty group k<i>; longer continuations are
+    tried before ending, so the longest keyword wins.
+    """
+    root: dict = {}
+    for idx, keyword in enumerate(keywords):
+        node = root
+        for unit in _units(keyword):
+            node = node.setdefault(unit, {})
+        node.setdefault(None, idx)
+
+    def build(node: dict) -> str:
+        alts = [unit + build(child) for unit, child in node.items() if unit is not None]
+        if None in node:
+            alts.append(rf"(?!{_WORD_TAIL})(?P<k{node[None]}>)")
+        return alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+
+    return build(root)
+
+
+class RuleEngine:
+    """
+    All keyword heuristics compiled into one trie-shaped regex inside a
+    zero-width lookahead, so a single scan finds overlapping matches
+    ("didn't collect" and "collect") and `match()` returns every flag at
+    once. Keywords are whole words, so "hi" no longer fires on "which". At
+    a given position the longest keyword wins. A group with `"anchored":
+    true` only counts keywords that open the message.
+
+    Results are memoised per message text: the routing code asks several
+    times per turn.
+    """
+
+    def __init__(self, groups: Dict[str, dict], cache_size: int = 1024):
+        self.max_words = {name: spec.get("max_words") for name, spec in groups.items()}
+        self._anchored = frozenset(name for name, spec in groups.items() if spec.get("anchored"))
+        owners: Dict[str, Set[str]] = {}
+        for name, spec in groups.items():
+            for keyword in spec["keywords"]:
+                owners.setdefault(keyword.lower().replace("’", "'"), set()).add(name)
+
+        keywords = sorted(owners)
+        self._owners: List[FrozenSet[str]] = [frozenset(owners[k]) for k in keywords]
+        self._regex = re.compile(rf"\b(?={_trie_regex(keywords)})")
+        self.match = lru_cache(maxsize=cache_size)(self._match)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "RuleEngine":
+        with open(path, encoding="utf-8") as f:
+            groups = {k: v for k, v in json.load(f).items() if not k.startswith("_")}
+        return cls(groups, **kwargs)
+
+    def groups(self, message: str) -> FrozenSet[str]:
+        text = message.lower().replace("’", "'")
+        start = _LEADING.match(text).end()
+        found: Set[str] = set()
+        for m in self._regex.finditer(text):
+            owners = self._owners[int(m.lastgroup[1:])]
+            found |= owners if m.start() == start else owners - self._anchored
+        return frozenset(found)
+
+    def _match(self, message: str) -> MessageFlags:
+        word_count = len(message.split())
+        found = {name for name in self.groups(message)
+                 if self.max_words.get(name) is None or word_count <= self.max_words[name]}
+        return MessageFlags(
+            greeting="greeting" in found,
+            thanks="thanks" in found,
+            feedback="feedback" in found,
+            complaint="complaint" in found,
+            schedule="schedule" in found,
+            collection_time="collection" in found and "timing" in found,
+            contact_request="contact" in found and "municipal" in found,
+            missed_collection="missed_collection" in found,
+            followup="followup" in found,
+            groups=frozenset(found),
+            word_count=word_count,
+        )
@@ -0,0 +1,299 @@
+# cq_manager/chat/session_memory.py
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, List, NamedTuple, Optional, Tuple
+
+
+class Turn(NamedTuple):
+    ts: float
+    user: str
+    assistant: str
+
+
+class _Session:
+    __slots__ = ("turns", "chars", "last_seen")
+
+    def __init__(self, turns: Deque[Turn], now: float):
+        self.turns = turns
+        self.chars = sum(len(t.user) + len(t.assistant) for t in turns)
+        self.last_seen = now
+
+
+def sqlite_path(database_url: Optional[str]) -> Optional[str]:
+    """File path of a sqlite:/// URL (SQLALCHEMY_DATABASE_URI style); None for anything else."""
+    if not database_url or not database_url.startswith("sqlite:///"):
+        return None
+    path = database_url[len("sqlite:///"):]
+    return path or None
+
+
+def approx_tokens(text: str) -> int:
+    # ~4 characters per token for English; good enough for a prompt budget
+    return (len(text) + 3) // 4
+
+
+def format_history(turns: List[Turn], token_budget: int, max_answer_chars: int = 300) -> str:
+    """
+    The most recent turns that fit in `token_budget`, oldest first, as a
+    "Conversation so far" block for a prompt. Long answers are clipped.
+    """
+    lines: List[str] = []
+    used = 0
+    for turn in reversed(turns):
+        answer = turn.assistant
+        if len(answer) > max_answer_chars:
+            answer = answer[:max_answer_chars].rsplit(" ", 1)[0] + " …"
+        pair = [f"User: {turn.user}", f"Assistant: {answer}"]
+        cost = approx_tokens(pair[0]) + approx_tokens(pair[1])
+        if used + cost > token_budget:
+            break
+        lines[:0] = pair
+        used += cost
+    if not lines:
+        return ""
+    return "Conversation so far:\n" + "\n".join(lines) + "\n\n"
+
+
+class SessionMemory:
+    """
+    Recent turns per session.
+
+    Hot tier: in-process, at most `max_turns` turns and `max_chars` characters
+    per session, at most `max_sessions` sessions (least recently used dropped
+    first), and sessions idle for `idle_ttl` seconds are evicted.
+
+    Cold tier (optional): SQLite at `db_path`. Turns are queued and written
+    behind by a daemon thread every `flush_interval` seconds, so the request
+    path never waits on disk. A session evicted from the hot tier is reloaded
+    from SQLite on its next turn.
+    """
+
+    MAX_PENDING = 50000
+
+    def __init__(self, db_path: Optional[str] = None, max_turns: int = 6, max_chars: int = 4000,
+                 max_sessions: int = 20000, idle_ttl: float = 30 * 60, flush_interval: float = 1.0,
+                 enabled: bool = True):
+        self.enabled = enabled
+        self.db_path = db_path if enabled else None
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._pending: List[Tuple[str, float, str, str]] = []
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._pid = None
+        self._local = threading.local()
+        self._last_sweep = time.monotonic()
+
+        self._loads = 0
+        self._written = 0
+        self._write_errors = 0
+        self._dropped_writes = 0
+        self._evicted_idle = 0
+        self._evicted_lru = 0
+        if self.db_path:
+            self._init_db()
+
+    # ------------------------
+    # Public API
+    # ------------------------
+    def history(self, session_id: Optional[str]) -> List[Turn]:
+        if not session_id or not self.enabled:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            sess = self._sessions.get(session_id)
+            if sess is not None:
+                sess.last_seen = now
+                self._sessions.move_to_end(session_id)
+                return list(sess.turns)
+        if not self.db_path:
+            return []
+        turns = self._load(session_id)
+        with self._lock:
+            # another request may have filled it meanwhile; keep the newer view
+            sess = self._sessions.get(session_id)
+            if sess is None:
+                self._insert(session_id, _Session(deque(turns), now))
+                return turns
+            return list(sess.turns)
+
+    def append(self, session_id: Optional[str], user: str, assistant: str):
+        if not session_id or not self.enabled:
+            return
+        if self.db_path and session_id not in self._sessions:
+            # evicted (or served by another worker): reload, so the new turn joins the stored history
+            self.history(session_id)
+        now = time.monotonic()
+        turn = Turn(time.time(), user, assistant)
+        with self._lock:
+            sess = self._sessions.get(session_id)
+            if sess is None:
+                sess = _Session(deque(), now)
+                self._insert(session_id, sess)
+            else:
+                self._sessions.move_to_end(session_id)
+            sess.turns.append(turn)
+            sess.chars += len(user) + len(assistant)
+            sess.last_seen = now
+            while sess.turns and (len(sess.turns) > self.max_turns or sess.chars > self.max_chars):
+                old = sess.turns.popleft()
+                sess.chars -= len(old.user) + len(old.assistant)
+            if now - self._last_sweep > min(self.idle_ttl, 60):
+                self._sweep(now)
+            if self.db_path:
+                self._pending.append((session_id, turn.ts, user, assistant))
+        if self.db_path:
+            self._ensure_writer()
+
+    def flush(self) -> int:
+        """Write queued turns to SQLite now; returns how many were written."""
+        if not self.db_path:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                conn = self._connection()
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO chat_turns (session_id, ts, user_message, bot_response) VALUES (?, ?, ?, ?)",
+                        batch,
+                    )
+                self._written += len(batch)
+                return len(batch)
+            except sqlite3.Error as e:
+                self._write_errors += 1
+                print(f"[SessionMemory] write-behind failed ({len(batch)} turn(s) re-queued): {e}")
+                with self._lock:
+                    self._pending[:0] = batch
+                    # the database is down: keep the newest turns, bounded
+                    overflow = len(self._pending) - self.MAX_PENDING
+                    if overflow > 0:
+                        del self._pending[:overflow]
+                        self._dropped_writes += overflow
+                return 0
+
+    def evict_idle(self) -> int:
+        with self._lock:
+            return self._sweep(time.monotonic())
+
+    def stats(self) -> dict:
+        with self._lock:
+            turns = sum(len(s.turns) for s in self._sessions.values())
+            chars = sum(s.chars for s in self._sessions.values())
+            return {
+                "sessions": len(self._sessions),
+                "turns": turns,
+                "text_chars": chars,
+                "pending_writes": len(self._pending),
+                "written": self._written,
+                "write_errors": self._write_errors,
+                "dropped_writes": self._dropped_writes,
+                "loads": self._loads,
+                "evicted_idle": self._evicted_idle,
+                "evicted_lru": self._evicted_lru,
+                "enabled": self.enabled,
+                "persistent": bool(self.db_path),
+            }
+
+    def close(self):
+        self._wake.set()
+        self.flush()
+
+    # ------------------------
+    # Internals
+    # ------------------------
+    def _insert(self, session_id: str, sess: _Session):
+        self._sessions[session_id] = sess
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self._evicted_lru += 1
+
+    def _sweep(self, now: float) -> int:
+        """Drop idle sessions; the OrderedDict is in last-use order, so stop at the first live one."""
+        self._last_sweep = now
+        dropped = 0
+        while self._sessions:
+            sid, sess = next(iter(self._sessions.items()))
+            if now - sess.last_seen <= self.idle_ttl:
+                break
+            del self._sessions[sid]
+            dropped += 1
+        self._evicted_idle += dropped
+        return dropped
+
+    def _connection(self) -> sqlite3.Connection:
+        # one connection per thread (and per process after a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_turns ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " session_id TEXT NOT NULL,"
+                " ts REAL NOT NULL,"
+                " user_message TEXT NOT NULL,"
+                " bot_response TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS chat_turns_session ON chat_turns (session_id, id)")
+
+    def _load(self, session_id: str) -> List[Turn]:
+        self.flush()  # the session's own queued turns come back too
+        try:
+            rows = self._connection().execute(
+                "SELECT ts, user_message, bot_response FROM chat_turns WHERE session_id = ?"
+                " ORDER BY id DESC LIMIT ?",
+                (session_id, self.max_turns),
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"[SessionMemory] load failed for {session_id}: {e}")
+            return []
+        self._loads += 1
+        turns: List[Turn] = []
+        chars = 0
+        for ts, user, assistant in rows:
+            chars += len(user) + len(assistant)
+            if chars > self.max_chars and turns:
+                break
+            turns.insert(0, Turn(ts, user, assistant))
+        return turns
+
+    def _ensure_writer(self):
+        if self._writer is not None and self._writer.is_alive() and self._pid == os.getpid():
+            return
+        with self._flush_lock:
+            if self._writer is not None and self._writer.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._writer = threading.Thread(target=self._write_loop, name="session-memory", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
@@ -1,21 +1,49 @@
 # cq_manager/chat/suggestions_generator.py
-import os
-from cq_files.cq_manager.chat.llm_handler import LLMHandler
-from cq_files.cq_manager.chat.document_processor import DocumentProcessor
-from cq_files.cq_manager.config import Config
+import threading
+
+from cq_files.cq_manager.chat.metrics import timed
+from cq_files.cq_manager.chat.resources import ResourceRegistry, get_registry
+
+# Fixed 3R retrievals; their results only change when the index does
+TIP_QUERIES = (
+    "reduce waste tips advice",
+    "reuse items tips advice",
+    "recycling tips advice",
+)
 
 
 class SuggestionsGenerator:
-    def __init__(self):
-        self.llm_handler = LLMHandler()
-        self.doc_processor = DocumentProcessor(
-            knowledge_base_path=os.getenv("KNOWLEDGE_BASE_PATH", Config.KNOWLEDGE_BASE_PATH),
-            vector_store_path=os.getenv("VECTOR_STORE_PATH", Config.VECTOR_STORE_PATH),
-        )
-        self.vector_store = self.doc_processor.load_vector_store()
-        if not self.vector_store:
-            print("Vector store not found; building...")
-            self.vector_store = self.doc_processor.process_and_store()
+    def __init__(self, resources: ResourceRegistry = None):
+        self.resources = resources or get_registry()
+        self.llm_handler = self.resources.get("llm_handler")
+        self.doc_processor = self.resources.get("doc_processor")
+        self.vector_store = self.resources.get("vector_store")
+        self.context_builder = self.resources.get("context_builder")
+        self._kb_lock = threading.Lock()
+        self._kb_version = None
+        self._kb_context = ""
+        self.resources.subscribe("vector_store", self._on_vector_store_changed)
+        self.tips_context()
+
+    def _on_vector_store_changed(self, vector_store):
+        self.vector_store = vector_store
+        self.tips_context()
+
+    @timed("suggestions", "tips_context")
+    def tips_context(self) -> str:
+        """3R knowledge for the prompt, retrieved once per vector store version."""
+        version = self.resources.version("vector_store")
+        if self._kb_version == version:
+            return self._kb_context
+        with self._kb_lock:
+            if self._kb_version != version:
+                docs = []
+                for q in TIP_QUERIES:
+                    docs += self.vector_store.similarity_search(q, k=3)
+                # nine overlapping tip chunks, merged and cut to the suggestions budget
+                self._kb_context = self.context_builder.build_text(docs, "suggestions", separator="\n")
+                self._kb_version = version
+        return self._kb_context
 
     def _clean_suggestion(self, s: str) -> str:
         for ch in ['*', '_', '`', '"', "'", '1.', '2.', '3.', '-']:
@@ -44,12 +72,13 @@ class SuggestionsGenerator:
         ]
         return fallback[:count]
 
+    @timed("suggestions", "generate")
     def generate_suggestions(self, user_input: str, bot_response: str, max_suggestions: int = 3):
-        reduce_docs = self.vector_store.similarity_search("reduce waste tips advice", k=3)
-        reuse_docs = self.vector_store.similarity_search("reuse items tips advice", k=3)
-        recycle_docs = self.vector_store.similarity_search("recycling tips advice", k=3)
-
-        kb = "\n".join(d.page_content for d in (reduce_docs + reuse_docs + recycle_docs))
+        limiter = self.resources.get("upstream_limiter")
+        if limiter is not None and limiter.busy():
+            # optional work: leave the upstream slots to chat turns
+            return self._generate_default_3r_suggestions(max_suggestions)
+        kb = self.tips_context()
 
         prompt = f"""
                  You are a waste management assistant specializing in 3R tips.
@@ -66,7 +95,8 @@ class SuggestionsGenerator:
                  One line per question. No numbering or formatting.
                  """
         try:
-            raw = self.llm_handler.generate_response(prompt)
+            with timed("suggestions", "llm"):
+                raw = self.llm_handler.generate_response(prompt)
             suggestions = [self._clean_suggestion(x.strip()) for x in raw.splitlines() if x.strip()]
             suggestions = [s for s in suggestions if self._is_valid_suggestion(s)]
             if len(suggestions) < max_suggestions:
@@ -75,3 +105,8 @@ class SuggestionsGenerator:
         except Exception as e:
             print(f"Suggestions error: {e}")
             return self._generate_default_3r_suggestions(max_suggestions)
+
+    def submit(self, user_input: str, bot_response: str, max_suggestions: int = 3) -> str:
+        """Queue generate_suggestions off the request thread; returns a job id to poll."""
+        jobs = self.resources.get("suggestion_jobs")
+        return jobs.submit(self.generate_suggestions, user_input, bot_response, max_suggestions)
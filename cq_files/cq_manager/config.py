@@ -7,8 +7,128 @@ class Config:
 
     KNOWLEDGE_BASE_PATH = os.path.join(DATA_DIR, "knowledge_base")
     VECTOR_STORE_PATH = os.path.join(DATA_DIR, "vector_store")
+    # "mmap": pickle-free memory-mapped store; "faiss": legacy index.faiss + index.pkl
+    VECTOR_STORE_FORMAT = os.getenv("VECTOR_STORE_FORMAT", "mmap")
     MODEL_PATH = os.path.join(DATA_DIR, "models")
 
+    EMBEDDING_MODEL = os.getenv(
+        "EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2"
+    )
+    # "torch": EMBEDDING_MODEL at full precision; "onnx-int8": EMBEDDING_MODEL
+    # exported by tools/embedding_backend.py; "small": EMBEDDING_SMALL_MODEL.
+    # The vector store is rebuilt when it was made by a different backend.
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+    EMBEDDING_SMALL_MODEL = os.getenv("EMBEDDING_SMALL_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", os.path.join(MODEL_PATH, "onnx"))
+    EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))  # 0 = ONNX Runtime default
+    # Hybrid retrieval: dense + BM25 candidates merged by reciprocal rank fusion
+    RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "3"))  # RAG candidates, before context building
+    SLOT_RETRIEVAL_K = int(os.getenv("SLOT_RETRIEVAL_K", "3"))  # schedule/contact/complaint lookups
+    RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "10"))  # candidates per side
+    RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+
+    # Prompt context (chat/context_builder.py): overlapping chunks merged,
+    # near-duplicates dropped, MMR selection up to an estimated-token budget
+    CONTEXT_TOKENS_RAG = int(os.getenv("CONTEXT_TOKENS_RAG", "250"))
+    CONTEXT_TOKENS_SLOT = int(os.getenv("CONTEXT_TOKENS_SLOT", "300"))
+    CONTEXT_TOKENS_SUGGESTIONS = int(os.getenv("CONTEXT_TOKENS_SUGGESTIONS", "400"))
+    CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+    CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+    # Content-addressed embedding cache (memory LRU + float32 files on disk)
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1"
+    EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(DATA_DIR, "embedding_cache"))
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "4096"))
+    # records per disk file before it is rotated to <model>.old.bin (0 = unbounded)
+    EMBEDDING_CACHE_DISK_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_ENTRIES", "20000"))
+    # Concurrent query embeddings (cache misses) are coalesced into batches
+    EMBEDDING_BATCHING_ENABLED = os.getenv("EMBEDDING_BATCHING_ENABLED", "1") == "1"
+    EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+    EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "2"))
+
+    # Shared OpenRouter HTTP pool: timeouts, retries and circuit breaker
+    OPENROUTER_POOL_SIZE = int(os.getenv("OPENROUTER_POOL_SIZE", "10"))
+    OPENROUTER_CONNECT_TIMEOUT = float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", "3.05"))
+    OPENROUTER_READ_TIMEOUT = float(os.getenv("OPENROUTER_READ_TIMEOUT", "30"))
+    OPENROUTER_MAX_RETRIES = int(os.getenv("OPENROUTER_MAX_RETRIES", "2"))
+    OPENROUTER_BACKOFF_BASE = float(os.getenv("OPENROUTER_BACKOFF_BASE", "0.5"))
+    OPENROUTER_BACKOFF_MAX = float(os.getenv("OPENROUTER_BACKOFF_MAX", "4"))
+    OPENROUTER_RETRY_AFTER_MAX = float(os.getenv("OPENROUTER_RETRY_AFTER_MAX", "10"))
+    OPENROUTER_BREAKER_THRESHOLD = int(os.getenv("OPENROUTER_BREAKER_THRESHOLD", "5"))
+    OPENROUTER_BREAKER_RESET = float(os.getenv("OPENROUTER_BREAKER_RESET", "30"))
+
+    # Model fallback (chat/model_router.py): "model@budget_seconds" list, best first;
+    # empty = OPENROUTER_MODEL alone. A call moves on to the next model after
+    # OPENROUTER_HEDGE_DELAY seconds without an answer (0 = only on failure or a
+    # blown budget), keeps the first good answer and cancels the rest.
+    OPENROUTER_MODELS = os.getenv("OPENROUTER_MODELS", "")
+    OPENROUTER_MODEL_BUDGET = float(os.getenv("OPENROUTER_MODEL_BUDGET", "12"))  # when a model has no @budget
+    OPENROUTER_HEDGE_DELAY = float(os.getenv("OPENROUTER_HEDGE_DELAY", "4"))
+    OPENROUTER_MAX_ATTEMPTS = int(os.getenv("OPENROUTER_MAX_ATTEMPTS", "3"))  # models raced per call
+    # Per-model EWMA latency and error rate reorder the list: a model over its
+    # budget or error rate goes to the back until it recovers
+    OPENROUTER_STATS_ALPHA = float(os.getenv("OPENROUTER_STATS_ALPHA", "0.2"))
+    OPENROUTER_MAX_ERROR_RATE = float(os.getenv("OPENROUTER_MAX_ERROR_RATE", "0.5"))
+    OPENROUTER_RECOVERY_AFTER = float(os.getenv("OPENROUTER_RECOVERY_AFTER", "60"))
+
+    # Upstream admission (chat/admission.py): concurrent OpenRouter requests per
+    # process (0 = no cap), callers allowed to wait for a slot, and for how long
+    OPENROUTER_MAX_CONCURRENT = int(os.getenv("OPENROUTER_MAX_CONCURRENT", "8"))
+    OPENROUTER_QUEUE_SIZE = int(os.getenv("OPENROUTER_QUEUE_SIZE", "16"))
+    OPENROUTER_QUEUE_TIMEOUT = float(os.getenv("OPENROUTER_QUEUE_TIMEOUT", "5"))
+    # Per-session limit on /chat and /chat/stream: CHAT_RATE_BURST turns at once,
+    # then CHAT_RATE_PER_MINUTE; 0 = unlimited
+    CHAT_RATE_PER_MINUTE = float(os.getenv("CHAT_RATE_PER_MINUTE", "20"))
+    CHAT_RATE_BURST = int(os.getenv("CHAT_RATE_BURST", "5"))
+
+    # Keyword groups behind ChatProcessor's _is_* heuristics (chat/rules.py)
+    RULES_PATH = os.path.join(DATA_DIR, "rules", "keywords.json")
+
+    # Local embedding intent classifier; below the threshold we ask the LLM
+    INTENT_CLASSIFIER_ENABLED = os.getenv("INTENT_CLASSIFIER_ENABLED", "1") == "1"
+    INTENT_EXEMPLARS_PATH = os.path.join(DATA_DIR, "intents", "exemplars.json")
+    INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.6"))
+
+    # Curated KB question -> answer pairs answered directly (chat/faq_index.py);
+    # matches within FAQ_NEAR_MISS below the threshold are logged for tuning
+    FAQ_ENABLED = os.getenv("FAQ_ENABLED", "1") == "1"
+    FAQ_THRESHOLD = float(os.getenv("FAQ_THRESHOLD", "0.9"))
+    FAQ_NEAR_MISS = float(os.getenv("FAQ_NEAR_MISS", "0.05"))
+
+    # Semantic answer cache in front of ChatProcessor.process_message
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+    ANSWER_CACHE_NEAR_MISS = float(os.getenv("ANSWER_CACHE_NEAR_MISS", "0.05"))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(60 * 60 * 6)))
+
+    # Quick-action answers and suggestions precomputed per index version and
+    # served from quick_actions.json (chat/quick_actions.py); 0 = always run the pipeline
+    QUICK_ACTIONS_PRECOMPUTE = os.getenv("QUICK_ACTIONS_PRECOMPUTE", "1") == "1"
+
+    # Follow-up suggestions are generated off the /chat request thread
+    SUGGESTION_WORKERS = int(os.getenv("SUGGESTION_WORKERS", "2"))
+    SUGGESTION_JOB_TTL = int(os.getenv("SUGGESTION_JOB_TTL", "300"))
+
+    # Per-session conversation memory: hot in-process tier + write-behind SQLite
+    # (DATABASE_URL when it is a sqlite:/// URL)
+    SESSION_MEMORY_ENABLED = os.getenv("SESSION_MEMORY_ENABLED", "1") == "1"
+    SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "6"))
+    SESSION_MAX_CHARS = int(os.getenv("SESSION_MAX_CHARS", "4000"))
+    SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "20000"))
+    SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", str(30 * 60)))
+    SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "1.0"))
+    SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "300"))  # prompt budget
+
+    # Turns slower than this log their per-stage breakdown (chat/metrics.py); 0 = never
+    SLOW_TURN_SECONDS = float(os.getenv("SLOW_TURN_SECONDS", "5"))
+
+    # When the chat pipeline is built (chat/resources.py warm_up): "lazy" on the
+    # first request, "background" in a thread at app start, "eager" before the
+    # app is returned. Under gunicorn, gunicorn.conf.py warms the master before
+    # forking; keep "lazy" there, a background thread does not survive fork.
+    WARM_START = os.getenv("WARM_START", "lazy")
+
     SQLALCHEMY_DATABASE_URI = os.getenv(
         "DATABASE_URL", "sqlite:///" + os.path.join(DATA_DIR, "database.db")
     )
@@ -1,13 +1,74 @@
 # cq_manager/routes.py
-from flask import render_template, request, jsonify, session, redirect, url_for
+from flask import (render_template, request, jsonify, session, redirect, url_for,
+                   Response, stream_with_context)
+import json
+import math
+import os
+import time
 import uuid
 
 from cq_files.cq_manager import chatbot_bp
-from cq_files.cq_manager.chat.processor import ChatProcessor
-from cq_files.cq_manager.chat.suggestions_generator import SuggestionsGenerator
+from cq_files.cq_manager.chat import metrics
+from cq_files.cq_manager.chat.quick_actions import QUICK_ACTIONS
+from cq_files.cq_manager.chat.resources import get_registry, readiness
 
-chat_processor = ChatProcessor()
-suggestions_generator = SuggestionsGenerator()
+STARTED = time.time()
+
+UNKNOWN_ACTION_RESPONSE = "I didn't recognize that quick action. Try asking a question."
+UNAVAILABLE_RESPONSE = "The assistant is starting up or unavailable. Please try again shortly."
+RATE_LIMITED_RESPONSE = "You're sending messages faster than I can answer. Please wait a moment."
+
+
+# Built on first use (or by warm_up() in a pre-fork master); both share one
+# embedding model, vector store and LLM client via the registry
+def get_chat_processor():
+    return get_registry().get("chat_processor")
+
+
+def get_suggestions_generator():
+    return get_registry().get("suggestions_generator")
+
+
+def quick_action_answer(chat_processor, action: str, session_id: str):
+    """
+    The precomputed answer for a quick action (chat/quick_actions.py) as
+    {"response", "suggestions", ...}, or None to run the pipeline.
+    """
+    store = get_registry().get("quick_actions")
+    entry = store.get(action) if store is not None else None
+    if entry is None:
+        return None
+    trace = metrics.start_turn()
+    metrics.set_branch("quick_action")
+    # a follow-up after the click still sees it in the conversation
+    chat_processor._remember(session_id, entry["prompt"], entry["response"])
+    metrics.finish_turn(trace)
+    return entry
+
+
+def rate_limit(session_id: str, route: str):
+    """None if this session may send another turn, else the seconds until it may."""
+    limiter = get_registry().get("session_rate_limiter")
+    if limiter is None:
+        return None
+    allowed, retry_after = limiter.allow(session_id)
+    if allowed:
+        return None
+    metrics.SESSION_RATE_LIMITED.inc(route)
+    return max(1, math.ceil(retry_after))
+
+
+def _rate_limited_response(retry_after: int):
+    response = jsonify({"error": RATE_LIMITED_RESPONSE, "retry_after": retry_after})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 429
+
+
+def _session_id() -> str:
+    # conversation memory is keyed on this, so keep it stable across requests
+    if "session_id" not in session:
+        session["session_id"] = str(uuid.uuid4())
+    return session["session_id"]
 
 
 @chatbot_bp.route("/")
@@ -16,8 +77,7 @@ def index():
 
 @chatbot_bp.route("/chatbot-dashboard")
 def chatbot_dashboard():
-    if "session_id" not in session:
-        session["session_id"] = str(uuid.uuid4())
+    _session_id()
     return render_template("chat.html")
 
 
@@ -26,28 +86,187 @@ def process_chat():
     data = request.get_json(silent=True) or {}
     user_message = data.get("message")
     action = data.get("action")
-    session_id = session.get("session_id", str(uuid.uuid4()))
+    session_id = _session_id()
 
     if not user_message and not action:
         return jsonify({"error": "No message or action provided"}), 400
 
+    retry_after = rate_limit(session_id, "chat")
+    if retry_after is not None:
+        return _rate_limited_response(retry_after)
+
+    try:
+        chat_processor, suggestions_generator = get_chat_processor(), get_suggestions_generator()
+    except Exception as e:
+        print(f"/chat unavailable: {e}")
+        return jsonify({"error": UNAVAILABLE_RESPONSE}), 503
+
     try:
         if action:
-            if action == "schedule":
-                bot_text = chat_processor.process_message("Show me my waste collection schedule", session_id)
-            elif action == "recycle-guide":
-                bot_text = chat_processor.process_message("What's the guide for recycling different materials?", session_id)
-            elif action == "report-issue":
-                bot_text = chat_processor.process_message("I want to report an issue with waste collection", session_id)
-            elif action == "tips":
-                bot_text = chat_processor.process_message("Share some eco-friendly waste management tips", session_id)
+            if action in QUICK_ACTIONS:
+                cached = quick_action_answer(chat_processor, action, session_id)
+                if cached is not None:
+                    return jsonify({"response": cached["response"], "suggestions": cached["suggestions"],
+                                    "suggestions_id": None})
+                bot_text = chat_processor.process_message(QUICK_ACTIONS[action], session_id)
             else:
-                bot_text = "I didn't recognize that quick action. Try asking a question."
+                bot_text = UNKNOWN_ACTION_RESPONSE
         else:
             bot_text = chat_processor.process_message(user_message, session_id)
 
-        suggs = suggestions_generator.generate_suggestions(user_message or action, bot_text)
-        return jsonify({"response": bot_text, "suggestions": suggs})
+        # suggestions are fetched separately via /chat/suggestions/<id>
+        suggestions_id = suggestions_generator.submit(user_message or action, bot_text)
+        return jsonify({"response": bot_text, "suggestions": [], "suggestions_id": suggestions_id})
     except Exception as e:
         print(f"/chat error: {e}")
         return jsonify({"error": "An error occurred processing your request"}), 500
+
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+@chatbot_bp.route("/chat/stream", methods=["POST"])
+def stream_chat():
+    """
+    Server-Sent Events version of /chat: `token` events carry answer text as
+    it is generated, then one `done` event with the full response and the
+    suggestions job id (or an `error` event). A precomputed quick action is
+    one `token` event and a `done` event carrying its suggestions.
+    """
+    data = request.get_json(silent=True) or {}
+    user_message = data.get("message")
+    action = data.get("action")
+    session_id = _session_id()
+
+    if not user_message and not action:
+        return jsonify({"error": "No message or action provided"}), 400
+
+    retry_after = rate_limit(session_id, "chat_stream")
+    if retry_after is not None:
+        return _rate_limited_response(retry_after)
+
+    try:
+        chat_processor, suggestions_generator = get_chat_processor(), get_suggestions_generator()
+    except Exception as e:
+        print(f"/chat/stream unavailable: {e}")
+        return jsonify({"error": UNAVAILABLE_RESPONSE}), 503
+
+    def generate():
+        parts = []
+        try:
+            cached = quick_action_answer(chat_processor, action, session_id) if action in QUICK_ACTIONS else None
+            if cached is not None:
+                yield _sse("token", {"text": cached["response"]})
+                yield _sse("done", {"response": cached["response"], "suggestions": cached["suggestions"],
+                                    "suggestions_id": None})
+                return
+            if action and action not in QUICK_ACTIONS:
+                pieces = iter([UNKNOWN_ACTION_RESPONSE])
+            else:
+                pieces = chat_processor.stream_message(QUICK_ACTIONS.get(action, user_message), session_id)
+            for piece in pieces:
+                parts.append(piece)
+                yield _sse("token", {"text": piece})
+
+            bot_text = "".join(parts)
+            suggestions_id = suggestions_generator.submit(user_message or action, bot_text)
+            yield _sse("done", {"response": bot_text, "suggestions_id": suggestions_id})
+        except Exception as e:
+            print(f"/chat/stream error: {e}")
+            yield _sse("error", {"error": "An error occurred processing your request"})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@chatbot_bp.route("/chat/suggestions/<job_id>", methods=["GET"])
+def chat_suggestions(job_id):
+    status, suggs = get_registry().get("suggestion_jobs").status(job_id)
+    if status == "pending":
+        return jsonify({"status": status, "suggestions": []}), 202
+    if status in ("unknown", "error"):
+        # expired, or lost with the worker that ran it: the defaults beat no suggestions
+        suggs = get_suggestions_generator()._generate_default_3r_suggestions(3)
+    if status == "unknown":
+        return jsonify({"status": status, "suggestions": suggs}), 404
+    return jsonify({"status": "ready", "suggestions": suggs})
+
+
+@chatbot_bp.route("/healthz", methods=["GET"])
+def healthz():
+    # liveness only: the process is up and serving requests
+    return jsonify({"status": "ok", "pid": os.getpid(), "uptime_s": round(time.time() - STARTED, 1)})
+
+
+@chatbot_bp.route("/readyz", methods=["GET"])
+def readyz():
+    # ready once the chat pipeline is built; lists every resource's state
+    state = readiness()
+    return jsonify(state), 200 if state["ready"] else 503
+
+
+@chatbot_bp.route("/chat/cache-stats", methods=["GET"])
+def answer_cache_stats():
+    return jsonify(get_registry().get("answer_cache").stats())
+
+
+@chatbot_bp.route("/chat/memory-stats", methods=["GET"])
+def session_memory_stats():
+    return jsonify(get_registry().get("session_memory").stats())
+
+
+@chatbot_bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    # per-process; scrape every worker
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@chatbot_bp.route("/chat/faq-stats", methods=["GET"])
+def faq_stats():
+    faq_index = get_registry().get("faq_index")
+    if faq_index is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(faq_index.stats(), enabled=True))
+
+
+@chatbot_bp.route("/chat/quick-actions-stats", methods=["GET"])
+def quick_actions_stats():
+    store = get_registry().get("quick_actions")
+    if store is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(store.stats(), enabled=True))
+
+
+@chatbot_bp.route("/chat/context-stats", methods=["GET"])
+def context_stats():
+    return jsonify(get_registry().get("context_builder").stats())
+
+
+@chatbot_bp.route("/chat/llm-stats", methods=["GET"])
+def llm_stats():
+    router = get_registry().get("llm_handler").router
+    if router is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(router.stats(), enabled=True))
+
+
+@chatbot_bp.route("/chat/admission-stats", methods=["GET"])
+def admission_stats():
+    registry = get_registry()
+    upstream, sessions = registry.get("upstream_limiter"), registry.get("session_rate_limiter")
+    return jsonify({
+        "upstream": upstream.stats() if upstream is not None else {"enabled": False},
+        "sessions": sessions.stats() if sessions is not None else {"enabled": False},
+    })
+
+
+@chatbot_bp.route("/chat/embedding-stats", methods=["GET"])
+def embedding_cache_stats():
+    embeddings = get_registry().get("embeddings")
+    if not hasattr(embeddings, "stats"):
+        return jsonify({"enabled": False})
+    return jsonify(dict(embeddings.stats(), enabled=True))
@@ -0,0 +1,40 @@
+# gunicorn.conf.py (project root)
+#
+# Pre-fork serving: the master imports the app and builds the chat pipeline
+# once, then forks. Workers share the model weights, vector store and
+# indexes copy-on-write instead of each loading their own.
+#
+#   gunicorn -c cq_files/gunicorn.conf.py cq_files.app:app
+import gc
+import os
+import sys
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = True
+
+
+def when_ready(server):
+    from cq_files.cq_manager.chat.resources import warm_up
+
+    # threads started here would not survive the fork: background work waits for post_worker_init
+    warm_up(background=False)
+    # move everything allocated so far out of the collector's reach: a gc pass
+    # in a worker would otherwise touch (and so copy) every shared object
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # torch's intra-op pool sized for the whole machine oversubscribes the
+    # CPU once several workers run it; the pool itself is created lazily
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(int(os.getenv("TORCH_THREADS", "1")))
+
+
+def post_worker_init(worker):
+    from cq_files.cq_manager.chat.resources import start_background
+
+    start_background()
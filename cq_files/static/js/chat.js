@@ -38,6 +38,7 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         updateScrollButtonVisibility();
+        return messageText;
     }
 
     function showTypingIndicator() {
@@ -82,6 +83,14 @@ document.addEventListener('DOMContentLoaded', function() {
 
         showTypingIndicator();
 
+        if (window.ReadableStream && window.TextDecoder) {
+            streamMessage(message);
+        } else {
+            requestMessage(message);
+        }
+    }
+
+    function requestMessage(message) {
         fetch('/chat', {
             method: 'POST',
             headers: {
@@ -89,12 +98,15 @@ document.addEventListener('DOMContentLoaded', function() {
             },
             body: JSON.stringify({ message: message })
         })
-        .then(response => response.json())
-        .then(data => {
+        .then(response => response.json().then(data => ({ status: response.status, data: data })))
+        .then(({ status, data }) => {
             removeTypingIndicator();
 
             if (data.error) {
-                addMessage("Sorry, there was an error processing your request. Please try again.", false);
+                // 429 (rate limited) and 503 (starting up) carry a message meant for the user
+                addMessage(status === 429 || status === 503
+                    ? data.error
+                    : "Sorry, there was an error processing your request. Please try again.", false);
                 return;
             }
 
@@ -102,6 +114,8 @@ document.addEventListener('DOMContentLoaded', function() {
 
             if (data.suggestions && data.suggestions.length > 0) {
                 displaySuggestions(data.suggestions);
+            } else if (data.suggestions_id) {
+                pollSuggestions(data.suggestions_id);
             }
         })
         .catch(error => {
@@ -111,6 +125,138 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Reads the text/event-stream from /chat/stream and renders tokens as they arrive
+    function streamMessage(message) {
+        let messageText = null;
+        let answer = '';
+
+        function appendToken(text) {
+            if (!messageText) {
+                removeTypingIndicator();
+                messageText = addMessage('', false);
+            }
+            const stickToBottom = isScrolledToBottom();
+            answer += text;
+            messageText.innerHTML = answer.replace(/\n/g, '<br>');
+            if (stickToBottom) {
+                scrollToBottom();
+            }
+        }
+
+        function handleEvent(event, data) {
+            if (event === 'token') {
+                appendToken(data.text);
+            } else if (event === 'done') {
+                if (!messageText) {
+                    appendToken(data.response || '');
+                }
+                if (data.suggestions && data.suggestions.length > 0) {
+                    displaySuggestions(data.suggestions);
+                } else if (data.suggestions_id) {
+                    pollSuggestions(data.suggestions_id);
+                }
+            } else if (event === 'error') {
+                removeTypingIndicator();
+                addMessage("Sorry, there was an error processing your request. Please try again.", false);
+            }
+            updateScrollButtonVisibility();
+        }
+
+        fetch('/chat/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
+            },
+            body: JSON.stringify({ message: message })
+        })
+        .then(response => {
+            if (response.status === 429 || response.status === 503) {
+                return response.json().then(data => {
+                    removeTypingIndicator();
+                    messageText = addMessage(data.error, false);
+                });
+            }
+            if (!response.ok || !response.body) {
+                throw new Error(`Stream failed with status ${response.status}`);
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            function pump() {
+                return reader.read().then(({ done, value }) => {
+                    if (done) {
+                        removeTypingIndicator();
+                        return;
+                    }
+                    buffer += decoder.decode(value, { stream: true });
+
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+                        const frame = buffer.slice(0, boundary);
+                        buffer = buffer.slice(boundary + 2);
+
+                        let event = 'message';
+                        let data = '';
+                        frame.split('\n').forEach(line => {
+                            if (line.startsWith('event:')) {
+                                event = line.slice(6).trim();
+                            } else if (line.startsWith('data:')) {
+                                data += line.slice(5).trim();
+                            }
+                        });
+                        if (data) {
+                            handleEvent(event, JSON.parse(data));
+                        }
+                    }
+                    return pump();
+                });
+            }
+            return pump();
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            removeTypingIndicator();
+            if (!messageText) {
+                addMessage("Sorry, there was an error connecting to the server. Please try again later.", false);
+            }
+        });
+    }
+
+    // Suggestions are generated in the background after the answer is sent
+    function pollSuggestions(jobId, attempt = 0) {
+        const maxAttempts = 30;
+        const delay = Math.min(300 + attempt * 200, 1500);
+
+        setTimeout(() => {
+            fetch(`/chat/suggestions/${encodeURIComponent(jobId)}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.status === 'pending') {
+                    if (attempt + 1 < maxAttempts) {
+                        pollSuggestions(jobId, attempt + 1);
+                    }
+                    return;
+                }
+
+                // an unknown (expired) job still comes back with default suggestions
+                if (data.suggestions && data.suggestions.length > 0) {
+                    displaySuggestions(data.suggestions);
+                } else if (data.status !== 'ready') {
+                    console.warn('Suggestions unavailable:', data.status);
+                }
+            })
+            .catch(error => {
+                console.error('Suggestions error:', error);
+                if (attempt + 1 < maxAttempts) {
+                    pollSuggestions(jobId, attempt + 1);
+                }
+            });
+        }, delay);
+    }
+
     function displaySuggestions(suggestions) {
         const oldSuggestions = document.querySelectorAll('.dynamic-suggestion');
         oldSuggestions.forEach(suggestion => suggestion.remove());
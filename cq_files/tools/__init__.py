@@ -0,0 +1,42 @@
+# tools/__init__.py
+import importlib.util
+import os
+import sys
+
+CHAT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cq_manager", "chat")
+
+
+def load_chat_module(name: str):
+    """
+    Import cq_manager/chat/<name>.py on its own. Importing it through the
+    package would run cq_manager/__init__, which registers the routes and
+    builds the whole chat pipeline. Only for modules without package imports.
+    """
+    full_name = f"cq_tools_{name}"
+    if full_name in sys.modules:
+        return sys.modules[full_name]
+    spec = importlib.util.spec_from_file_location(full_name, os.path.join(CHAT_DIR, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[full_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def memory_mb() -> dict:
+    """RSS plus its private/shared split (Linux smaps_rollup), in MB."""
+    out = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"):
+                    out[key] = int(rest.split()[0]) / 1024
+    except OSError:
+        import resource
+        return {"rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    return {
+        "rss": round(out.get("Rss", 0), 1),
+        "pss": round(out.get("Pss", 0), 1),
+        "private": round(out.get("Private_Clean", 0) + out.get("Private_Dirty", 0), 1),
+        "shared": round(out.get("Shared_Clean", 0) + out.get("Shared_Dirty", 0), 1),
+    }
@@ -0,0 +1,230 @@
+# tools/bench_cold_start.py
+"""
+Cold-start benchmark: how long a fresh process takes to import the app,
+build the chat pipeline (warm_up) and answer its first turn, and what
+each worker costs in memory with and without a pre-fork warm-up.
+
+    python -m cq_files.tools.bench_cold_start [--runs 3] [--workers 4] [--top 15] [--out cold.json]
+
+  - imports: `python -X importtime -c "import cq_files.app"`, self time
+    summed per top-level package. With lazy resources this is Flask and
+    the app's own modules; langchain, torch and the models load in warm-up.
+  - phases: --runs fresh interpreters, each timing import, warm-up (with
+    the registry's per-resource seconds and RSS), the first turn and a
+    second one. OpenRouter is the stub server (tools/stub_openrouter.py).
+  - workers (--workers N): N forked workers after a warm-up in the master
+    (gunicorn.conf.py's preload) against N workers that each build their
+    own pipeline, summing PSS (proportional set size) over the processes,
+    so shared pages are counted once.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from cq_files.tools import memory_mb
+from cq_files.tools.stub_openrouter import StubOpenRouter
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RESULT_PREFIX = "COLD_START_RESULT "
+QUESTION = "How do I compost kitchen scraps at home?"  # not a curated FAQ question: a full RAG turn
+
+
+# ------------------------
+# Import-time breakdown
+# ------------------------
+def import_breakdown(env: dict, top: int) -> dict:
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import cq_files.app"],
+                          cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"importing the app failed:\n{proc.stderr[-2000:]}")
+    per_package = defaultdict(int)
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        per_package[name.split(".")[0]] += int(self_us)
+        if name.strip() == "cq_files.app":
+            total_us = int(cumulative_us)
+    ranked = sorted(per_package.items(), key=lambda kv: kv[1], reverse=True)
+    return {
+        "total_ms": round(total_us / 1e3, 1),
+        "packages": {name: round(us / 1e3, 1) for name, us in ranked[:top]},
+        "other_ms": round(sum(us for _, us in ranked[top:]) / 1e3, 1),
+    }
+
+
+# ------------------------
+# Child process: one cold start
+# ------------------------
+def _turn(chat_processor, session_id: str) -> float:
+    t0 = time.perf_counter()
+    chat_processor.process_message(QUESTION, session_id)
+    return time.perf_counter() - t0
+
+
+def child_phases():
+    t0 = time.perf_counter()
+    import cq_files.app  # noqa: F401
+    import_s = time.perf_counter() - t0
+    from cq_files.cq_manager.chat.resources import get_registry, readiness, warm_up
+    from cq_files.cq_manager.routes import get_chat_processor
+    ready_before = readiness()["ready"]
+
+    t0 = time.perf_counter()
+    ok = warm_up(background=False)  # keep quick-action generation out of the turn timings
+    warm_up_s = time.perf_counter() - t0
+    chat_processor = get_chat_processor()
+    first_s = _turn(chat_processor, "cold-start")
+    second_s = _turn(chat_processor, "cold-start-2")
+    print(RESULT_PREFIX + json.dumps({
+        "import_s": round(import_s, 3),
+        "warm_up_s": round(warm_up_s, 3),
+        "warm_up_ok": ok,
+        "ready_before_warm_up": ready_before,
+        "first_turn_s": round(first_s, 3),
+        "second_turn_s": round(second_s, 3),
+        "memory_mb": memory_mb(),
+        "resources": get_registry().report(),
+    }))
+
+
+def _fork_workers(n: int, body) -> list:
+    """Fork n workers that run body() and report memory; all stay alive until everyone has."""
+    release_r, release_w = os.pipe()
+    reports, pids = [], []
+    for _ in range(n):
+        report_r, report_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(release_w)
+            os.close(report_r)
+            try:
+                body()
+                payload = {"pid": os.getpid(), "memory_mb": memory_mb()}
+            except Exception as e:
+                payload = {"pid": os.getpid(), "error": f"{type(e).__name__}: {e}"}
+            os.write(report_w, json.dumps(payload).encode())
+            os.close(report_w)
+            os.read(release_r, 1)  # returns once the master closes its end
+            os._exit(0)
+        os.close(report_w)
+        pids.append((pid, report_r))
+    for pid, report_r in pids:
+        with os.fdopen(report_r) as f:
+            reports.append(json.loads(f.read() or "{}"))
+    os.close(release_w)
+    for pid, _ in pids:
+        os.waitpid(pid, 0)
+    os.close(release_r)
+    return reports
+
+
+def child_workers(n: int, preload: bool):
+    if preload:
+        import gc
+
+        import cq_files.app  # noqa: F401
+        from cq_files.cq_manager.chat.resources import warm_up
+        from cq_files.cq_manager.routes import get_chat_processor
+        warm_up(background=False)
+        gc.freeze()  # as gunicorn.conf.py's when_ready
+
+        def body():
+            _turn(get_chat_processor(), f"worker-{os.getpid()}")
+    else:
+        def body():
+            import cq_files.app  # noqa: F401
+            from cq_files.cq_manager.chat.resources import warm_up
+            from cq_files.cq_manager.routes import get_chat_processor
+            warm_up(background=False)
+            _turn(get_chat_processor(), f"worker-{os.getpid()}")
+
+    workers = _fork_workers(n, body)
+    master = memory_mb()
+    errors = [w["error"] for w in workers if "error" in w]
+    pss = [w["memory_mb"].get("pss", w["memory_mb"].get("rss", 0.0)) for w in workers if "memory_mb" in w]
+    print(RESULT_PREFIX + json.dumps({
+        "mode": "preload" if preload else "per-worker",
+        "workers": n,
+        "master_pss_mb": master.get("pss", master.get("rss")),
+        "worker_pss_mb": [round(p, 1) for p in pss],
+        "total_pss_mb": round(sum(pss) + master.get("pss", master.get("rss", 0.0)), 1),
+        "worker_private_mb": [w["memory_mb"].get("private") for w in workers if "memory_mb" in w],
+        "errors": errors,
+    }))
+
+
+# ------------------------
+# Driver
+# ------------------------
+def run_child(env: dict, *args) -> dict:
+    proc = subprocess.run([sys.executable, "-m", "cq_files.tools.bench_cold_start", "--child", *args],
+                          cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise SystemExit(f"cold-start child failed ({proc.returncode}):\n{(proc.stdout + proc.stderr)[-3000:]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters for the phase timings")
+    parser.add_argument("--workers", type=int, default=0, help="also compare preload vs per-worker memory")
+    parser.add_argument("--top", type=int, default=15, help="packages listed in the import breakdown")
+    parser.add_argument("--latency", type=float, default=0.0, help="stub seconds before the first byte")
+    parser.add_argument("--out", help="also write the results as JSON")
+    parser.add_argument("--child", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        if args.child and args.child[0] == "workers":
+            child_workers(int(args.child[1]), args.child[2] == "preload")
+        else:
+            child_phases()
+        return
+
+    stub = StubOpenRouter(latency=args.latency).start()
+    env = dict(os.environ, OPENROUTER_BASE_URL=stub.url, WARM_START="lazy")
+    env.setdefault("OPENROUTER_API_KEY", "bench")
+    env.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-cold-"), "chat.db"))
+
+    imports = import_breakdown(env, args.top)
+    print(f"[cold-start] import cq_files.app: {imports['total_ms']} ms")
+    for name, ms in imports["packages"].items():
+        print(f"  {name:<28} {ms:>9.1f} ms")
+    print(f"  {'(other)':<28} {imports['other_ms']:>9.1f} ms")
+
+    runs = [run_child(env) for _ in range(args.runs)]
+    phases = {key: round(statistics.median(r[key] for r in runs), 3)
+              for key in ("import_s", "warm_up_s", "first_turn_s", "second_turn_s")}
+    print(f"[cold-start] median of {len(runs)} runs: " + "  ".join(f"{k} {v}" for k, v in phases.items()))
+    print(f"  ready before warm-up: {runs[-1]['ready_before_warm_up']}  "
+          f"RSS after first turns: {runs[-1]['memory_mb'].get('rss')} MB")
+    for row in runs[-1]["resources"]:
+        print(f"  {row['resource']:<22} {row['seconds']:>7.2f}s  RSS +{row['rss_delta_mb']} MB")
+
+    workers = []
+    if args.workers:
+        for mode in ("preload", "per-worker"):
+            row = run_child(env, "workers", str(args.workers), mode)
+            workers.append(row)
+            print(f"[cold-start] {args.workers} workers, {mode:<10}: total PSS {row['total_pss_mb']} MB "
+                  f"(master {row['master_pss_mb']}, workers {row['worker_pss_mb']})"
+                  + (f" errors: {row['errors']}" if row["errors"] else ""))
+    stub.stop()
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"imports": imports, "phases": phases, "runs": runs, "workers": workers}, f, indent=1)
+        print(f"[cold-start] wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+# tools/bench_e2e.py
+"""
+Offline end-to-end latency benchmark. Starts the stub OpenRouter server
+(tools/stub_openrouter.py), points the app at it, then drives
+ChatProcessor.process_message and/or the /chat route with a corpus of
+questions (default: the quoted Q/A pairs in the knowledge base plus a few
+greetings, contact and off-topic messages) at each concurrency level.
+
+Per run it reports end-to-end and per-stage p50/p95/p99, LLM calls,
+embedding lookups and embeddings computed per turn, the branch mix and
+throughput, and writes everything to a JSON file for diffing across versions.
+Stages nest (plan and execute include retrieval and llm), so they do not
+add up to the total.
+
+    python -m cq_files.tools.bench_e2e [--concurrency 1,4,16] [--turns 200] [--latency 0.4]
+                                       [--target processor,route] [--out e2e.json]
+"""
+import argparse
+import contextvars
+import functools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from cq_files.tools import CHAT_DIR, load_chat_module
+from cq_files.tools.stub_openrouter import StubOpenRouter
+
+KB_PATH = os.path.join(os.path.dirname(CHAT_DIR), "data", "knowledge_base")
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EXTRA_MESSAGES = [
+    "hi",
+    "thanks a lot",
+    "What is the phone number of the municipal council?",
+    "When is e-waste collected?",
+    "What day is inorganic waste collection?",
+    "My garbage was not collected this week",
+    "Share some eco-friendly waste management tips",
+    "Who won the football match yesterday?",
+]
+
+
+def percentiles(values: List[float]) -> dict:
+    if not values:
+        return {"n": 0}
+    s = sorted(values)
+
+    def rank(p):
+        return s[min(len(s) - 1, max(0, int(round(p / 100.0 * len(s) + 0.5)) - 1))]
+
+    return {
+        "n": len(s),
+        "mean_ms": round(sum(s) / len(s) * 1e3, 2),
+        "p50_ms": round(rank(50) * 1e3, 2),
+        "p95_ms": round(rank(95) * 1e3, 2),
+        "p99_ms": round(rank(99) * 1e3, 2),
+        "max_ms": round(s[-1] * 1e3, 2),
+    }
+
+
+class TurnProbe:
+    """
+    Wraps pipeline methods (on their classes) to record, for the turn running
+    in the current context, time per stage, call counts and the branch taken.
+    Calls made outside a turn (background suggestion jobs) are not recorded.
+    """
+
+    def __init__(self):
+        self._current: contextvars.ContextVar = contextvars.ContextVar("bench_turn", default=None)
+
+    def begin(self) -> dict:
+        record = {"stages": defaultdict(float), "calls": Counter(), "branch": None, "active": set()}
+        self._current.set(record)
+        return record
+
+    def end(self):
+        self._current.set(None)
+
+    def wrap(self, owner, name: str, stage: str, on_result: Optional[Callable[[dict, tuple, object], None]] = None):
+        original = getattr(owner, name)
+        probe = self
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            record = probe._current.get()
+            if record is None or stage in record["active"]:
+                # outside a turn, or nested in the same stage (embed_query -> embed_documents)
+                return original(*args, **kwargs)
+            record["active"].add(stage)
+            t0 = time.perf_counter()
+            try:
+                result = original(*args, **kwargs)
+            finally:
+                record["active"].discard(stage)
+                record["stages"][stage] += time.perf_counter() - t0
+                record["calls"][stage] += 1
+            if on_result is not None:
+                on_result(record, args, result)
+            return result
+
+        setattr(owner, name, wrapper)
+
+
+def _set_branch(branch: Callable[[object], Optional[str]]):
+    def on_result(record, args, result):
+        value = branch(result)
+        if value and record["branch"] is None:
+            record["branch"] = value
+    return on_result
+
+
+def _count_texts(record, args, result):
+    # embed_documents(self, texts) -> one embedding per text; embed_query -> one
+    record["calls"]["embeddings_computed"] += len(args[1]) if isinstance(args[1], list) else 1
+
+
+def instrument(probe: TurnProbe, chat_processor):
+    from cq_files.cq_manager.chat.hybrid_retriever import HybridRetriever
+    from cq_files.cq_manager.chat.http_client import PooledHTTPClient
+    from cq_files.cq_manager.chat.processor import ChatProcessor
+
+    probe.wrap(ChatProcessor, "_with_history", "memory")
+    probe.wrap(ChatProcessor, "_table_plan", "table", _set_branch(lambda plan: plan and plan.branch))
+    probe.wrap(ChatProcessor, "_turn_vector", "embed_turn")
+    probe.wrap(ChatProcessor, "_cache_lookup", "cache_lookup",
+               _set_branch(lambda res: "cache_hit" if res[1] is not None else None))
+    probe.wrap(ChatProcessor, "_plan_response", "plan", _set_branch(lambda plan: plan.branch))
+    probe.wrap(ChatProcessor, "_execute_plan", "execute")
+    probe.wrap(HybridRetriever, "search", "retrieval")
+    probe.wrap(PooledHTTPClient, "post", "llm")
+
+    # lookups go through the cache wrapper; the model underneath only sees misses
+    embeddings = chat_processor.embeddings
+    model = getattr(embeddings, "base", None)
+    probe.wrap(type(embeddings), "embed_query", "embedding_lookup")
+    probe.wrap(type(embeddings), "embed_documents", "embedding_lookup")
+    if model is not None:
+        probe.wrap(type(model), "embed_query", "embed_model", _count_texts)
+        probe.wrap(type(model), "embed_documents", "embed_model", _count_texts)
+    else:
+        probe.wrap(type(embeddings), "embed_query", "embed_model", _count_texts)
+        probe.wrap(type(embeddings), "embed_documents", "embed_model", _count_texts)
+
+
+def load_corpus(path: Optional[str]) -> List[str]:
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    pairs = load_chat_module("kb_parsing").load_qa_pairs(KB_PATH)
+    return [p["question"] for p in pairs] + EXTRA_MESSAGES
+
+
+def git_revision() -> str:
+    try:
+        out = subprocess.run(["git", "-C", REPO_DIR, "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def run(target: str, send: Callable[[str, str, object], None], make_client: Callable[[], object],
+        probe: TurnProbe, questions: List[str], concurrency: int, stub: StubOpenRouter) -> dict:
+    run_id = uuid.uuid4().hex[:8]
+    records: List[dict] = []
+    errors = Counter()
+    lock = threading.Lock()
+    work = iter(questions)
+    work_lock = threading.Lock()
+
+    def client_loop(client_idx: int):
+        client = make_client()
+        session_id = f"bench-{run_id}-{client_idx}"
+        while True:
+            with work_lock:
+                question = next(work, None)
+            if question is None:
+                return
+            record = probe.begin()
+            t0 = time.perf_counter()
+            try:
+                send(question, session_id, client)
+            except Exception as e:
+                errors[type(e).__name__] += 1
+            record["total"] = time.perf_counter() - t0
+            probe.end()
+            with lock:
+                records.append(record)
+
+    stub_before = stub.stats()["requests"]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for f in [pool.submit(client_loop, i) for i in range(concurrency)]:
+            f.result()
+    wall = time.perf_counter() - t0
+    stub_requests = stub.stats()["requests"] - stub_before
+
+    turns = len(records) or 1
+    stage_names = sorted({s for r in records for s in r["stages"]})
+    llm_calls = sum(r["calls"]["llm"] for r in records)
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "turns": len(records),
+        "wall_s": round(wall, 3),
+        "throughput_tps": round(len(records) / wall, 2) if wall else None,
+        "latency": percentiles([r["total"] for r in records]),
+        "stages": {
+            name: dict(percentiles([r["stages"][name] for r in records if name in r["stages"]]),
+                       calls_per_turn=round(sum(r["calls"][name] for r in records) / turns, 3))
+            for name in stage_names
+        },
+        "llm_calls_per_turn": round(llm_calls / turns, 3),
+        "embedding_lookups_per_turn": round(sum(r["calls"]["embedding_lookup"] for r in records) / turns, 3),
+        "embeddings_computed_per_turn": round(sum(r["calls"]["embeddings_computed"] for r in records) / turns, 3),
+        # suggestion jobs and other work off the request path
+        "background_llm_calls": max(0, stub_requests - llm_calls),
+        "branches": dict(Counter(r["branch"] or "unknown" for r in records).most_common()),
+        "errors": dict(errors),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="processor,route", help="processor, route or both (comma separated)")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma separated client counts")
+    parser.add_argument("--turns", type=int, help="turns per run (default: one pass over the corpus)")
+    parser.add_argument("--corpus", help="file with one question per line (default: KB Q/A pairs)")
+    parser.add_argument("--latency", type=float, default=0.4, help="stub seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--mode", choices=["canned", "echo"], default="canned")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--keep-cache", action="store_true", help="don't clear the answer cache between runs")
+    parser.add_argument("--out", help="JSON results file (default: e2e-<git rev>.json)")
+    args = parser.parse_args(argv)
+
+    stub = StubOpenRouter(latency=args.latency, jitter=args.jitter, mode=args.mode,
+                          error_rate=args.error_rate).start()
+    # must be in place before the app reads its configuration
+    os.environ["OPENROUTER_BASE_URL"] = stub.url
+    os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-e2e-"), "chat.db"))
+
+    t0 = time.perf_counter()
+    from cq_files.app import app
+    from cq_files.cq_manager.chat.resources import get_registry
+    from cq_files.cq_manager.routes import get_chat_processor
+    chat_processor = get_chat_processor()
+    startup_s = time.perf_counter() - t0
+
+    probe = TurnProbe()
+    instrument(probe, chat_processor)
+    registry = get_registry()
+
+    corpus = load_corpus(args.corpus)
+    count = args.turns or len(corpus)
+    questions = [corpus[i % len(corpus)] for i in range(count)]
+
+    def send_processor(question, session_id, client):
+        chat_processor.process_message(question, session_id)
+
+    def send_route(question, session_id, client):
+        r = client.post("/chat", json={"message": question})
+        if r.status_code != 200:
+            raise RuntimeError(f"HTTP {r.status_code}")
+
+    targets = {
+        "processor": (send_processor, lambda: None),
+        "route": (send_route, app.test_client),
+    }
+
+    # warm-up: lazy resources (intent classifier, HTTP pool) load outside the timed runs
+    for question in corpus[:5]:
+        chat_processor.process_message(question, "bench-warmup")
+
+    results = []
+    for target in [t.strip() for t in args.target.split(",") if t.strip()]:
+        send, make_client = targets[target]
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            if not args.keep_cache:
+                registry.get("answer_cache").clear("benchmark run")
+            row = run(target, send, make_client, probe, questions, concurrency, stub)
+            results.append(row)
+            lat = row["latency"]
+            print(f"[bench] {target:<9} c={concurrency:<3} {row['throughput_tps']:>7} turns/s  "
+                  f"p50 {lat['p50_ms']:>8} ms  p95 {lat['p95_ms']:>8} ms  p99 {lat['p99_ms']:>8} ms  "
+                  f"llm/turn {row['llm_calls_per_turn']:<5} emb/turn {row['embeddings_computed_per_turn']}")
+
+    revision = git_revision()
+    out = args.out or f"e2e-{revision}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({
+            "revision": revision,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "startup_s": round(startup_s, 3),
+            "stub": stub.settings(),
+            "corpus_size": len(corpus),
+            "results": results,
+        }, f, indent=1)
+    print(f"[bench] wrote {out}")
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# tools/bench_embedding_batcher.py
+"""
+Throughput and latency of query embeddings at several concurrency levels,
+direct model calls against BatchingEmbeddings.
+
+    python -m cq_files.tools.bench_embedding_batcher [--model NAME] [--concurrency 1,2,4,8,16,32]
+    python -m cq_files.tools.bench_embedding_batcher --synthetic [--overhead-ms 8 --per-item-ms 0.6]
+
+Each level runs `--requests` embed_query calls per thread over distinct
+knowledge-base questions. `--synthetic` replaces the model with one that
+costs a fixed overhead plus a per-text cost per call and runs one call at a
+time, roughly how a CPU sentence-transformers model behaves, so the batcher
+can be measured without downloading a model.
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cq_files.tools import CHAT_DIR, load_chat_module
+
+KB_PATH = os.path.join(os.path.dirname(CHAT_DIR), "data", "knowledge_base")
+
+
+class SyntheticModel:
+    model_name = "synthetic"
+
+    def __init__(self, overhead: float, per_item: float, dim: int = 768):
+        self.overhead = overhead
+        self.per_item = per_item
+        self.dim = dim
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            time.sleep(self.overhead + self.per_item * len(texts))
+        return [[float(len(t) % 7)] * self.dim for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_level(embeddings, questions, threads: int, requests: int) -> dict:
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(offset: int):
+        local = []
+        for i in range(requests):
+            # distinct texts across threads, as concurrent users ask different things
+            text = f"{questions[(offset * requests + i) % len(questions)]} #{offset}-{i}"
+            t0 = time.perf_counter()
+            embeddings.embed_query(text)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    wall = time.perf_counter() - t0
+    return {
+        "qps": len(latencies) / wall,
+        "p50_ms": statistics.median(latencies) * 1e3,
+        "p95_ms": percentile(latencies, 0.95) * 1e3,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2"))
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--overhead-ms", type=float, default=8.0)
+    parser.add_argument("--per-item-ms", type=float, default=0.6)
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32")
+    parser.add_argument("--requests", type=int, default=40, help="embed_query calls per thread")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    batcher_mod = load_chat_module("embedding_batcher")
+    if args.synthetic:
+        model = SyntheticModel(args.overhead_ms / 1e3, args.per_item_ms / 1e3)
+    else:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        model = HuggingFaceEmbeddings(model_name=args.model)
+        model.embed_query("warm up")
+    questions = [p["question"] for p in load_chat_module("kb_parsing").load_qa_pairs(KB_PATH)] or ["hello"]
+
+    print(f"model={getattr(model, 'model_name', args.model)} max_batch={args.max_batch} "
+          f"max_wait={args.max_wait_ms}ms requests/thread={args.requests}")
+    print(f"  {'threads':>7} | {'direct qps':>10} {'p50 ms':>8} {'p95 ms':>8} | "
+          f"{'batched qps':>11} {'p50 ms':>8} {'p95 ms':>8} {'mean batch':>10} | {'speedup':>7}")
+    for threads in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+        direct = run_level(model, questions, threads, args.requests)
+        batcher = batcher_mod.BatchingEmbeddings(model, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1e3)
+        batched = run_level(batcher, questions, threads, args.requests)
+        mean_batch = batcher.stats()["mean_batch"]
+        batcher.close()
+        print(f"  {threads:>7} | {direct['qps']:>10.1f} {direct['p50_ms']:>8.1f} {direct['p95_ms']:>8.1f} | "
+              f"{batched['qps']:>11.1f} {batched['p50_ms']:>8.1f} {batched['p95_ms']:>8.1f} {mean_batch:>10.1f} | "
+              f"{batched['qps'] / direct['qps']:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
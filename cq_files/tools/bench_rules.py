@@ -0,0 +1,126 @@
+# tools/bench_rules.py
+"""
+Micro-benchmark: the compiled RuleEngine against the substring heuristics it
+replaced, on the flag lookups one turn makes. Also lists messages where the
+two disagree, which is mostly substring misfires ("hi" in "which").
+
+    python -m cq_files.tools.bench_rules [--rounds 2000] [--messages FILE]
+"""
+import argparse
+import os
+import time
+
+from cq_files.tools import CHAT_DIR, load_chat_module
+
+RULES_PATH = os.path.join(os.path.dirname(CHAT_DIR), "data", "rules", "keywords.json")
+
+SAMPLE_MESSAGES = [
+    "hi",
+    "Hello there!",
+    "Which bin does glass go in?",
+    "Which day?",
+    "thanks a lot",
+    "When is the organic waste collection in my area?",
+    "My garbage was missed again this week, this is terrible",
+    "What is the phone number of the municipal council office?",
+    "How do I compost food scraps at home without a garden?",
+    "This is a great service, well done to the team",
+    "They didn't collect my e-waste on Friday",
+    "Can I put this old cabinet out with the inorganic waste?",
+    "What's the email address for the city council?",
+    "I have an issue with the new schedule",
+    "Share some eco-friendly waste management tips",
+    "Is there a mission statement for the recycling programme?",
+]
+
+# The pre-RuleEngine ChatProcessor heuristics, kept here for comparison
+LEGACY = {
+    "schedule": ["schedule", "collection", "pickup", "pick up", "collect", "garbage day", "trash day",
+                 "when", "what day", "what time", "organic waste", "inorganic waste", "e-waste"],
+    "greeting": ["hello", "hi", "hey", "greetings", "howdy", "good morning", "good afternoon", "good evening"],
+    "feedback": ["feedback", "suggestion", "improve", "better", "thanks", "thank you", "grateful", "appreciate",
+                 "good job", "well done", "helpful", "service", "experience"],
+    "thanks": ["thanks", "thank you", "appreciated", "grateful", "appreciate", "valuable"],
+    "complaint": ["complaint", "issue", "problem", "not working", "broken", "failed", "poor", "missed", "miss",
+                  "disappointed", "unhappy", "dissatisfied", "bad", "terrible", "horrible", "didn't collect",
+                  "didn't pick up", "skipped", "forgot"],
+    "contact": ["contact", "details", "phone", "number", "email", "address", "website", "office"],
+    "municipal": ["municipal", "council", "office", "city", "town", "local"],
+    "missed_collection": ["miss", "missed", "didn't collect", "skipped", "forgot"],
+}
+
+
+def legacy_flag(message: str, flag: str) -> bool:
+    """One flag, computed the way the old _is_* method did it."""
+    def has(group):
+        return any(k in message.lower() for k in LEGACY[group])
+
+    if flag == "greeting":
+        return has("greeting") and len(message.split()) < 5
+    if flag == "thanks":
+        return has("thanks") and len(message.split()) < 7
+    if flag == "contact_request":
+        return has("contact") and has("municipal")
+    return has(flag)
+
+
+FLAGS = ["greeting", "thanks", "feedback", "complaint", "schedule", "contact_request", "missed_collection"]
+
+
+# Flag lookups made by one RAG turn before this change (plan + cache scope + relevance)
+CALLS_PER_TURN = ["contact_request", "greeting", "thanks", "complaint", "schedule", "greeting", "thanks",
+                  "contact_request", "complaint", "schedule", "feedback", "greeting", "thanks", "complaint",
+                  "feedback", "greeting", "thanks", "complaint", "schedule"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--messages", help="file with one message per line (default: built-in sample)")
+    args = parser.parse_args(argv)
+
+    messages = SAMPLE_MESSAGES
+    if args.messages:
+        with open(args.messages, encoding="utf-8") as f:
+            messages = [line.strip() for line in f if line.strip()]
+
+    rules = load_chat_module("rules")
+    engine = rules.RuleEngine.from_file(RULES_PATH)
+
+    t0 = time.perf_counter()
+    for _ in range(args.rounds):
+        for m in messages:
+            for flag in CALLS_PER_TURN:
+                legacy_flag(m, flag)
+    legacy_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(args.rounds):
+        engine.match.cache_clear()
+        for m in messages:
+            for flag in CALLS_PER_TURN:
+                getattr(engine.match(m), flag)
+    engine_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(args.rounds):
+        for m in messages:
+            engine.groups(m)
+    scan_s = time.perf_counter() - t0
+
+    turns = args.rounds * len(messages)
+    print(f"{len(messages)} messages x {args.rounds} rounds, {len(CALLS_PER_TURN)} flag lookups per turn")
+    print(f"  substring heuristics : {legacy_s / turns * 1e6:8.2f} us/turn")
+    print(f"  RuleEngine (memoised): {engine_s / turns * 1e6:8.2f} us/turn")
+    print(f"  RuleEngine single scan: {scan_s / turns * 1e6:7.2f} us/message")
+
+    print("\nDisagreements (legacy -> RuleEngine):")
+    for m in messages:
+        new = engine.match(m)._asdict()
+        diff = [f"{k}: {legacy_flag(m, k)} -> {new[k]}" for k in FLAGS if legacy_flag(m, k) != new[k]]
+        if diff:
+            print(f"  {m!r}: " + ", ".join(diff))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# tools/bench_session_memory.py
+"""
+Memory and latency of SessionMemory with many concurrent sessions: fills
+N sessions with T turns each, then reports hot-tier size (tracemalloc and
+RSS), append / history latency, write-behind throughput and the cost of
+reloading an evicted session from SQLite.
+
+    python -m cq_files.tools.bench_session_memory [--sessions 10000] [--turns 8] [--no-db]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from cq_files.tools import load_chat_module, memory_mb
+
+QUESTIONS = [
+    "When is organic waste collected in my area?",
+    "and inorganic?",
+    "How do I recycle glass bottles?",
+    "what about plastic?",
+    "Can I put old batteries in the e-waste bin?",
+    "What is the phone number of the municipal council?",
+]
+
+
+def _answer(rng: random.Random) -> str:
+    words = ["Rinse", "containers", "and", "place", "them", "in", "the", "recycling", "bin", "on",
+             "Wednesday", "around", "9", "AM;", "keep", "lids", "separate", "and", "flatten", "boxes."]
+    return " ".join(rng.choice(words) for _ in range(rng.randint(30, 70)))
+
+
+def _db_size(db_path: str) -> int:
+    # WAL mode: recent writes sit in the -wal file until a checkpoint
+    return sum(os.path.getsize(p) for p in (db_path, db_path + "-wal") if os.path.exists(p))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=8, help="turns written per session")
+    parser.add_argument("--max-turns", type=int, default=6)
+    parser.add_argument("--max-chars", type=int, default=4000)
+    parser.add_argument("--no-db", action="store_true", help="hot tier only")
+    args = parser.parse_args(argv)
+
+    sm = load_chat_module("session_memory")
+    rng = random.Random(7)
+    tmp = tempfile.mkdtemp(prefix="session-bench-")
+    db_path = None if args.no_db else os.path.join(tmp, "chat.db")
+    memory = sm.SessionMemory(db_path=db_path, max_turns=args.max_turns, max_chars=args.max_chars,
+                              max_sessions=args.sessions * 2, flush_interval=3600)
+    ids = [f"session-{i:06d}" for i in range(args.sessions)]
+
+    rss_before = memory_mb().get("rss", 0.0)
+    tracemalloc.start()
+    append_s = 0.0
+    for turn in range(args.turns):
+        for sid in ids:
+            # fresh string objects per turn, as real requests produce
+            question, answer = rng.choice(QUESTIONS) + " ", _answer(rng)
+            t0 = time.perf_counter()
+            memory.append(sid, question, answer)
+            append_s += time.perf_counter() - t0
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = memory_mb().get("rss", 0.0)
+    stats = memory.stats()
+    appends = args.sessions * args.turns
+
+    t0 = time.perf_counter()
+    written = memory.flush()
+    flush_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for sid in ids[:2000]:
+        memory.history(sid)
+    hot_us = (time.perf_counter() - t0) / min(2000, len(ids)) * 1e6
+
+    print(f"{args.sessions} sessions x {args.turns} turns (kept: {args.max_turns} turns / {args.max_chars} chars)")
+    print(f"  hot tier        : {stats['sessions']} sessions, {stats['turns']} turns, "
+          f"{stats['text_chars'] / 1e6:.1f}M chars of text")
+    print(f"  traced memory   : {traced / 2**20:8.1f} MB  ({traced / args.sessions / 1024:.1f} KB/session, "
+          f"incl. {stats['pending_writes']} queued writes)")
+    print(f"  RSS delta       : {rss_after - rss_before:8.1f} MB")
+    print(f"  append          : {append_s / appends * 1e6:8.2f} us/turn")
+    print(f"  history (hot)   : {hot_us:8.2f} us")
+    if db_path:
+        print(f"  write-behind    : {written} turns in {flush_s:.2f}s ({written / max(flush_s, 1e-9):,.0f} turns/s), "
+              f"db {_db_size(db_path) / 2**20:.1f} MB")
+        cold = sm.SessionMemory(db_path=db_path, max_turns=args.max_turns, max_chars=args.max_chars)
+        sample = rng.sample(ids, min(500, len(ids)))
+        t0 = time.perf_counter()
+        for sid in sample:
+            cold.history(sid)
+        print(f"  history (cold)  : {(time.perf_counter() - t0) / len(sample) * 1e3:8.3f} ms (reload from SQLite)")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
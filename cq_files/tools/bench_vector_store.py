@@ -0,0 +1,110 @@
+# tools/bench_vector_store.py
+"""
+Load-time, memory and query benchmark: FAISS (index.faiss + index.pkl)
+against the mmap store, each measured in a fresh child process.
+
+    python -m cq_files.tools.bench_vector_store [--path DIR] [--runs 5] [--workers 4]
+
+`--workers` loads the store in that many processes at once and reports
+their combined PSS, which is where mmap's shared page cache shows up.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from cq_files.tools.convert_vector_store import DEFAULT_PATH
+
+CHILD = r"""
+import json, sys, time
+import numpy as np
+from cq_files.tools import load_chat_module, memory_mb
+fmt, path, queries, hold = sys.argv[1], sys.argv[2], int(sys.argv[3]), float(sys.argv[4])
+if fmt == "faiss":
+    from langchain_community.vectorstores import FAISS
+else:
+    mmap_store = load_chat_module("mmap_store")
+before = memory_mb()
+t0 = time.perf_counter()
+if fmt == "faiss":
+    vs = FAISS.load_local(path, None, allow_dangerous_deserialization=True)
+    dim = vs.index.d
+else:
+    vs = mmap_store.MmapVectorStore.load(path, None)
+    dim = vs._vectors.shape[1]
+load_s = time.perf_counter() - t0
+rng = np.random.default_rng(0)
+qs = rng.normal(size=(queries, dim)).astype(np.float32)
+t0 = time.perf_counter()
+for q in qs:
+    vs.similarity_search_with_score_by_vector(q.tolist(), k=3)
+query_ms = (time.perf_counter() - t0) * 1000 / max(queries, 1)
+after = memory_mb()
+time.sleep(hold)
+final = memory_mb()
+print(json.dumps({"load_s": load_s, "query_ms": query_ms, "before": before, "after": after, "final": final}))
+"""
+
+
+def run_child(fmt: str, path: str, queries: int, hold: float = 0.0) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-c", CHILD, fmt, path, str(queries), str(hold)],
+                            stdout=subprocess.PIPE, text=True)
+
+
+def collect(proc: subprocess.Popen) -> dict:
+    out, _ = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"benchmark child failed with exit code {proc.returncode}")
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def bench(fmt: str, path: str, runs: int, queries: int, workers: int) -> dict:
+    results = [collect(run_child(fmt, path, queries)) for _ in range(runs)]
+    # concurrent workers: hold the store until all have loaded, then read PSS
+    procs = [run_child(fmt, path, 0, hold=1.0 + 0.1 * workers) for _ in range(workers)]
+    concurrent = [collect(p) for p in procs]
+    return {
+        "format": fmt,
+        "load_ms_median": round(statistics.median(r["load_s"] for r in results) * 1000, 2),
+        "query_ms_median": round(statistics.median(r["query_ms"] for r in results), 3),
+        "rss_delta_mb": round(statistics.median(r["after"]["rss"] - r["before"]["rss"] for r in results), 1),
+        "private_delta_mb": round(statistics.median(
+            r["after"].get("private", 0) - r["before"].get("private", 0) for r in results), 1),
+        "workers": workers,
+        "workers_pss_total_mb": round(sum(r["final"].get("pss", 0) for r in concurrent), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=os.getenv("VECTOR_STORE_PATH", DEFAULT_PATH))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    formats = []
+    if os.path.exists(os.path.join(args.path, "index.faiss")):
+        formats.append("faiss")
+    if os.path.exists(os.path.join(args.path, "store.json")):
+        formats.append("mmap")
+    if not formats:
+        sys.exit(f"No vector store found in {args.path}")
+
+    started = time.time()
+    rows = [bench(fmt, args.path, args.runs, args.queries, args.workers) for fmt in formats]
+    print(f"{'format':<8}{'load ms':>10}{'query ms':>10}{'RSS +MB':>10}{'priv +MB':>10}{'PSS xN MB':>11}")
+    for r in rows:
+        print(f"{r['format']:<8}{r['load_ms_median']:>10}{r['query_ms_median']:>10}"
+              f"{r['rss_delta_mb']:>10}{r['private_delta_mb']:>10}{r['workers_pss_total_mb']:>11}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"path": args.path, "started": started, "results": rows}, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# tools/convert_vector_store.py
+"""
+Convert a FAISS store (index.faiss + index.pkl) to the pickle-free mmap
+format used when VECTOR_STORE_FORMAT=mmap.
+
+    python -m cq_files.tools.convert_vector_store [--path DIR] [--remove-legacy]
+"""
+import argparse
+import os
+
+from cq_files.tools import CHAT_DIR, load_chat_module
+
+DEFAULT_PATH = os.path.join(os.path.dirname(CHAT_DIR), "data", "vector_store")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=os.getenv("VECTOR_STORE_PATH", DEFAULT_PATH))
+    # not EMBEDDING_MODEL: that is what the app will use, which need not be what built this index
+    parser.add_argument("--model", default="sentence-transformers/all-mpnet-base-v2",
+                        help="embedding model the index was built with (recorded in store.json)")
+    parser.add_argument("--remove-legacy", action="store_true", help="delete index.faiss/index.pkl afterwards")
+    args = parser.parse_args(argv)
+
+    mmap_store = load_chat_module("mmap_store")
+    store = mmap_store.convert_faiss_store(args.path, None, model_name=args.model)
+    print(f"{len(store)} chunk(s) written to {args.path}")
+    if args.remove_legacy:
+        for name in ("index.faiss", "index.pkl"):
+            os.remove(os.path.join(args.path, name))
+        print("Removed index.faiss and index.pkl")
+
+
+if __name__ == "__main__":
+    main()
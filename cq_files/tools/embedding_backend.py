@@ -0,0 +1,235 @@
+# tools/embedding_backend.py
+"""
+Export and validate the ONNX int8 embedding backend (EMBEDDING_BACKEND).
+
+    python -m cq_files.tools.embedding_backend export [--model NAME] [--out DIR]
+    python -m cq_files.tools.embedding_backend validate --backend onnx-int8 [--k 3] [--min-recall 0.9]
+
+`export` writes <out>/<model>/model-int8.onnx, tokenizer.json and
+onnx_config.json (needs torch, sentence-transformers, and the optional
+cq_manager/requirements-onnx.txt).
+
+`validate` embeds the knowledge-base questions with the model that built
+the current vector store and with the candidate backend, and reports
+recall@k of the candidate's top-k chunks against the current index's:
+
+  - rebuilt: the candidate searching an index it embedded itself, which
+    is what serving runs after the store is rebuilt for the new backend
+  - current index: candidate queries against the existing vectors (same
+    base model only; the store refuses this mix at load time)
+
+plus per-query latency and the resident memory each backend adds. Exits
+with status 1 when rebuilt recall@k is below --min-recall.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from cq_files.tools import CHAT_DIR, load_chat_module, memory_mb
+from cq_files.tools.convert_vector_store import DEFAULT_PATH
+
+DATA_DIR = os.path.join(os.path.dirname(CHAT_DIR), "data")
+KB_PATH = os.path.join(DATA_DIR, "knowledge_base")
+DEFAULT_MODEL = "sentence-transformers/all-mpnet-base-v2"
+DEFAULT_SMALL_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_ONNX_DIR = os.path.join(DATA_DIR, "models", "onnx")
+
+
+# ------------------------
+# Export
+# ------------------------
+def export(model_name: str, onnx_root: str, opset: int = 14, keep_fp32: bool = False) -> str:
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    backends = load_chat_module("embedding_backends")
+    out_dir = backends.onnx_model_dir(onnx_root, model_name)
+    os.makedirs(out_dir, exist_ok=True)
+
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0]
+    pooling = next((m for m in st if type(m).__name__ == "Pooling"), None)
+    mode = pooling.get_pooling_mode_str() if pooling is not None else "mean"
+    if mode not in ("mean", "cls"):
+        raise SystemExit(f"{model_name} uses {mode!r} pooling; only mean and cls are supported")
+
+    class Encoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+    tokenizer = transformer.tokenizer
+    sample = tokenizer(["When is organic waste collected?"], return_tensors="pt")
+    axes = {0: "batch", 1: "sequence"}
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32_path = os.path.join(tmp, "model.onnx")
+        torch.onnx.export(
+            Encoder(transformer.auto_model.eval()),
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={"input_ids": axes, "attention_mask": axes, "last_hidden_state": axes},
+            opset_version=opset,
+        )
+        # weights to int8, activations quantized on the fly: no calibration set needed
+        quantize_dynamic(fp32_path, os.path.join(out_dir, backends.ONNX_MODEL_FILE), weight_type=QuantType.QInt8)
+        if keep_fp32:
+            shutil.copy(fp32_path, os.path.join(out_dir, "model.onnx"))
+
+    tokenizer.backend_tokenizer.save(os.path.join(out_dir, backends.TOKENIZER_FILE))
+    config = {
+        "model": model_name,
+        "file": backends.ONNX_MODEL_FILE,
+        "dim": st.get_sentence_embedding_dimension(),
+        "max_length": transformer.max_seq_length,
+        "pooling": mode,
+        "normalize": any(type(m).__name__ == "Normalize" for m in st),
+        "pad_id": tokenizer.pad_token_id,
+        "pad_token": tokenizer.pad_token,
+        "opset": opset,
+    }
+    with open(os.path.join(out_dir, backends.ONNX_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=1)
+    size = os.path.getsize(os.path.join(out_dir, backends.ONNX_MODEL_FILE))
+    print(f"[export] {model_name} -> {out_dir} ({size / 2**20:.0f} MB int8, dim {config['dim']})")
+    return out_dir
+
+
+# ------------------------
+# Validation
+# ------------------------
+def _top_k(query_vectors: np.ndarray, index_vectors: np.ndarray, k: int) -> np.ndarray:
+    # squared L2 like MmapVectorStore; the |q|^2 term does not change the order
+    d = (index_vectors * index_vectors).sum(axis=1)[None, :] - 2.0 * query_vectors @ index_vectors.T
+    return np.argsort(d, axis=1, kind="stable")[:, :k]
+
+
+def _recall(reference: np.ndarray, candidate: np.ndarray) -> float:
+    k = reference.shape[1]
+    return float(np.mean([len(set(r) & set(c)) / k for r, c in zip(reference, candidate)]))
+
+
+def _load_backend(backends, backend: str, args) -> tuple:
+    before = memory_mb().get("rss", 0.0)
+    t0 = time.perf_counter()
+    emb = backends.create_embeddings(backend, args.model, args.small_model, args.onnx_dir, args.threads)
+    load_s = time.perf_counter() - t0
+    emb.embed_query("warm up")
+    return emb, load_s, memory_mb().get("rss", 0.0) - before
+
+
+def _embed_queries(emb, queries) -> tuple:
+    vectors, times = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        vectors.append(emb.embed_query(q))
+        times.append(time.perf_counter() - t0)
+    return np.asarray(vectors, dtype=np.float32), times
+
+
+def validate(args) -> dict:
+    backends = load_chat_module("embedding_backends")
+    mmap_store = load_chat_module("mmap_store")
+    if not mmap_store.MmapVectorStore.exists(args.path):
+        raise SystemExit(f"no mmap vector store in {args.path} (see tools/convert_vector_store.py)")
+    store = mmap_store.MmapVectorStore.load(args.path, None)
+    reference_model = store.model_name or args.model
+    if reference_model.endswith(backends.ONNX_SUFFIX):
+        raise SystemExit(f"the current index was built with {reference_model}; validate against a torch-built index")
+
+    questions = [p["question"] for p in load_chat_module("kb_parsing").load_qa_pairs(args.kb)]
+    if not questions:
+        raise SystemExit(f"no questions found in {args.kb}")
+    chunks = [doc.page_content for doc in store.get_by_ids(store.ids)]
+    index = np.asarray(store._vectors, dtype=np.float32)
+    k = min(args.k, len(chunks))
+
+    # candidate first, so its memory figure does not include torch
+    candidate_id = backends.model_id(args.backend, args.model, args.small_model)
+    candidate, cand_load_s, cand_mb = _load_backend(backends, args.backend, args)
+    reference, ref_load_s, ref_mb = _load_backend(backends, "torch", argparse.Namespace(**dict(
+        vars(args), model=reference_model)))
+
+    ref_q, ref_times = _embed_queries(reference, questions)
+    cand_q, cand_times = _embed_queries(candidate, questions)
+    expected = _top_k(ref_q, index, k)
+
+    t0 = time.perf_counter()
+    cand_index = np.asarray(candidate.embed_documents(chunks), dtype=np.float32)
+    index_s = time.perf_counter() - t0
+    rebuilt = _top_k(cand_q, cand_index, k)
+
+    same_base = backends.backend_model_name(args.backend, args.model, args.small_model) == reference_model
+    result = {
+        "reference": reference_model,
+        "candidate": candidate_id,
+        "questions": len(questions),
+        "chunks": len(chunks),
+        "k": k,
+        "recall_rebuilt": round(_recall(expected, rebuilt), 4),
+        "top1_rebuilt": round(float(np.mean(expected[:, 0] == rebuilt[:, 0])), 4),
+        "recall_current_index": None,
+        "query_cosine": None,
+        "reference_query_ms": round(statistics.median(ref_times) * 1e3, 2),
+        "candidate_query_ms": round(statistics.median(cand_times) * 1e3, 2),
+        "candidate_index_s": round(index_s, 2),
+        "reference_load": {"seconds": round(ref_load_s, 2), "rss_mb": round(ref_mb, 1)},
+        "candidate_load": {"seconds": round(cand_load_s, 2), "rss_mb": round(cand_mb, 1)},
+    }
+    if same_base and cand_q.shape[1] == index.shape[1]:
+        result["recall_current_index"] = round(_recall(expected, _top_k(cand_q, index, k)), 4)
+        cos = (ref_q * cand_q).sum(axis=1) / (np.linalg.norm(ref_q, axis=1) * np.linalg.norm(cand_q, axis=1))
+        result["query_cosine"] = round(float(cos.mean()), 4)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", DEFAULT_MODEL))
+    parser.add_argument("--small-model", default=os.getenv("EMBEDDING_SMALL_MODEL", DEFAULT_SMALL_MODEL))
+    parser.add_argument("--onnx-dir", default=os.getenv("EMBEDDING_ONNX_DIR", DEFAULT_ONNX_DIR))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("EMBEDDING_ONNX_THREADS", "0")))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="export EMBEDDING_MODEL (or --model) to int8 ONNX")
+    exp.add_argument("--opset", type=int, default=14)
+    exp.add_argument("--keep-fp32", action="store_true", help="also keep the unquantized model.onnx")
+
+    val = sub.add_parser("validate", help="recall@k of a backend against the current index")
+    val.add_argument("--backend", default="onnx-int8", choices=("onnx-int8", "small", "torch"))
+    val.add_argument("--path", default=os.getenv("VECTOR_STORE_PATH", DEFAULT_PATH))
+    val.add_argument("--kb", default=os.getenv("KNOWLEDGE_BASE_PATH", KB_PATH))
+    val.add_argument("--k", type=int, default=3)
+    val.add_argument("--min-recall", type=float, default=0.9)
+    val.add_argument("--out", help="also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        export(args.model, args.onnx_dir, opset=args.opset, keep_fp32=args.keep_fp32)
+        return
+
+    result = validate(args)
+    for key, value in result.items():
+        print(f"  {key:<22}: {value}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if result["recall_rebuilt"] < args.min_recall:
+        print(f"[validate] recall@{result['k']} {result['recall_rebuilt']} is below {args.min_recall}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
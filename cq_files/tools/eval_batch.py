@@ -0,0 +1,340 @@
+# tools/eval_batch.py
+"""
+Batch evaluation: runs a JSONL file of questions through
+ChatProcessor.process_message and streams one JSONL result per question,
+for regression-testing knowledge-base edits without the web UI.
+
+    python -m cq_files.tools.eval_batch questions.jsonl --out results.jsonl
+                                        [--workers 4] [--rate 20] [--burst 5] [--resume] [--stub]
+
+Input, one object per line ("question" or "message" is required):
+
+    {"id": "glass-day", "question": "When is glass collected?",
+     "expected_intent": "Waste Collection Schedules", "expected_keywords": ["Friday"]}
+
+  - `id` defaults to a hash of the question, so reordering the file keeps
+    --resume working. Lines sharing a `session_id` are one conversation:
+    they run in file order on one worker, with session memory between
+    them. Every other line gets a session of its own.
+  - each result has the answer, seconds, branch, intent (from the
+    pipeline, or the local classifier when the branch never classified
+    one), LLM calls and per-stage milliseconds from the turn trace, plus
+    checks against the expectations. `fallback` marks canned error replies.
+  - --rate caps OpenRouter requests per minute across all workers; the
+    app's own concurrency cap (OPENROUTER_MAX_CONCURRENT) still applies.
+  - results are flushed per line. After an interruption, --resume appends
+    and skips every id that already has an "ok" result; errors and canned
+    fallback replies (an upstream outage) are run again, together with the
+    rest of their conversation.
+  - the exit status is 1 when any result is an error, a failed check or,
+    unless --allow-fallback, a fallback reply.
+
+It uses the app's knowledge base, vector store and OpenRouter settings
+from the environment; --stub answers from tools/stub_openrouter.py
+instead. Conversations go to a throwaway sqlite database (--db), and the
+answer cache is on as in production (ANSWER_CACHE_ENABLED=0 to bypass it).
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from cq_files.tools.bench_e2e import percentiles
+
+
+# ------------------------
+# Input / output
+# ------------------------
+def load_items(path: str) -> List[dict]:
+    items = []
+    seen: Dict[str, int] = {}
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise SystemExit(f"{path}:{lineno}: not JSON: {e}")
+            question = item.get("question") or item.get("message") if isinstance(item, dict) else None
+            if not question:
+                raise SystemExit(f"{path}:{lineno}: needs a \"question\"")
+            item_id = str(item.get("id") or hashlib.sha256(question.encode("utf-8")).hexdigest()[:12])
+            # a repeated id (the same question twice) gets an occurrence suffix
+            n = seen.get(item_id, 0)
+            seen[item_id] = n + 1
+            items.append({
+                "id": item_id if n == 0 else f"{item_id}-{n}",
+                "question": question,
+                "session_id": item.get("session_id"),
+                "expected_intent": item.get("expected_intent"),
+                "expected_keywords": item.get("expected_keywords") or [],
+            })
+    return items
+
+
+def completed_ids(path: str) -> set:
+    """Ids with a real answer in an earlier (possibly interrupted) run; fallbacks are retried."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue  # the line being written when the run stopped
+            if row.get("status") == "ok" and not row.get("fallback"):
+                done.add(row["id"])
+    return done
+
+
+def group_by_session(items: List[dict]) -> List[List[dict]]:
+    """One job per conversation; standalone questions are a job each."""
+    groups: "OrderedDict[str, List[dict]]" = OrderedDict()
+    for item in items:
+        key = item["session_id"] or f"eval-{item['id']}"
+        groups.setdefault(key, []).append(item)
+    return list(groups.values())
+
+
+# ------------------------
+# Upstream pacing
+# ------------------------
+class PacedHTTPClient:
+    """The registry's http_client with a requests-per-minute cap shared by every worker."""
+
+    def __init__(self, inner, per_minute: float, burst: int):
+        from cq_files.cq_manager.chat.admission import SessionRateLimiter
+
+        self.inner = inner
+        self.bucket = SessionRateLimiter(rate=per_minute / 60.0, burst=burst, max_sessions=1)
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def post(self, *args, **kwargs):
+        while True:
+            allowed, retry_after = self.bucket.allow("openrouter")
+            if allowed:
+                return self.inner.post(*args, **kwargs)
+            with self._lock:
+                self.waited += retry_after
+            time.sleep(retry_after)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+# ------------------------
+# Evaluation
+# ------------------------
+def _stages(trace) -> Dict[str, float]:
+    out: Dict[str, float] = defaultdict(float)
+    for name, seconds in trace.stages:
+        out[name] += seconds * 1e3
+    return {name: round(ms, 2) for name, ms in out.items()}
+
+
+def _intent(chat_processor, question: str, trace) -> Tuple[Optional[str], Optional[float], Optional[str]]:
+    if trace is not None and trace.intent is not None:
+        return trace.intent[0], round(trace.intent[1], 3), "pipeline"
+    # table, FAQ and cache answers skip classification; ask the local classifier (no LLM call)
+    local = chat_processor._local_intent(question)
+    if local:
+        return local[0], round(local[1], 3), "local"
+    return None, None, None
+
+
+def evaluate(chat_processor, item: dict, session_id: str) -> dict:
+    from cq_files.cq_manager.chat import metrics
+
+    t0 = time.perf_counter()
+    status, error, response = "ok", None, ""
+    try:
+        response = chat_processor.process_message(item["question"], session_id)
+    except Exception as e:
+        status, error = "error", f"{type(e).__name__}: {e}"
+    seconds = time.perf_counter() - t0
+    trace = metrics.last_turn()
+    intent, confidence, source = _intent(chat_processor, item["question"], trace)
+
+    checks = {}
+    if item["expected_intent"]:
+        checks["intent"] = (intent or "").lower() == item["expected_intent"].lower()
+    if item["expected_keywords"]:
+        missing = [k for k in item["expected_keywords"] if k.lower() not in response.lower()]
+        checks["keywords"] = not missing
+        checks["missing_keywords"] = missing
+    verdicts = [v for k, v in checks.items() if k != "missing_keywords"]
+
+    return {
+        "id": item["id"],
+        "question": item["question"],
+        "session_id": session_id,
+        "status": status,
+        "error": error,
+        "response": response,
+        "fallback": status == "ok" and not chat_processor._is_cacheable(response),
+        "seconds": round(seconds, 4),
+        "branch": trace.branch if trace is not None else None,
+        "intent": intent,
+        "intent_confidence": confidence,
+        "intent_source": source,
+        "llm_calls": trace.llm_calls if trace is not None else None,
+        "context_tokens_saved": trace.context_saved if trace is not None else None,
+        "stages_ms": _stages(trace) if trace is not None else {},
+        "expected_intent": item["expected_intent"],
+        "expected_keywords": item["expected_keywords"],
+        "checks": checks,
+        "passed": all(verdicts) if verdicts else None,
+        "finished_at": time.time(),
+    }
+
+
+def run_group(chat_processor, group: List[dict], write, stop: threading.Event):
+    # the first line's session_id (or its own id) names the conversation
+    session_id = group[0]["session_id"] or f"eval-{group[0]['id']}"
+    for item in group:
+        if stop.is_set():
+            return
+        write(evaluate(chat_processor, item, session_id))
+
+
+def summarize(path: str) -> dict:
+    rows = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            rows[row["id"]] = row  # a resumed run's retry replaces the earlier error
+    ok = [r for r in rows.values() if r["status"] == "ok"]
+    checked = [r for r in ok if r["passed"] is not None]
+    return {
+        "items": len(rows),
+        "errors": len(rows) - len(ok),
+        "fallbacks": sum(1 for r in ok if r["fallback"]),
+        "checked": len(checked),
+        "passed": sum(1 for r in checked if r["passed"]),
+        "failed": sorted(r["id"] for r in checked if not r["passed"]),
+        "latency": percentiles([r["seconds"] for r in ok]),
+        "llm_calls": sum(r["llm_calls"] or 0 for r in ok),
+        "branches": dict(Counter(r["branch"] or "unknown" for r in ok).most_common()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", help="JSONL file of questions")
+    parser.add_argument("--out", required=True, help="JSONL results, one line per question")
+    parser.add_argument("--workers", type=int, default=4, help="questions (conversations) in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="OpenRouter requests per minute; 0 = no cap")
+    parser.add_argument("--burst", type=int, default=5, help="requests allowed at once under --rate")
+    parser.add_argument("--resume", action="store_true", help="append to --out, skipping ids already ok")
+    parser.add_argument("--limit", type=int, default=0, help="only the first N pending questions")
+    parser.add_argument("--db", help="sqlite file for session memory (default: a temp file)")
+    parser.add_argument("--stub", action="store_true", help="answer from the local stub OpenRouter server")
+    parser.add_argument("--allow-fallback", action="store_true",
+                        help="exit 0 even when some answers are canned fallback replies")
+    args = parser.parse_args(argv)
+
+    items = load_items(args.questions)
+    done = completed_ids(args.out) if args.resume else set()
+    pending = [item for item in items if item["id"] not in done]
+    if args.limit:
+        pending = pending[:args.limit]
+    # a conversation is rerun whole, so a retried follow-up still has its history
+    rerun = {item["session_id"] for item in pending if item["session_id"]}
+    pending = [item for item in items
+               if item in pending or (item["session_id"] and item["session_id"] in rerun)]
+    print(f"[eval] {len(items)} question(s), {len(done)} already done, {len(pending)} to run")
+
+    # settings are read when the app modules are imported, so set them first
+    db = args.db or os.path.join(tempfile.mkdtemp(prefix="eval-batch-"), "chat.db")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.abspath(db)
+    stub = None
+    if args.stub:
+        from cq_files.tools.stub_openrouter import StubOpenRouter
+
+        stub = StubOpenRouter(latency=0.05).start()
+        os.environ["OPENROUTER_BASE_URL"] = stub.url
+        os.environ.setdefault("OPENROUTER_API_KEY", "eval")
+
+    from cq_files.cq_manager.chat.resources import get_registry
+
+    registry = get_registry()
+    paced = None
+    if args.rate > 0:
+        paced = PacedHTTPClient(registry.get("http_client"), args.rate, args.burst)
+        registry.set("http_client", paced)
+    t0 = time.perf_counter()
+    chat_processor = registry.get("chat_processor")
+    print(f"[eval] pipeline ready in {time.perf_counter() - t0:.1f}s")
+
+    if args.resume and os.path.exists(args.out) and os.path.getsize(args.out):
+        with open(args.out, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            partial = f.read(1) != b"\n"
+    else:
+        partial = False
+    out = open(args.out, "a" if args.resume else "w", encoding="utf-8")
+    if partial:
+        out.write("\n")  # terminate the line cut off by the interruption
+    lock = threading.Lock()
+    progress = {"n": 0}
+
+    def write(row: dict):
+        with lock:
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            out.flush()
+            progress["n"] += 1
+            verdict = {True: "pass", False: "FAIL", None: "-"}[row["passed"]]
+            print(f"[eval] {progress['n']}/{len(pending)} {row['id']} {row['status']} {verdict} "
+                  f"{row['seconds']:.2f}s branch={row['branch']} llm_calls={row['llm_calls']}")
+
+    stop = threading.Event()
+    t0 = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="eval")
+    try:
+        futures = [pool.submit(run_group, chat_processor, group, write, stop)
+                   for group in group_by_session(pending)]
+        for future in as_completed(futures):
+            future.result()
+    except KeyboardInterrupt:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        print(f"[eval] interrupted after {progress['n']} result(s); rerun with --resume to continue")
+        return 130
+    finally:
+        pool.shutdown(wait=True)
+        out.close()
+        if stub is not None:
+            stub.stop()
+    elapsed = time.perf_counter() - t0
+
+    summary = summarize(args.out)
+    print(f"[eval] {progress['n']} question(s) in {elapsed:.1f}s"
+          + (f", {paced.waited:.1f}s waiting for --rate" if paced else ""))
+    print(f"[eval] {summary['items']} result(s): {summary['errors']} error(s), {summary['fallbacks']} fallback(s), "
+          f"{summary['passed']}/{summary['checked']} checked passed")
+    if summary["failed"]:
+        print(f"[eval] failed: {', '.join(summary['failed'])}")
+    print(f"[eval] latency p50 {summary['latency'].get('p50_ms')} ms, p95 {summary['latency'].get('p95_ms')} ms; "
+          f"{summary['llm_calls']} LLM call(s); branches {summary['branches']}")
+    if summary["fallbacks"] and not args.allow_fallback:
+        print("[eval] some answers are fallback replies (upstream errors); rerun with --resume to retry them")
+        return 1
+    return 1 if summary["errors"] or summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+# tools/stub_openrouter.py
+"""
+Local OpenRouter-compatible chat completions server for offline runs and
+benchmarks. Answers POST /v1/chat/completions (blocking and `stream: true`)
+after a configurable delay, with either a canned answer or an echo of the
+prompt, and can inject HTTP errors.
+
+    python -m cq_files.tools.stub_openrouter [--port 8099] [--latency 0.4] [--mode echo]
+    OPENROUTER_BASE_URL=http://127.0.0.1:8099/v1/chat/completions python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_ANSWER = (
+    "Rinse recyclable containers, keep them dry and place them in the inorganic bin. "
+    "Organic waste is collected on Monday around 9 AM and inorganic waste on Wednesday."
+)
+
+
+class StubOpenRouter:
+    """
+    `latency` seconds (plus uniform +/- `jitter`) before the first byte;
+    streams then emit one word every `token_interval` seconds. A request
+    fails with HTTP 500 with probability `error_rate`.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.4, jitter: float = 0.0,
+                 token_interval: float = 0.0, mode: str = "canned", answer: str = CANNED_ANSWER,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_interval = token_interval
+        self.mode = mode
+        self.answer = answer
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.prompt_chars = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self) -> "StubOpenRouter":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-openrouter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "errors": self.errors, "prompt_chars": self.prompt_chars}
+
+    def settings(self) -> dict:
+        return {"latency": self.latency, "jitter": self.jitter, "token_interval": self.token_interval,
+                "mode": self.mode, "error_rate": self.error_rate}
+
+    # ------------------------
+    # Request handling
+    # ------------------------
+    def _delay(self) -> float:
+        with self._lock:
+            offset = self._rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return max(0.0, self.latency + offset)
+
+    def _fails(self) -> bool:
+        with self._lock:
+            return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    def _completion(self, prompt: str) -> str:
+        if self.mode == "echo":
+            return "Echo: " + " ".join(prompt.split())[:300]
+        return self.answer
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body go out in separate writes; without this, delayed
+            # ACKs add ~40 ms to every response
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _chunk(self, data: bytes):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def do_POST(self):
+                try:
+                    payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                    prompt = "\n".join(m.get("content", "") for m in payload.get("messages", []))
+                except ValueError:
+                    return self._send(400, b'{"error": {"message": "bad json"}}')
+
+                with stub._lock:
+                    stub.requests += 1
+                    stub.prompt_chars += len(prompt)
+                time.sleep(stub._delay())
+                if stub._fails():
+                    with stub._lock:
+                        stub.errors += 1
+                    return self._send(500, b'{"error": {"message": "injected failure"}}')
+
+                text = stub._completion(prompt)
+                usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4}
+                if not payload.get("stream"):
+                    body = {"choices": [{"message": {"role": "assistant", "content": text}}], "usage": usage}
+                    return self._send(200, json.dumps(body).encode("utf-8"))
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for word in text.split(" "):
+                    delta = {"choices": [{"delta": {"content": word + " "}}]}
+                    self._chunk(f"data: {json.dumps(delta)}\n\n".encode("utf-8"))
+                    if stub.token_interval:
+                        time.sleep(stub.token_interval)
+                self._chunk(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.4, help="seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--token-interval", type=float, default=0.0, help="seconds between streamed words")
+    parser.add_argument("--mode", choices=["canned", "echo"], default="canned")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    stub = StubOpenRouter(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                          token_interval=args.token_interval, mode=args.mode, error_rate=args.error_rate)
+    print(f"[StubOpenRouter] listening on {stub.url}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"[StubOpenRouter] {stub.stats()}")
+
+
+if __name__ == "__main__":
+    main()